@@ -1,26 +1,29 @@
 from fastapi import APIRouter, HTTPException, status, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.auth.errors import error_response, success_response
-from app.db.init_db import Base, get_db,engine
+from app.db.init_db import Base, get_async_db,engine
 import models
 import schemas
-from ..utils.security import get_password_hash, verify_password, create_access_token
+import app.db.crud as crud
+from ..utils.security import get_password_hash_async, verify_password_async, create_access_token
 from sqlalchemy.exc import IntegrityError
 
 router = APIRouter()
 Base.metadata.create_all(bind=engine)
 
 
+# Queries run on the event loop through the async engine and argon2 on its
+# own bounded pool, so neither ties up the default threadpool.
 @router.post("/register")
-def register(payload: schemas.RegisterRequest, db: Session = Depends(get_db)):
+async def register(payload: schemas.RegisterRequest, db: AsyncSession = Depends(get_async_db)):
     # check if exists
-    existing = db.query(models.User).filter(models.User.email == payload.email).first()
+    existing = await crud.get_user_by_email(db, payload.email)
     if existing:
         raise HTTPException(status_code=400, detail={
                     "status": "GE40001",
                     "error": "Email already registered",
                 })
-    hashed = get_password_hash(payload.password)
+    hashed = await get_password_hash_async(payload.password)
     user = models.User(
         first_name=payload.first_name,
         last_name=payload.last_name,
@@ -29,10 +32,10 @@ def register(payload: schemas.RegisterRequest, db: Session = Depends(get_db)):
     )
     db.add(user)
     try:
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail={
                     "status": "GE40002",
                     "error": "Registration failed",
@@ -55,9 +58,9 @@ def register(payload: schemas.RegisterRequest, db: Session = Depends(get_db)):
     
 
 @router.post("/login", response_model=schemas.TokenResponse)
-def login(payload: schemas.LoginRequest, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == payload.email).first()
-    if not user or not verify_password(payload.password, user.hashed_password):
+async def login(payload: schemas.LoginRequest, db: AsyncSession = Depends(get_async_db)):
+    user = await crud.get_user_by_email(db, payload.email)
+    if not user or not await verify_password_async(payload.password, user.hashed_password):
         raise HTTPException(
             status_code=401, 
             detail={
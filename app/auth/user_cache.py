@@ -0,0 +1,40 @@
+import os
+from cachetools import TTLCache
+from dotenv import load_dotenv
+
+load_dotenv()
+# "db" (default): look the user up on every request
+# "cached": look the user up once, then trust the token for AUTH_CACHE_TTL_SECONDS
+# "stateless": trust the signed claims, never query the users table
+AUTH_MODE = os.getenv("AUTH_MODE", "db").lower()
+AUTH_CACHE_MAXSIZE = int(os.getenv("AUTH_CACHE_MAXSIZE", "10000"))
+AUTH_CACHE_TTL_SECONDS = int(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
+
+# user ids recently confirmed to exist
+verified_users = TTLCache(maxsize=AUTH_CACHE_MAXSIZE, ttl=AUTH_CACHE_TTL_SECONDS)
+# deleted user ids; kept as long as a token issued before the delete can live
+revoked_users = TTLCache(maxsize=AUTH_CACHE_MAXSIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+
+def remember_user(user_id: int) -> None:
+    verified_users[user_id] = True
+
+
+def is_verified(user_id: int) -> bool:
+    return user_id in verified_users
+
+
+def is_revoked(user_id: int) -> bool:
+    return user_id in revoked_users
+
+
+def invalidate_user(user_id: int, deleted: bool = False) -> None:
+    """Forget a verified user; called by crud when the user changes or is deleted.
+
+    The caches are per process: with several workers, other processes keep
+    trusting the user until their own entry expires.
+    """
+    verified_users.pop(user_id, None)
+    if deleted:
+        revoked_users[user_id] = True
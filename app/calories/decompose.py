@@ -0,0 +1,113 @@
+"""Split a free-text dish into ingredient phrases with quantities.
+
+"2 eggs, toast with butter and orange juice" becomes four phrases: egg
+x2, toast, butter and orange juice, each looked up on its own. A unit
+after the quantity ("1 1/2 cups of rice", "200 g chicken") is kept with
+the phrase and converted through app/usda/portions.py. Only
+inputs that read as a list are split: ones containing a comma, semicolon
+or "+", or where a part starts with a quantity ("2 eggs and toast").
+Anything else ("macaroni and cheese", "half and half", "7 up") stays one
+dish and is looked up exactly as written. A comma list without any
+quantity may also be a FoodData Central style name ("Pizza, cheese,
+regular crust"); whole_name_candidate gives the router the whole text to
+try as one food first.
+"""
+import re
+from typing import Dict, List, NamedTuple, Optional
+
+from ..usda.portions import leading_unit
+from ..usda.query import canonical_key
+
+# Most ingredient phrases one dish may be split into
+DISH_MAX_INGREDIENTS = 15
+
+_HARD_SEPARATORS = re.compile(r"\s*[,;+]\s*")
+_SOFT_SEPARATORS = re.compile(r"\s*(?:&|\band\b|\bwith\b|\bplus\b)\s*", re.IGNORECASE)
+_QUANTITY = re.compile(
+    r"^(?P<amount>\d+\s+\d+/\d+|\d+/\d+|\d+(?:\.\d+)?|a|an|one|two|three|four|five|six|seven|eight"
+    r"|nine|ten|eleven|twelve|half|dozen)(?:\s*x)?\s+(?P<rest>.+)$",
+    re.IGNORECASE,
+)
+_NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "half": 0.5, "dozen": 12,
+}
+
+
+class Phrase(NamedTuple):
+    name: str  # what is looked up
+    quantity: float = 1.0  # how many ``unit``s
+    amount: Optional[str] = None  # the quantity (and unit) as written; None when not given
+    unit: Optional[str] = None  # canonical unit; None counts pieces or servings
+
+    @property
+    def key(self) -> str:
+        """The dish cache key of the name, so "2 eggs" and "egg" share one lookup."""
+        return canonical_key(self.name)
+
+
+def _number(amount: str) -> float:
+    amount = amount.lower()
+    if amount in _NUMBER_WORDS:
+        return float(_NUMBER_WORDS[amount])
+    whole, _, fraction = amount.rpartition(" ")
+    if "/" in fraction:
+        numerator, denominator = fraction.split("/")
+        value = int(numerator) / int(denominator) if int(denominator) else 0.0
+        return value + (float(whole) if whole else 0.0)
+    return float(amount)
+
+
+def parse_phrase(text: str) -> Phrase:
+    """One ingredient phrase; a leading quantity and unit ("1 1/2 cups of rice") are split off."""
+    text = " ".join(text.split())
+    match = _QUANTITY.match(text)
+    if not match:
+        return Phrase(text)
+    amount, rest = match.group("amount"), match.group("rest")
+    quantity = _number(amount)
+    if quantity <= 0:
+        return Phrase(text)
+    unit, name = leading_unit(rest)
+    if unit:
+        written = text[:len(text) - len(name)].strip()
+        if written.lower().endswith(" of"):
+            written = written[:-3]
+        return Phrase(name, quantity, written, unit)
+    # "a"/"an" are articles more often than amounts; keep them out of the breakdown
+    return Phrase(rest, quantity, None if amount.lower() in ("a", "an") else amount)
+
+
+def split_dish(dish_name: str) -> List[Phrase]:
+    """Ingredient phrases of ``dish_name``; the whole name, unparsed, when it is one dish."""
+    text = " ".join(dish_name.split())
+    parts = [p for chunk in _HARD_SEPARATORS.split(text) for p in _SOFT_SEPARATORS.split(chunk)]
+    parts = [p for p in parts if p]
+    if len(parts) < 2:
+        return [Phrase(text)]
+    phrases = [parse_phrase(p) for p in parts]
+    if _HARD_SEPARATORS.search(text) or any(p.amount is not None for p in phrases):
+        return phrases
+    return [Phrase(text)]
+
+
+def whole_name_candidate(dish_name: str, phrases: List[Phrase]) -> Optional[Phrase]:
+    """The whole name as one phrase when a split without quantities may be one food's name."""
+    if len(phrases) < 2 or any(p.amount is not None for p in phrases):
+        return None
+    return Phrase(" ".join(dish_name.split()))
+
+
+def names_food(name: str, description: Optional[str]) -> bool:
+    """Whether ``description`` contains every word of ``name`` ("Pizza, cheese, regular crust, frozen")."""
+    if not description:
+        return False
+    return set(canonical_key(name).split()) <= set(canonical_key(description).split())
+
+
+def unique_phrases(phrases: List[Phrase]) -> Dict[str, str]:
+    """Map each distinct phrase key to the name to look it up by."""
+    unique: Dict[str, str] = {}
+    for phrase in phrases:
+        unique.setdefault(phrase.key, phrase.name)
+    return unique
@@ -1,48 +1,389 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+import asyncio
+import csv
+import io
+import json
+import logging
+import math
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Literal, NamedTuple, Optional, Tuple, Union
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.auth.errors import success_response
-from app.verify import get_current_user
+from app.db.init_db import get_async_db
+from app.verify import get_current_admin, get_current_user_id
+import app.db.crud as crud
+import models
 import schemas
-from ..usda.service import get_best_calorie_for_dish
+from ..usda.portions import normalize_unit, portion_factor
+from ..usda.records import DishRecord
+from ..usda.service import get_best_calorie_for_dish_async
+from ..utils.rate_limiter import RateLimit
+from ..utils.resilience import UpstreamUnavailable
+from .decompose import (
+    DISH_MAX_INGREDIENTS,
+    Phrase,
+    names_food,
+    split_dish,
+    unique_phrases,
+    whole_name_candidate,
+)
 
-from slowapi import Limiter
-from slowapi.util import get_remote_address
-from fastapi import Depends
+# Single and batch lookups draw from one shared budget per user (or IP)
+calories_rate_limit = RateLimit("get-calories")
 
-# Use the same limiter instance
-limiter = Limiter(key_func=get_remote_address)
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-@router.post("/get-calories", response_model=schemas.CalorieResponse)
-@limiter.limit("15/minute")
-def get_calories(payload: schemas.GetCaloriesRequest, request: Request, user=Depends(get_current_user)):
-    name = payload.dish_name.strip()
+DISH_NAME_TOO_SHORT = {"status": "GE42201", "error": "Dish name too short"}
+DISH_NOT_FOUND = {"status": "GE40401", "error": "Dish not found or calories not available"}
+INVALID_DATE_RANGE = {"status": "GE42202", "error": "Invalid date range"}
+TOO_MANY_INGREDIENTS = {"status": "GE42203", "error": f"A dish may list at most {DISH_MAX_INGREDIENTS} ingredients"}
+UNIT_NOT_CONVERTIBLE = {"status": "GE42204", "error": "Unknown unit, or no gram weight for it for this dish"}
+PORTION_FOR_SINGLE_DISH = {"status": "GE42205", "error": "Quantity and unit apply to a single dish; write amounts into the list instead"}
+LOOKUP_FAILED = {"status": "GE50000", "error": "Calorie lookup failed"}
+UPSTREAM_UNAVAILABLE = {"status": "GE50302", "error": "USDA FoodData Central is unavailable, retry later"}
+
+# rows fetched per server-side cursor round trip and written per response chunk
+EXPORT_BATCH_SIZE = 1000
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _valid_dish_name(dish_name: str) -> Optional[str]:
+    name = dish_name.strip()
     if not name or len(name) < 2:
-        raise HTTPException(status_code=422, detail={
-                    "status": "GE42201",
-                    "error": "Dish name too short",
-                })
-    usda = get_best_calorie_for_dish(name)
-    if not usda or usda.get("calories_per_unit") is None:
-        raise HTTPException(status_code=404, detail={
-                    "status": "GE40401",
-                    "error": "Dish not found or calories not available",
-                })
-        
-    calories_per_serving = float(usda["calories_per_unit"])
-    total = calories_per_serving * payload.servings
-    raw = usda.get("raw", {}) or {}
-    ingredients = None
-    ing_text = raw.get("ingredients") or raw.get("ingredientDescription") or None
-    if ing_text:
-        ingredients = [schemas.IngredientBreakdown(name=ing_text[:400], calories_per_serving=calories_per_serving)]
-    resp = schemas.CalorieResponse(
-        dish_name=payload.dish_name,
-        servings=payload.servings,
+        return None
+    return name
+
+
+class ParsedDish(NamedTuple):
+    phrases: List[Phrase]
+    quantity: Optional[float]  # amount in one serving of a single dish, in ``unit``
+    unit: Optional[str]  # canonical unit (see app/usda/portions.py)
+    whole: Optional[Phrase] = None  # the unsplit name, used instead when it names one food
+
+
+def _parse_dish(item: Union[schemas.GetCaloriesRequest, schemas.MealItem]) -> Tuple[Optional[ParsedDish], Optional[dict]]:
+    """(parsed dish, None) for a usable dish and portion, else (None, error)."""
+    name = _valid_dish_name(item.dish_name)
+    if not name:
+        return None, DISH_NAME_TOO_SHORT
+    phrases = split_dish(name)
+    if any(len(p.name) < 2 for p in phrases):
+        return None, DISH_NAME_TOO_SHORT
+    if len(phrases) > DISH_MAX_INGREDIENTS:
+        return None, TOO_MANY_INGREDIENTS
+    unit = normalize_unit(item.unit)
+    if item.unit and unit is None:
+        return None, UNIT_NOT_CONVERTIBLE
+    if (item.quantity is not None or unit) and not _is_single(phrases):
+        return None, PORTION_FOR_SINGLE_DISH
+    return ParsedDish(phrases, item.quantity, unit, whole_name_candidate(name, phrases)), None
+
+
+def _is_single(phrases: List[Phrase]) -> bool:
+    return len(phrases) == 1 and phrases[0].amount is None
+
+
+def _http_status(error: dict) -> int:
+    # codes embed their HTTP status: GE40401 -> 404
+    return int(error["status"][2:5])
+
+
+def _retry_after(by_key: Dict[str, Union[DishRecord, None, BaseException]]) -> Dict[str, str]:
+    """Retry-After for a 503: until the USDA circuit lets calls through again, at least 1 s."""
+    waits = [r.retry_after or 0 for r in by_key.values() if isinstance(r, UpstreamUnavailable)]
+    return {"Retry-After": str(max(1, math.ceil(max(waits, default=0))))}
+
+
+async def _resolve(unique: Dict[str, str]) -> Dict[str, Union[DishRecord, None, BaseException]]:
+    """Look every distinct phrase up once, concurrently, through the shared dish cache."""
+    keys = list(unique)
+    resolved = await asyncio.gather(
+        *(get_best_calorie_for_dish_async(unique[k]) for k in keys), return_exceptions=True
+    )
+    return dict(zip(keys, resolved))
+
+
+def _macros(parts: List[Tuple[DishRecord, float]]) -> Optional[schemas.Macronutrients]:
+    totals = {}
+    for field, attr in (("protein_g", "protein_per_unit"), ("fat_g", "fat_per_unit"),
+                        ("carbohydrate_g", "carbohydrate_per_unit")):
+        values = [getattr(usda, attr) * quantity for usda, quantity in parts if getattr(usda, attr) is not None]
+        totals[field] = sum(values) if values else None
+    if all(v is None for v in totals.values()):
+        return None
+    return schemas.Macronutrients(**totals)
+
+
+def _settle(dish: ParsedDish, by_key: Dict[str, Union[DishRecord, None, BaseException]]) -> ParsedDish:
+    """The dish as one food when its whole name matched a food's description, else as split."""
+    if dish.whole is not None:
+        usda = by_key[dish.whole.key]
+        if isinstance(usda, DishRecord) and names_food(dish.whole.name, usda.description):
+            return ParsedDish([dish.whole], dish.quantity, dish.unit)
+    return dish
+
+def _calorie_response(dish_name: str, servings: int, dish: ParsedDish,
+                      by_key: Dict[str, Union[DishRecord, None, BaseException]]
+                      ) -> Tuple[Optional[schemas.CalorieResponse], Optional[int], Optional[dict]]:
+    """(response, fdc_id, None) for a resolved dish, else (None, None, error).
+
+    A plain dish keeps its single USDA match and ingredient text; one
+    serving is the requested quantity and unit, else the food's own
+    serving (see portion_factor). A split dish is the sum of its phrases,
+    each converted from its own amount; phrases USDA has no calories for,
+    could not be looked up, or whose unit does not convert, are listed with
+    none and left out. USDA being unavailable is UPSTREAM_UNAVAILABLE (503),
+    never a not-found.
+    """
+    dish = _settle(dish, by_key)
+    if _is_single(dish.phrases):
+        usda = by_key[dish.phrases[0].key]
+        if isinstance(usda, UpstreamUnavailable):
+            return None, None, UPSTREAM_UNAVAILABLE
+        if isinstance(usda, BaseException):
+            return None, None, LOOKUP_FAILED
+        if not usda or usda.calories_per_unit is None:
+            return None, None, DISH_NOT_FOUND
+        portion = portion_factor(usda, dish.quantity, dish.unit)
+        if portion is None:
+            return None, None, UNIT_NOT_CONVERTIBLE
+        factor, serving_grams = portion
+        calories_per_serving = float(usda.calories_per_unit) * factor
+        ingredients = None
+        if usda.ingredients:
+            ingredients = [schemas.IngredientBreakdown(name=usda.ingredients, calories_per_serving=calories_per_serving)]
+        parts = [(usda, factor)]
+        fdc_id = usda.fdc_id
+    else:
+        calories_per_serving = 0.0
+        serving_grams = 0.0
+        ingredients = []
+        parts = []
+        unavailable = False
+        for phrase in dish.phrases:
+            usda = by_key[phrase.key]
+            calories = grams = None
+            if isinstance(usda, UpstreamUnavailable):
+                unavailable = True
+            elif isinstance(usda, BaseException):
+                logger.error("Ingredient %r of %r failed: %s", phrase.name, dish_name, usda)
+            elif usda and usda.calories_per_unit is not None:
+                quantity = phrase.quantity if phrase.amount is not None else None
+                portion = portion_factor(usda, quantity, phrase.unit)
+                if portion is not None:
+                    factor, grams = portion
+                    calories = float(usda.calories_per_unit) * factor
+                    calories_per_serving += calories
+                    parts.append((usda, factor))
+            if serving_grams is not None:
+                serving_grams = serving_grams + grams if grams is not None else None
+            ingredients.append(schemas.IngredientBreakdown(
+                name=phrase.name, calories_per_serving=calories, amount_descriptor=phrase.amount, grams=grams))
+        if not parts:
+            return None, None, UPSTREAM_UNAVAILABLE if unavailable else DISH_NOT_FOUND
+        fdc_id = None
+    result = schemas.CalorieResponse(
+        dish_name=dish_name,
+        servings=servings,
         calories_per_serving=calories_per_serving,
-        total_calories=total,
+        total_calories=calories_per_serving * servings,
         source="USDA FoodData Central",
-        ingredients=ingredients
+        serving_grams=serving_grams,
+        ingredients=ingredients,
+        macros_per_serving=_macros(parts),
+        total_macros=_macros([(usda, factor * servings) for usda, factor in parts]),
+    )
+    return result, fdc_id, None
+
+
+def _meal_entry(user_id: int, result: schemas.CalorieResponse, fdc_id: Optional[int],
+                eaten_at: Optional[datetime]) -> models.MealEntry:
+    eaten_at = eaten_at or datetime.now(timezone.utc)
+    return models.MealEntry(
+        user_id=user_id,
+        dish_name=result.dish_name,
+        fdc_id=fdc_id,
+        servings=result.servings,
+        calories_per_serving=result.calories_per_serving,
+        total_calories=result.total_calories,
+        eaten_at=eaten_at,
+        day=eaten_at.date(),
     )
-    return resp
-   
\ No newline at end of file
+
+
+def _meal_dishes(payload: schemas.MealCaloriesRequest) -> List[Tuple[Optional[ParsedDish], Optional[dict]]]:
+    return [_parse_dish(item) for item in payload.items]
+
+
+def _unique(dishes: List[Optional[ParsedDish]]) -> Dict[str, str]:
+    return unique_phrases([p for dish in dishes if dish for p in (dish.whole, *dish.phrases) if p])
+
+
+
+async def dish_request(payload: schemas.GetCaloriesRequest, request: Request) -> schemas.GetCaloriesRequest:
+    # one token per distinct ingredient, at least one per request
+    dish, _ = _parse_dish(payload)
+    await calories_rate_limit.hit(request, cost=len(_unique([dish])))
+    return payload
+
+
+async def meal_request(payload: schemas.MealCaloriesRequest, request: Request) -> schemas.MealCaloriesRequest:
+    # one token per distinct dish or ingredient across the meal, at least one per request
+    unique = _unique([dish for dish, _ in _meal_dishes(payload)])
+    await calories_rate_limit.hit(request, cost=len(unique))
+    return payload
+
+
+@router.post("/get-calories", response_model=schemas.CalorieResponse)
+async def get_calories(
+    payload: schemas.GetCaloriesRequest = Depends(dish_request),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Calories for one dish; a list of ingredients is split and each one resolved concurrently."""
+    dish, error = _parse_dish(payload)
+    if error:
+        raise HTTPException(status_code=422, detail=error)
+    by_key = await _resolve(_unique([dish]))
+    resolved = by_key[dish.phrases[0].key]
+    if _is_single(dish.phrases) and isinstance(resolved, BaseException) and not isinstance(resolved, UpstreamUnavailable):
+        raise resolved
+    result, fdc_id, error = _calorie_response(payload.dish_name, payload.servings, dish, by_key)
+    if error:
+        headers = _retry_after(by_key) if error is UPSTREAM_UNAVAILABLE else None
+        raise HTTPException(status_code=_http_status(error), detail=error, headers=headers)
+    if payload.log:
+        await crud.log_meals(db, [_meal_entry(user_id, result, fdc_id, payload.eaten_at)])
+    return result
+
+
+@router.post("/get-calories/batch", response_model=schemas.MealCaloriesResponse)
+async def get_meal_calories(
+    payload: schemas.MealCaloriesRequest = Depends(meal_request),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Calories for a whole meal; each distinct dish or ingredient is resolved once, concurrently.
+
+    Item failures are reported per item and do not fail the request. With
+    log=True the resolved items are logged together in one transaction.
+    """
+    parsed = _meal_dishes(payload)
+    by_key = await _resolve(_unique([dish for dish, _ in parsed]))
+
+    items = []
+    entries = []
+    total = 0.0
+    for item, (dish, error) in zip(payload.items, parsed):
+        result = fdc_id = None
+        if not error:
+            result, fdc_id, error = _calorie_response(item.dish_name, item.servings, dish, by_key)
+        if error:
+            if error is LOOKUP_FAILED:
+                logger.error("Meal item %r failed: %s", item.dish_name, by_key[dish.phrases[0].key])
+            items.append(schemas.MealItemResult(dish_name=item.dish_name, servings=item.servings, error=error))
+            continue
+        total += result.total_calories
+        if payload.log:
+            entries.append(_meal_entry(user_id, result, fdc_id, payload.eaten_at))
+        items.append(schemas.MealItemResult(dish_name=item.dish_name, servings=item.servings, result=result))
+
+    if entries:
+        await crud.log_meals(db, entries)
+
+    failed = sum(1 for i in items if i.error is not None)
+    return schemas.MealCaloriesResponse(
+        items=items,
+        total_calories=total,
+        resolved=len(items) - failed,
+        failed=failed,
+    )
+
+
+@router.get("/summary", response_model=schemas.CalorieSummaryResponse)
+async def get_calorie_summary(
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Logged calories per day from the daily rollup; defaults to the last 7 days.
+
+    Reads one summary row per day, so the cost does not grow with the number
+    of logged meals. Days without entries are returned as zero.
+    """
+    end = end or datetime.now(timezone.utc).date()
+    start = start or end - timedelta(days=6)
+    if start > end or (end - start).days >= schemas.SUMMARY_MAX_DAYS:
+        raise HTTPException(status_code=422, detail=INVALID_DATE_RANGE)
+    stored = {s.day: s for s in await crud.daily_summaries(db, user_id, start, end)}
+    days: List[schemas.DailyCalories] = []
+    for offset in range((end - start).days + 1):
+        day = start + timedelta(days=offset)
+        row = stored.get(day)
+        days.append(schemas.DailyCalories(
+            day=day,
+            total_calories=row.total_calories if row else 0.0,
+            entries=row.entries if row else 0,
+        ))
+    return schemas.CalorieSummaryResponse(
+        start=start,
+        end=end,
+        total_calories=sum(d.total_calories for d in days),
+        days=days,
+    )
+
+
+def _export_chunk(rows, fmt: str) -> str:
+    if fmt == "csv":
+        out = io.StringIO()
+        csv.writer(out).writerows(rows)
+        return out.getvalue()
+    return "".join(
+        json.dumps(dict(zip(crud.MEAL_EXPORT_COLUMNS, row)), default=lambda v: v.isoformat()) + "\n"
+        for row in rows
+    )
+
+
+def _export_response(db: AsyncSession, fmt: str, user_id: Optional[int],
+                     start: Optional[date], end: Optional[date]) -> StreamingResponse:
+    async def body():
+        if fmt == "csv":
+            yield ",".join(crud.MEAL_EXPORT_COLUMNS) + "\r\n"
+        async for rows in crud.stream_meal_entries(db, user_id, start, end, batch_size=EXPORT_BATCH_SIZE):
+            yield _export_chunk(rows, fmt)
+
+    return StreamingResponse(
+        body(),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="meals.{fmt}"'},
+    )
+
+
+@router.get("/export")
+async def export_meals(
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Stream the caller's logged meals as NDJSON or CSV, oldest first."""
+    return _export_response(db, format, user_id, start, end)
+
+
+@router.get("/export/all")
+async def export_all_meals(
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    user_id: Optional[int] = Query(None),
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    admin=Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Admin export of every user's logged meals, optionally for one user_id."""
+    return _export_response(db, format, user_id, start, end)
@@ -82,11 +82,14 @@ async def http_exception_handler(request: Request, ex: HTTPException):
             str(ex.detail) if ex.detail else "An unexpected error occurred."
         )
 
-    return error_response(
+    response = error_response(
         status_code=custom_status_code,
         error=error_message,
         http_status_code=ex.status_code,
     )
+    if ex.headers:  # e.g. Retry-After on 429/503
+        response.headers.update(ex.headers)
+    return response
 
 
 async def exception_handler(request: Request, ex: Exception):
@@ -1,10 +1,11 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, or_, select, text
 
 import models
 import schemas
+from app.auth.user_cache import invalidate_user
 
-def create_user(db: Session, user: schemas.UserCreate):
+async def create_user(db: AsyncSession, user: schemas.UserCreate):
     u = models.User(
         first_name=user.first_name,
         last_name=user.last_name,
@@ -12,18 +13,19 @@ def create_user(db: Session, user: schemas.UserCreate):
         hashed_password=user.password  # hashed before calling this ideally
     )
     db.add(u)
-    db.commit()
-    db.refresh(u)
+    await db.commit()
+    await db.refresh(u)
     return u
 
-def get_user(db: Session, user_id: int):
-    return db.query(models.User).filter(models.User.id == user_id).first()
+async def get_user(db: AsyncSession, user_id: int):
+    return await db.get(models.User, user_id)
 
-def get_user_by_email(db: Session, email: str):
-    return db.query(models.User).filter(models.User.email == email).first()
+async def get_user_by_email(db: AsyncSession, email: str):
+    result = await db.execute(select(models.User).where(models.User.email == email))
+    return result.scalars().first()
 
-def update_user(db: Session, user_id: int, patch: schemas.UserUpdate):
-    u = get_user(db, user_id)
+async def update_user(db: AsyncSession, user_id: int, patch: schemas.UserUpdate):
+    u = await get_user(db, user_id)
     if not u:
         return None
     if patch.first_name is not None:
@@ -32,25 +34,119 @@ def update_user(db: Session, user_id: int, patch: schemas.UserUpdate):
         u.last_name = patch.last_name
     if patch.email is not None:
         u.email = patch.email
-    db.commit()
-    db.refresh(u)
+    await db.commit()
+    await db.refresh(u)
+    invalidate_user(user_id)
     return u
 
-def delete_user(db: Session, user_id: int):
-    u = get_user(db, user_id)
+async def delete_user(db: AsyncSession, user_id: int):
+    u = await get_user(db, user_id)
     if not u:
         return False
-    db.delete(u)
-    db.commit()
+    await db.delete(u)
+    await db.commit()
+    invalidate_user(user_id, deleted=True)
     return True
 
-def list_users(db: Session, limit: int = 10, offset: int = 0, q: str | None = None):
-    query = db.query(models.User)
+def dialect_insert(db: AsyncSession, model):
+    """INSERT for the session's database, with its ON CONFLICT support."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
+def _search_filter(db: AsyncSession, q: str):
+    # SQLite answers substring search from the users_fts trigram table; the
+    # trigram tokenizer needs at least three characters to match anything.
+    if db.get_bind().dialect.name == "sqlite" and len(q) >= 3:
+        phrase = '"' + q.replace('"', '""') + '"'
+        return text("users.id IN (SELECT rowid FROM users_fts WHERE users_fts MATCH :fts_query)").bindparams(fts_query=phrase)
+    like = f"%{q}%"
+    return or_(models.User.first_name.ilike(like),
+               models.User.last_name.ilike(like),
+               models.User.email.ilike(like))
+
+async def count_users(db: AsyncSession, query, estimated: bool = False):
+    # Without a filter Postgres already tracks the row count in pg_class,
+    # which is free to read but only as fresh as the last ANALYZE/VACUUM.
+    if estimated and query.whereclause is None and db.get_bind().dialect.name == "postgresql":
+        reltuples = await db.scalar(text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'users'::regclass"))
+        if reltuples is not None and reltuples >= 0:
+            return reltuples
+    return await db.scalar(select(func.count()).select_from(query.subquery()))
+
+async def list_users(db: AsyncSession, limit: int = 10, offset: int = 0, q: str | None = None,
+                     after_id: int | None = None, count: str = "none"):
+    """Return one page of users ordered by id, plus the next cursor and a total.
+
+    Pass the returned cursor back as `after_id` to get the next page from the
+    primary key index, however deep it is. `count` is "none", "exact" or
+    "estimated"; the total is None when not requested.
+    """
+    query = select(models.User)
     if q:
-        like = f"%{q}%"
-        query = query.filter(or_(models.User.first_name.ilike(like),
-                                 models.User.last_name.ilike(like),
-                                 models.User.email.ilike(like)))
-    total = query.count()
-    items = query.order_by(models.User.id).offset(offset).limit(limit).all()
-    return items, total
+        query = query.where(_search_filter(db, q))
+    total = None
+    if count != "none":
+        total = await count_users(db, query, estimated=count == "estimated")
+    if after_id is not None:
+        query = query.where(models.User.id > after_id)
+    result = await db.execute(query.order_by(models.User.id).offset(offset).limit(limit + 1))
+    items = result.scalars().all()
+    next_cursor = items[limit - 1].id if len(items) > limit else None
+    return items[:limit], next_cursor, total
+
+async def log_meals(db: AsyncSession, entries: list):
+    """Store meal entries and fold them into their users' daily totals in one transaction."""
+    db.add_all(entries)
+    totals = {}
+    for e in entries:
+        total = totals.setdefault((e.user_id, e.day), [0.0, 0])
+        total[0] += e.total_calories
+        total[1] += 1
+    summary = models.DailyCalorieSummary
+    statement = dialect_insert(db, summary).values([
+        {"user_id": user_id, "day": day, "total_calories": calories, "entries": count}
+        for (user_id, day), (calories, count) in totals.items()
+    ])
+    statement = statement.on_conflict_do_update(
+        index_elements=[summary.user_id, summary.day],
+        set_={
+            "total_calories": summary.total_calories + statement.excluded.total_calories,
+            "entries": summary.entries + statement.excluded.entries,
+        },
+    )
+    await db.execute(statement)
+    await db.commit()
+
+async def daily_summaries(db: AsyncSession, user_id: int, start, end):
+    summary = models.DailyCalorieSummary
+    result = await db.execute(
+        select(summary)
+        .where(summary.user_id == user_id, summary.day >= start, summary.day <= end)
+        .order_by(summary.day)
+    )
+    return result.scalars().all()
+
+MEAL_EXPORT_COLUMNS = ("id", "user_id", "day", "eaten_at", "dish_name", "fdc_id", "servings",
+                       "calories_per_serving", "total_calories")
+
+async def stream_meal_entries(db: AsyncSession, user_id: int | None = None, start=None, end=None,
+                              batch_size: int = 1000):
+    """Yield meal entry rows (MEAL_EXPORT_COLUMNS) in id order, batch_size rows at a time.
+
+    Rows come from a server-side cursor as plain tuples, so only one batch is
+    held in memory however long the history is.
+    """
+    entry = models.MealEntry
+    query = select(*(getattr(entry, c) for c in MEAL_EXPORT_COLUMNS)).order_by(entry.id)
+    if user_id is not None:
+        query = query.where(entry.user_id == user_id)
+    if start is not None:
+        query = query.where(entry.day >= start)
+    if end is not None:
+        query = query.where(entry.day <= end)
+    result = await db.stream(query.execution_options(yield_per=batch_size))
+    async for rows in result.partitions():
+        yield rows
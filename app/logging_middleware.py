@@ -1,26 +1,74 @@
+import atexit
 import logging
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
+import os
+import queue
 import time
-import json
-
-logger = logging.getLogger("meal_calorie_backend")
-logger.setLevel(logging.INFO)
-handler = logging.StreamHandler()
-formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-handler.setFormatter(formatter)
-logger.addHandler(handler)
-
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        start = time.time()
-        # request info
+from logging.handlers import QueueHandler, QueueListener
+
+from dotenv import load_dotenv
+
+from app.utils.metrics import http_request_duration
+
+load_dotenv()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG").upper()
+LOG_FORMAT = "%(asctime)s - %(threadName)s %(filename)s:%(lineno)d - %(funcName)s() - %(levelname)s - %(message)s"
+
+logger = logging.getLogger("meal_calorie_backend.access")
+
+
+def configure_logging(level: str = LOG_LEVEL) -> QueueListener:
+    """Route root logging through a queue so request handlers never block on I/O.
+
+    Records are formatted and written by the listener's own thread; the
+    event loop only enqueues them. The listener is flushed at exit.
+    """
+    records = queue.SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    listener = QueueListener(records, handler, respect_handler_level=True)
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(QueueHandler(records))
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+class AccessLogMiddleware:
+    """Logs method, path, status and duration of each HTTP request.
+
+    Plain ASGI: it wraps ``send`` to see the status code and passes every
+    message through untouched, so bodies are never read or buffered and
+    streaming responses stay streaming. Duration runs until the app has
+    sent the whole response.
+
+    The duration also goes to the http_request_duration_seconds histogram,
+    labelled with the matched route template so ids in paths do not
+    create new series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter_ns()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
         try:
-            body = await request.json()
-        except Exception:
-            body = None
-        logger.info(f"Incoming {request.method} {request.url.path} body={json.dumps(body) if body else None}")
-        response = await call_next(request)
-        duration = (time.time() - start) * 1000
-        logger.info(f"Response {request.method} {request.url.path} status_code={response.status_code} duration_ms={duration:.2f}")
-        return response
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed_ns = time.perf_counter_ns() - start
+            route = scope.get("route")
+            http_request_duration.observe(elapsed_ns / 1e9, scope["method"],
+                                          getattr(route, "path", "unmatched"), str(status))
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("%s %s %d %.2f ms", scope["method"], scope["path"], status, elapsed_ns / 1e6)
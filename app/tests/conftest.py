@@ -4,19 +4,25 @@ PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
+# No background warm-up lookups against the real USDA API while testing
+os.environ.setdefault("USDA_WARMUP_TOP_N", "0")
 
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
-from app.db.init_db import Base, get_db
+from app.db.init_db import Base, get_async_db, get_db
+from app.utils.cache import MISSING, LRUCache
 from main import app
 
 # Use a separate SQLite test DB
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db")
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 # Dependency override
 def override_get_db():
@@ -26,7 +32,12 @@ def override_get_db():
     finally:
         db.close()
 
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
 
 # ✅ Create and drop tables for test session
 @pytest.fixture(scope="session", autouse=True)
@@ -35,6 +46,27 @@ def setup_db():
     yield
     Base.metadata.drop_all(bind=engine)
 
+class DownTier(LRUCache):
+    """A shared cache tier whose every call fails, like Redis during an outage."""
+
+    name = "down"
+
+    def get(self, key, default=MISSING):
+        raise ConnectionError("tier 2 unreachable")
+
+    def set(self, key, value, ttl=None):
+        raise ConnectionError("tier 2 unreachable")
+
+    def delete(self, key):
+        raise ConnectionError("tier 2 unreachable")
+
+    def clear(self):
+        raise ConnectionError("tier 2 unreachable")
+
+@pytest.fixture
+def down_tier():
+    return DownTier()
+
 @pytest.fixture
 def client():
     with TestClient(app) as c:
@@ -47,3 +79,26 @@ def db():
         yield db
     finally:
         db.close()
+
+@pytest.fixture
+def fake_usda(monkeypatch):
+    """Route USDA searches to the local fault-injecting stand-in (benchmarks/fake_fdc.py).
+
+    Returns the fake app: edit ``app.state.config`` to inject latency and
+    errors, read ``app.state.calls`` for the number of searches it served.
+    The circuit breaker, retry budget and latency window start fresh.
+    """
+    import httpx
+    from app.usda import service
+    from app.utils.resilience import CircuitBreaker, LatencyWindow, RetryBudget
+    from benchmarks.fake_fdc import SEARCH_PATH, build_app
+
+    fake = build_app()
+    service.usda_cache.clear()
+    monkeypatch.setattr(service, "_async_client", httpx.AsyncClient(transport=httpx.ASGITransport(app=fake)))
+    monkeypatch.setattr(service, "USDA_SEARCH_URL", f"http://fdc.test{SEARCH_PATH}")
+    monkeypatch.setattr(service, "USDA_RETRY_BACKOFF_SECONDS", 0.001)
+    monkeypatch.setattr(service, "usda_breaker", CircuitBreaker(failure_threshold=2, reset_timeout=0.2))
+    monkeypatch.setattr(service, "usda_retry_budget", RetryBudget(ratio=0.2, min_per_second=10))
+    monkeypatch.setattr(service, "usda_latency", LatencyWindow())
+    return fake
@@ -37,4 +37,101 @@ def test_login_invalid_credentials(client):
     payload = {"email": "john@example.com", "password": "wrongpass"}
     res = client.post("/auth/login", json=payload)
     assert res.status_code == 401
-    assert "Invalid credentials" in res.text
\ No newline at end of file
+    assert "Invalid credentials" in res.text
+
+def _credentials(user_id):
+    from fastapi.security import HTTPAuthorizationCredentials
+    from app.utils.security import create_access_token
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=create_access_token(subject=str(user_id)))
+
+@pytest.fixture
+def user_lookups(monkeypatch):
+    from app.auth import user_cache
+    user_cache.verified_users.clear()
+    user_cache.revoked_users.clear()
+    calls = []
+
+    async def fake_get_user(db, user_id):
+        calls.append(user_id)
+        return models.User(id=user_id)
+
+    monkeypatch.setattr("app.db.crud.get_user", fake_get_user)
+    return calls
+
+@pytest.mark.asyncio
+async def test_db_auth_queries_user_every_time(monkeypatch, user_lookups):
+    from app.verify import get_current_user_id
+    monkeypatch.setattr("app.auth.user_cache.AUTH_MODE", "db")
+    assert await get_current_user_id(_credentials(6), db=None) == 6
+    assert await get_current_user_id(_credentials(6), db=None) == 6
+    assert user_lookups == [6, 6]
+
+@pytest.mark.asyncio
+async def test_cached_auth_queries_user_once(monkeypatch, user_lookups):
+    from app.verify import get_current_user_id
+    monkeypatch.setattr("app.auth.user_cache.AUTH_MODE", "cached")
+    assert await get_current_user_id(_credentials(7), db=None) == 7
+    assert await get_current_user_id(_credentials(7), db=None) == 7
+    assert user_lookups == [7]
+
+@pytest.mark.asyncio
+async def test_stateless_auth_never_queries(monkeypatch, user_lookups):
+    from app.verify import get_current_user_id
+    monkeypatch.setattr("app.auth.user_cache.AUTH_MODE", "stateless")
+    assert await get_current_user_id(_credentials(8), db=None) == 8
+    assert user_lookups == []
+
+@pytest.mark.asyncio
+async def test_deleted_user_token_rejected(monkeypatch, user_lookups):
+    from fastapi import HTTPException
+    from app.auth.user_cache import invalidate_user
+    from app.verify import get_current_user_id
+    monkeypatch.setattr("app.auth.user_cache.AUTH_MODE", "stateless")
+    invalidate_user(9, deleted=True)
+    with pytest.raises(HTTPException) as exc:
+        await get_current_user_id(_credentials(9), db=None)
+    assert exc.value.status_code == 401
+    assert exc.value.detail["status"] == "GE40103"
+
+@pytest.mark.asyncio
+async def test_update_invalidates_verified_user(monkeypatch, user_lookups):
+    from app.auth.user_cache import invalidate_user
+    from app.verify import get_current_user_id
+    monkeypatch.setattr("app.auth.user_cache.AUTH_MODE", "cached")
+    await get_current_user_id(_credentials(10), db=None)
+    invalidate_user(10)
+    await get_current_user_id(_credentials(10), db=None)
+    assert user_lookups == [10, 10]
+
+@pytest.mark.asyncio
+async def test_password_hasher_round_trip():
+    from app.utils.security import PasswordHasher, get_password_hash, verify_password
+    hasher = PasswordHasher(workers=2, max_pending=4)
+    try:
+        hashed = await hasher.run(get_password_hash, "Str0ng!pass")
+        assert await hasher.run(verify_password, "Str0ng!pass", hashed)
+        assert not await hasher.run(verify_password, "wrong", hashed)
+        assert hasher.pending == 0
+    finally:
+        hasher.shutdown()
+
+@pytest.mark.asyncio
+async def test_password_hasher_fails_fast_when_queue_full():
+    import asyncio
+    import threading
+    from fastapi import HTTPException
+    from app.utils.security import PasswordHasher
+    hasher = PasswordHasher(workers=1, max_pending=2)
+    release = threading.Event()
+    try:
+        blocked = [asyncio.ensure_future(hasher.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as exc:
+            await hasher.run(release.wait)
+        assert exc.value.status_code == 503
+        assert exc.value.detail["status"] == "GE50301"
+        release.set()
+        await asyncio.gather(*blocked)
+    finally:
+        release.set()
+        hasher.shutdown()
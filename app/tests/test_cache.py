@@ -0,0 +1,125 @@
+import time
+
+import pytest
+
+from app.utils.cache import (
+    MISSING,
+    LRUCache,
+    RedisCache,
+    SQLiteCache,
+    TieredCache,
+    dumps,
+    loads,
+)
+
+
+def test_serialization_round_trip_and_compression():
+    small = {"calories_per_unit": 130.0, "description": "Rice"}
+    large = {"ingredients": "rice, salt, water, " * 50}
+    assert loads(dumps(small)) == small
+    assert loads(dumps(None)) is None
+    blob = dumps(large)
+    assert loads(blob) == large
+    assert len(blob) < len(large["ingredients"])
+
+
+def test_lru_evicts_least_recently_used_and_counts():
+    cache = LRUCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    stats = cache.stats.as_dict()
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 3
+    assert stats["misses"] == 1
+
+
+def test_lru_expires_entries():
+    cache = LRUCache(maxsize=10, ttl=60)
+    cache.set("a", 1, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("a") is MISSING
+    assert cache.stats.expirations == 1
+
+
+def test_sqlite_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    first = SQLiteCache(path, maxsize=100, ttl=60)
+    first.set("rice", {"calories_per_unit": 130.0})
+    first.set("unknown dish", None)
+    first.close()
+
+    second = SQLiteCache(path, maxsize=100, ttl=60)
+    assert second.get("rice") == {"calories_per_unit": 130.0}
+    assert second.get("unknown dish") is None
+    assert second.get("pasta") is MISSING
+    assert second.stats.hits == 2
+    assert second.stats.misses == 1
+
+
+def test_sqlite_tier_prunes_to_maxsize(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"), maxsize=10, ttl=60)
+    for i in range(25):
+        cache.set(f"dish-{i}", i)
+    count = cache._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+    assert count <= 10
+    assert cache.stats.evictions > 0
+
+
+def test_sqlite_tier_prunes_expiring_entries_before_permanent_ones(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"), maxsize=100, ttl=None)
+    cache.set("permanent", 1)
+    for i in range(5):
+        cache.set(f"dish-{i}", i, ttl=60 + i)
+    cache.maxsize = 3
+    cache._prune()
+    assert cache.get("permanent") == 1
+    assert [cache.get(f"dish-{i}") for i in range(5)] == [MISSING, MISSING, MISSING, 3, 4]
+
+
+def test_redis_tier_with_fakeredis():
+    fakeredis = pytest.importorskip("fakeredis")
+    cache = RedisCache(client=fakeredis.FakeRedis(), prefix="test:", ttl=60)
+    cache.set("rice", {"calories_per_unit": 130.0})
+    assert cache.get("rice") == {"calories_per_unit": 130.0}
+    assert cache.get("pasta") is MISSING
+    cache.clear()
+    assert cache.get("rice") is MISSING
+
+
+def test_tiered_cache_promotes_tier2_hits(tmp_path):
+    shared = SQLiteCache(str(tmp_path / "cache.sqlite3"), maxsize=100, ttl=60)
+    writer = TieredCache(LRUCache(maxsize=10, ttl=60), shared)
+    writer["rice"] = {"calories_per_unit": 130.0}
+
+    # a second worker with a cold tier 1 reads through to the shared tier
+    reader = TieredCache(LRUCache(maxsize=10, ttl=60), shared)
+    assert "rice" in reader
+    assert reader["rice"] == {"calories_per_unit": 130.0}
+    stats = reader.stats()
+    assert stats["tier1"]["hits"] == 1
+    assert stats["tier1"]["misses"] == 1
+    assert stats["tier2"]["hits"] >= 1
+
+
+def test_tiered_cache_falls_back_to_tier1_when_tier2_fails(down_tier):
+    cache = TieredCache(LRUCache(maxsize=10, ttl=60), down_tier)
+    assert cache.get("rice") is MISSING
+    cache["rice"] = 130.0
+    assert cache["rice"] == 130.0
+    cache.delete("rice")
+    cache.clear()
+    assert cache.stats()["tier2"]["errors"] == 4
+
+
+@pytest.mark.asyncio
+async def test_tiered_cache_async_access_survives_tier2_failure(down_tier):
+    cache = TieredCache(LRUCache(maxsize=10, ttl=60), down_tier)
+    assert await cache.aget("rice") is MISSING
+    await cache.aset("rice", 130.0)
+    assert await cache.aget("rice") == 130.0
+    assert cache.stats()["tier2"]["errors"] == 2
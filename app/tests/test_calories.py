@@ -34,3 +34,326 @@ def test_get_calories_not_found(mock_usda, client, token):
     payload = {"dish_name": "unknown", "servings": 1}
     res = client.post("/calories/get-calories", json=payload, headers={"Authorization": f"Bearer {token}"})
     assert res.status_code == 404
+
+
+@pytest.fixture
+def authed_client(monkeypatch):
+    from app.verify import get_current_user_id
+    from app.utils import rate_limiter
+    app.dependency_overrides[get_current_user_id] = lambda: 1
+    monkeypatch.setattr(rate_limiter, "backend", rate_limiter.MemoryRateLimitBackend())
+    yield TestClient(app)
+    app.dependency_overrides.pop(get_current_user_id, None)
+
+
+def test_get_meal_calories_batch(monkeypatch, authed_client):
+    from app.usda import service
+    service.usda_cache.clear()
+    calls = []
+
+    async def fake_search(q, pageSize=25):
+        calls.append(q)
+        if q == "unobtainium":
+            return {"foods": []}
+        return {"foods": [{"description": q, "foodNutrients": [{"nutrientName": "Energy", "value": 100}]}]}
+
+    monkeypatch.setattr(service, "search_usda", fake_search)
+    payload = {"items": [
+        {"dish_name": "Rice", "servings": 2},
+        {"dish_name": "rice ", "servings": 1},
+        {"dish_name": "egg", "servings": 1},
+        {"dish_name": "unobtainium", "servings": 1},
+        {"dish_name": "x", "servings": 1},
+    ]}
+    res = authed_client.post("/calories/get-calories/batch", json=payload)
+    assert res.status_code == 200
+    data = res.json()
+    assert sorted(calls) == ["Rice", "egg", "unobtainium"]
+    assert data["total_calories"] == 400.0
+    assert data["resolved"] == 3
+    assert data["failed"] == 2
+    assert data["items"][3]["error"]["status"] == "GE40401"
+    assert data["items"][4]["error"]["status"] == "GE42201"
+
+
+def test_get_calories_reports_macros_from_the_same_search(monkeypatch, authed_client):
+    from app.usda import service
+    service.usda_cache.clear()
+
+    async def fake_search(q, pageSize=25):
+        return {"foods": [{"description": "Rice", "foodNutrients": [
+            {"nutrientId": 1062, "unitName": "kJ", "value": 544},
+            {"nutrientId": 1008, "unitName": "KCAL", "value": 130},
+            {"nutrientId": 1003, "unitName": "G", "value": 2.5},
+            {"nutrientId": 1005, "unitName": "G", "value": 28},
+        ]}]}
+
+    monkeypatch.setattr(service, "search_usda", fake_search)
+    res = authed_client.post("/calories/get-calories", json={"dish_name": "rice", "servings": 2})
+    assert res.status_code == 200
+    data = res.json()
+    assert data["total_calories"] == 260.0
+    assert data["macros_per_serving"] == {"protein_g": 2.5, "fat_g": None, "carbohydrate_g": 28.0}
+    assert data["total_macros"] == {"protein_g": 5.0, "fat_g": None, "carbohydrate_g": 56.0}
+
+
+def test_split_dish_only_splits_lists():
+    from app.calories.decompose import Phrase, split_dish
+    assert split_dish("macaroni and cheese") == [Phrase("macaroni and cheese")]
+    assert split_dish("2 eggs, toast with butter and orange juice") == [
+        Phrase("eggs", 2.0, "2"), Phrase("toast"), Phrase("butter"), Phrase("orange juice"),
+    ]
+    assert split_dish("1 1/2 apples and half banana") == [Phrase("apples", 1.5, "1 1/2"), Phrase("banana", 0.5, "half")]
+
+
+@pytest.mark.parametrize("name", ["half and half", "7 up", "7 layer dip", "3 musketeers bar", "2 eggs"])
+def test_single_names_keep_leading_numbers(name):
+    from app.calories.decompose import Phrase, split_dish
+    assert split_dish(name) == [Phrase(name)]
+
+
+def test_usda_style_comma_name_is_one_food_when_it_matches(monkeypatch, authed_client):
+    from app.usda import service
+    service.usda_cache.clear()
+    descriptions = {"Pizza, cheese, regular crust": "Pizza, cheese, regular crust, frozen, cooked",
+                    "rice, dal, curd": "Rice, white, cooked"}
+    calls = []
+
+    async def fake_search(q, pageSize=25):
+        calls.append(q)
+        return {"foods": [{"description": descriptions.get(q, q),
+                           "foodNutrients": [{"nutrientId": 1008, "unitName": "KCAL", "value": 100}]}]}
+
+    monkeypatch.setattr(service, "search_usda", fake_search)
+    pizza = authed_client.post("/calories/get-calories", json={"dish_name": "Pizza, cheese, regular crust", "servings": 1})
+    assert pizza.status_code == 200
+    assert pizza.json()["calories_per_serving"] == 100.0
+    assert pizza.json()["ingredients"] is None
+    meal = authed_client.post("/calories/get-calories", json={"dish_name": "rice, dal, curd", "servings": 1})
+    assert meal.json()["calories_per_serving"] == 300.0
+    assert [i["name"] for i in meal.json()["ingredients"]] == ["rice", "dal", "curd"]
+
+
+def test_composite_dish_resolves_each_unique_ingredient_once(monkeypatch, authed_client):
+    from app.usda import service
+    service.usda_cache.clear()
+    calories = {"egg": 70, "toast": 80, "butter": 100, "orange juice": 110}
+    calls = []
+
+    async def fake_search(q, pageSize=25):
+        calls.append(q)
+        return {"foods": [{"description": q, "foodNutrients": [
+            {"nutrientId": 1008, "unitName": "KCAL", "value": calories[q]},
+            {"nutrientId": 1003, "unitName": "G", "value": 6 if q == "egg" else 1},
+        ]}]}
+
+    monkeypatch.setattr(service, "search_usda", fake_search)
+    dish = "egg, 2 eggs, toast with butter and orange juice"
+    res = authed_client.post("/calories/get-calories", json={"dish_name": dish, "servings": 2})
+    assert res.status_code == 200
+    data = res.json()
+    assert sorted(calls) == ["butter", "egg", "orange juice", "toast"]
+    assert res.headers["ratelimit-remaining"] == "11"
+    assert data["calories_per_serving"] == 70 + 140 + 80 + 100 + 110
+    assert data["total_calories"] == 2 * 500
+    assert [(i["name"], i["calories_per_serving"], i["amount_descriptor"]) for i in data["ingredients"]] == [
+        ("egg", 70.0, None), ("eggs", 140.0, "2"), ("toast", 80.0, None),
+        ("butter", 100.0, None), ("orange juice", 110.0, None),
+    ]
+    assert data["macros_per_serving"]["protein_g"] == 6 + 12 + 1 + 1 + 1
+
+
+def test_portions_convert_without_extra_upstream_calls(monkeypatch, authed_client):
+    from app.usda import service
+    service.usda_cache.clear()
+    calls = []
+
+    async def fake_search(q, pageSize=25):
+        calls.append(q)
+        food = {"description": q, "foodNutrients": [{"nutrientId": 1008, "unitName": "KCAL", "value": 200}]}
+        if q == "granola":  # branded: values per 100 g, label serving 50 g
+            food.update(servingSize=50, servingSizeUnit="g", householdServingFullText="1/2 cup")
+        else:
+            food["foodMeasures"] = [{"disseminationText": "1 cup, cooked", "gramWeight": 160, "rank": 1},
+                                    {"disseminationText": "1 large", "gramWeight": 50, "rank": 2}]
+        return {"foods": [food]}
+
+    monkeypatch.setattr(service, "search_usda", fake_search)
+
+    def calories(**body):
+        res = authed_client.post("/calories/get-calories", json={"servings": 1, **body})
+        assert res.status_code == 200, res.json()
+        return res.json()
+
+    assert calories(dish_name="granola")["calories_per_serving"] == 100.0
+    assert calories(dish_name="granola", quantity=1, unit="cup")["serving_grams"] == 100.0
+    assert calories(dish_name="rice")["calories_per_serving"] == 200.0
+    assert calories(dish_name="rice", quantity=150, unit="grams")["calories_per_serving"] == 300.0
+    assert calories(dish_name="rice", quantity=0.5, unit="cups")["calories_per_serving"] == 160.0
+    assert calories(dish_name="rice", quantity=2)["serving_grams"] == 100.0
+    data = calories(dish_name="200 g rice, 2 tbsp granola")
+    assert [i["grams"] for i in data["ingredients"]] == [200.0, pytest.approx(29.57, abs=0.01)]
+    assert sorted(calls) == ["granola", "rice"]
+
+    res = authed_client.post("/calories/get-calories", json={"dish_name": "rice", "servings": 1, "unit": "handful"})
+    assert res.status_code == 422
+    assert res.json()["status"] == "GE42204"
+    res = authed_client.post("/calories/get-calories", json={"dish_name": "rice, egg", "servings": 1, "quantity": 2})
+    assert res.json()["status"] == "GE42205"
+
+
+def test_meal_batch_counts_each_unique_dish_against_rate_limit(monkeypatch, authed_client):
+    from app.usda import service
+
+    async def fake_search(q, pageSize=25):
+        return {"foods": [{"description": q, "foodNutrients": [{"nutrientName": "Energy", "value": 100}]}]}
+
+    monkeypatch.setattr(service, "search_usda", fake_search)
+    meal = {"items": [{"dish_name": f"dish {i}", "servings": 1} for i in range(10)]}
+    res = authed_client.post("/calories/get-calories/batch", json=meal)
+    assert res.status_code == 200
+    assert res.headers["ratelimit-remaining"] == "5"
+    res = authed_client.post("/calories/get-calories/batch", json=meal)
+    assert res.status_code == 429
+    assert res.json()["status"] == "GE42901"
+    assert int(res.headers["retry-after"]) > 0
+    assert res.headers["ratelimit-remaining"] == "5"
+
+
+def test_logged_meals_roll_up_into_daily_summary(monkeypatch, authed_client):
+    from app.usda import service
+    service.usda_cache.clear()
+
+    async def fake_search(q, pageSize=25):
+        return {"foods": [{"fdcId": 42, "description": q, "foodNutrients": [{"nutrientName": "Energy", "value": 100}]}]}
+
+    monkeypatch.setattr(service, "search_usda", fake_search)
+    late_evening = "2020-02-01T23:30:00-05:00"  # still Feb 1st for this user
+    res = authed_client.post("/calories/get-calories",
+                             json={"dish_name": "oatmeal", "servings": 2, "log": True, "eaten_at": late_evening})
+    assert res.status_code == 200
+    meal = {"log": True, "eaten_at": late_evening,
+            "items": [{"dish_name": "toast", "servings": 1}, {"dish_name": "x", "servings": 1}]}
+    assert authed_client.post("/calories/get-calories/batch", json=meal).status_code == 200
+    authed_client.post("/calories/get-calories", json={"dish_name": "apple", "servings": 1})  # not logged
+
+    res = authed_client.get("/calories/summary", params={"start": "2020-01-31", "end": "2020-02-02"})
+    assert res.status_code == 200
+    data = res.json()
+    assert [(d["day"], d["total_calories"], d["entries"]) for d in data["days"]] == [
+        ("2020-01-31", 0.0, 0), ("2020-02-01", 300.0, 2), ("2020-02-02", 0.0, 0)]
+    assert data["total_calories"] == 300.0
+
+
+def test_summary_rejects_inverted_range(authed_client):
+    res = authed_client.get("/calories/summary", params={"start": "2020-02-02", "end": "2020-02-01"})
+    assert res.status_code == 422
+    assert res.json()["status"] == "GE42202"
+
+
+@pytest.fixture
+def seeded_meals(db, request):
+    import datetime
+    from sqlalchemy import delete, insert
+    import models
+    eaten_at = datetime.datetime(2021, 3, 1, 12, tzinfo=datetime.timezone.utc)
+    rows = [{"user_id": 77, "dish_name": f"dish {i}", "fdc_id": i, "servings": 1, "calories_per_serving": 100.0,
+             "total_calories": 100.0, "eaten_at": eaten_at, "day": eaten_at.date()} for i in range(getattr(request, "param", 60000))]
+    db.execute(insert(models.MealEntry), rows)
+    db.commit()
+    yield len(rows)
+    db.execute(delete(models.MealEntry).where(models.MealEntry.user_id == 77))
+    db.commit()
+
+
+async def _drain_asgi(path, query_string):
+    """Run a GET through the ASGI app, counting body bytes without keeping them.
+
+    TestClient buffers whole bodies, which would hide whether a response streams.
+    """
+    import asyncio
+    state = {"requested": False, "headers": {}, "body": b"", "bytes": 0}
+    done = asyncio.Event()
+
+    async def receive():
+        if not state["requested"]:
+            state["requested"] = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            state["headers"] = {k.decode(): v.decode() for k, v in message["headers"]}
+        elif message["type"] == "http.response.body":
+            chunk = message.get("body", b"")
+            if not state["body"]:
+                state["body"] = chunk[:200]
+            state["bytes"] += len(chunk)
+            if not message.get("more_body", False):
+                done.set()
+
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+             "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query_string,
+             "root_path": "", "headers": [(b"host", b"testserver")],
+             "client": ("127.0.0.1", 1234), "server": ("testserver", 80)}
+    await app(scope, receive, send)
+    return state
+
+
+@pytest.mark.asyncio
+async def test_meal_export_streams_with_bounded_memory(seeded_meals):
+    import json
+    import logging
+    import tracemalloc
+    from app.tests.conftest import async_engine
+    from app.verify import get_current_admin
+    app.dependency_overrides[get_current_admin] = lambda: None
+    logging.disable(logging.CRITICAL)  # captured log records would count towards the peak
+    try:
+        await _drain_asgi("/calories/export/all", b"user_id=77&end=2000-01-01")  # warm up imports and caches
+        tracemalloc.start()
+        state = await _drain_asgi("/calories/export/all", b"user_id=77")
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        logging.disable(logging.NOTSET)
+        app.dependency_overrides.pop(get_current_admin, None)
+        # connections opened on this test's event loop must not outlive it
+        await async_engine.dispose()
+    assert state["headers"]["content-type"].startswith("application/x-ndjson")
+    assert json.loads(state["body"].split(b"\n", 1)[0])["dish_name"] == "dish 0"
+    # a few batches in flight, far below the ~12 MB export
+    assert state["bytes"] > 10_000_000
+    assert peak < state["bytes"] / 4
+
+
+@pytest.mark.parametrize("seeded_meals", [3], indirect=True)
+def test_meal_export_csv(authed_client, seeded_meals):
+    from app.verify import get_current_admin
+    app.dependency_overrides[get_current_admin] = lambda: None
+    try:
+        res = authed_client.get("/calories/export/all", params={"user_id": 77, "format": "csv"})
+        empty = authed_client.get("/calories/export/all", params={"user_id": 77, "format": "csv", "end": "2021-02-28"})
+    finally:
+        app.dependency_overrides.pop(get_current_admin, None)
+    assert res.headers["content-type"].startswith("text/csv")
+    lines = res.text.splitlines()
+    assert lines[0] == "id,user_id,day,eaten_at,dish_name,fdc_id,servings,calories_per_serving,total_calories"
+    assert [line.split(",")[4] for line in lines[1:]] == ["dish 0", "dish 1", "dish 2"]
+    assert empty.text.splitlines() == lines[:1]
+
+
+def test_upstream_unavailable_is_503_not_404(fake_usda, authed_client):
+    fake_usda.state.config["error_rate"] = 1.0
+    res = authed_client.post("/calories/get-calories", json={"dish_name": "rice", "servings": 1})
+    assert res.status_code == 503
+    assert res.json()["status"] == "GE50302"
+    assert int(res.headers["Retry-After"]) >= 1
+
+    fake_usda.state.config.update(error_rate=0.0, not_found_rate=1.0)
+    import time
+    time.sleep(0.2)  # let the circuit half-open
+    res = authed_client.post("/calories/get-calories", json={"dish_name": "rice", "servings": 1})
+    assert res.status_code == 404
+    assert res.json()["status"] == "GE40401"
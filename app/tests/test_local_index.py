@@ -0,0 +1,179 @@
+import json
+import os
+
+import pytest
+
+from app.usda.ingest import ingest
+from app.usda.local_index import LocalFoodIndex
+from app.usda.nutrients import Nutrients, parse_nutrients
+from app.usda.portions import portions_from_food
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "fdc_sample.json")
+
+
+@pytest.fixture
+def local_index(tmp_path):
+    path = str(tmp_path / "fdc_index.sqlite3")
+    ingest(FIXTURE, path)
+    index = LocalFoodIndex(path)
+    yield index
+    index.close()
+
+
+def test_ingest_json_dump(local_index):
+    assert len(local_index) == 10
+    foods = local_index.search("chicken biryani")
+    assert foods[0]["description"] == "Chicken biryani"
+    assert foods[0]["foodNutrients"][0]["value"] == 178.0
+
+
+def test_ingest_converts_kilojoules(local_index):
+    apple = local_index.search("fuji apple")[0]
+    assert apple["foodNutrients"][0]["value"] == pytest.approx(264 / 4.184)
+
+
+def test_ingest_csv_dump(tmp_path):
+    directory = tmp_path / "csv"
+    directory.mkdir()
+    (directory / "food.csv").write_text(
+        "fdc_id,data_type,description,food_category_id,publication_date\n"
+        "1,sr_legacy_food,\"Rice, white, cooked\",20,2019-04-01\n"
+        "2,branded_food,CHICKEN BIRYANI,,2021-10-28\n"
+        "3,sub_sample_food,\"Rice, sample 1\",20,2019-04-01\n"
+    )
+    (directory / "food_category.csv").write_text("id,code,description\n20,2000,Cereal Grains and Pasta\n")
+    (directory / "branded_food.csv").write_text(
+        "fdc_id,brand_owner,ingredients,branded_food_category,serving_size,serving_size_unit,"
+        "household_serving_fulltext\n2,ACME,\"RICE, CHICKEN\",Frozen Dinners,300,g,1 tray\n"
+    )
+    (directory / "food_nutrient.csv").write_text(
+        "id,fdc_id,nutrient_id,amount\n10,1,1062,544\n11,1,1008,130\n12,2,1008,178\n13,2,1003,9.5\n"
+        "14,1,1003,2.7\n15,1,1004,0.3\n16,1,1005,28.2\n"
+    )
+    (directory / "measure_unit.csv").write_text("id,name\n1000,cup\n9999,undetermined\n")
+    (directory / "food_portion.csv").write_text(
+        "id,fdc_id,seq_num,amount,measure_unit_id,portion_description,modifier,gram_weight\n"
+        "1,1,1,1,1000,,,158\n2,1,2,1,9999,,\"1 small bowl\",120\n"
+    )
+    path = str(tmp_path / "fdc_index.sqlite3")
+    assert ingest(str(directory), path) == 2
+    index = LocalFoodIndex(path)
+    rice = index.search("rice")[0]
+    assert rice["foodNutrients"][0]["value"] == 130.0
+    assert rice["foodCategory"] == "Cereal Grains and Pasta"
+    assert parse_nutrients(rice) == Nutrients(130.0, 2.7, 0.3, 28.2)
+    assert portions_from_food(rice).measures == {"cup": 158.0, "small": 120.0}
+    biryani = index.search("biryani")[0]
+    assert biryani["brandOwner"] == "ACME"
+    assert biryani["ingredients"] == "RICE, CHICKEN"
+    assert portions_from_food(biryani) == (300.0, {"serving": 300.0})
+    assert parse_nutrients(biryani).calories == 178.0
+
+
+def test_ingest_keeps_macros_label_basis_and_portions(tmp_path):
+    from app.usda.records import DishRecord
+    source = tmp_path / "foods.json"
+    source.write_text(json.dumps([
+        {"fdcId": 1, "dataType": "SR Legacy", "description": "Egg, whole, raw, fresh",
+         "foodNutrients": [{"nutrient": {"id": 1008, "unitName": "kcal"}, "amount": 143},
+                           {"nutrient": {"id": 1003, "unitName": "g"}, "amount": 12.6}],
+         "foodPortions": [{"measureUnit": {"name": "undetermined"}, "modifier": "large", "amount": 1,
+                           "gramWeight": 50}]},
+        {"fdcId": 2, "dataType": "Branded", "description": "PROTEIN BAR", "servingSize": 60,
+         "servingSizeUnit": "g", "householdServingFullText": "1 bar",
+         "labelNutrients": {"calories": {"value": 240}, "protein": {"value": 20}}},
+    ]))
+    path = str(tmp_path / "fdc_index.sqlite3")
+    ingest(str(source), path)
+    index = LocalFoodIndex(path)
+    api_foods = json.loads(source.read_text())
+    for query, food in (("egg", api_foods[0]), ("protein bar", api_foods[1])):
+        local = index.search(query)[0]
+        assert DishRecord.from_food(local, parse_nutrients(local)) == \
+            DishRecord.from_food(food, parse_nutrients(food))
+    bar = index.search("protein bar")[0]
+    record = DishRecord.from_food(bar, parse_nutrients(bar))
+    assert (record.calories_per_unit, record.basis_grams) == (240.0, 60.0)
+    index.close()
+
+
+def test_snapshot_without_macros_is_not_opened(tmp_path, monkeypatch):
+    import sqlite3
+    from app.usda import local_index as module
+    path = str(tmp_path / "old.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE foods (fdc_id INTEGER PRIMARY KEY, description TEXT NOT NULL, data_type TEXT,"
+                 " food_category TEXT, brand_owner TEXT, ingredients TEXT, calories REAL)")
+    conn.close()
+    monkeypatch.setattr(module, "USDA_LOCAL_INDEX_PATH", path)
+    assert LocalFoodIndex.open_default() is None
+
+    ingest(FIXTURE, path)  # re-ingesting upgrades it
+    index = LocalFoodIndex.open_default()
+    assert index is not None and len(index) == 10
+    index.close()
+
+
+def test_local_index_resolves_before_api(monkeypatch, local_index):
+    from app.usda import service
+    service.usda_cache.clear()
+    monkeypatch.setattr(service, "local_index", local_index)
+
+    def no_network(q, pageSize=25):
+        raise AssertionError("API must not be called for a local hit")
+
+    monkeypatch.setattr(service, "search_usda_sync", no_network)
+    result = service.get_best_calorie_for_dish("chicken biryani")
+    assert result.fdc_id == 2706342
+    assert result.calories_per_unit == 178.0
+
+
+def test_local_miss_falls_back_to_api(monkeypatch, local_index):
+    from app.usda import service
+    service.usda_cache.clear()
+    monkeypatch.setattr(service, "local_index", local_index)
+    calls = []
+
+    def fake_search(q, pageSize=25):
+        calls.append(q)
+        return {"foods": [{"description": "Dragon fruit", "foodNutrients": [{"nutrientName": "Energy", "value": 60}]}]}
+
+    monkeypatch.setattr(service, "search_usda_sync", fake_search)
+    result = service.get_best_calorie_for_dish("dragon fruit")
+    assert result.calories_per_unit == 60.0
+    assert calls == ["dragon fruit"]
+
+
+@pytest.mark.parametrize("query, description", [
+    ("rice", "Rice, white, long-grain, regular, enriched, cooked"),
+    ("egg", "Egg, whole, raw, fresh"),
+    ("salmon", "Fish, salmon, Atlantic, farmed, cooked, dry heat"),
+    ("butter", "Butter, salted"),
+    ("orange juice", "Orange juice, raw"),
+])
+def test_lowercase_queries_resolve_locally(monkeypatch, local_index, query, description):
+    from app.usda import service
+    service.usda_cache.clear()
+    monkeypatch.setattr(service, "local_index", local_index)
+
+    def no_network(q, pageSize=25):
+        raise AssertionError("API must not be called for a local hit")
+
+    monkeypatch.setattr(service, "search_usda_sync", no_network)
+    assert service.get_best_calorie_for_dish(query).description == description
+
+
+@pytest.mark.parametrize("query", ["Fruits", "Egg Products", "Cereal Grains"])
+def test_category_only_match_is_not_a_local_hit(monkeypatch, local_index, query):
+    from app.usda import service
+    service.usda_cache.clear()
+    monkeypatch.setattr(service, "local_index", local_index)
+    calls = []
+
+    def fake_search(q, pageSize=25):
+        calls.append(q)
+        return {"foods": []}
+
+    monkeypatch.setattr(service, "search_usda_sync", fake_search)
+    assert service.get_best_calorie_for_dish(query) is None
+    assert calls == [query]
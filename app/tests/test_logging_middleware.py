@@ -0,0 +1,32 @@
+import logging
+
+import pytest
+from starlette.responses import StreamingResponse
+
+from app.logging_middleware import AccessLogMiddleware
+
+
+@pytest.mark.asyncio
+async def test_access_log_passes_streams_through_and_logs_status(caplog):
+    async def stream_app(scope, receive, send):
+        async def chunks():
+            for part in (b"a\n", b"b\n", b"c\n"):
+                yield part
+        await StreamingResponse(chunks(), status_code=201)(scope, receive, send)
+
+    messages = []
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/export", "headers": []}
+    with caplog.at_level(logging.INFO, logger="meal_calorie_backend.access"):
+        await AccessLogMiddleware(stream_app)(scope, receive, send)
+
+    bodies = [m["body"] for m in messages if m["type"] == "http.response.body" and m.get("body")]
+    assert bodies == [b"a\n", b"b\n", b"c\n"]
+    [record] = [r for r in caplog.records if r.name == "meal_calorie_backend.access"]
+    assert record.getMessage().startswith("GET /export 201 ")
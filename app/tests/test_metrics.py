@@ -0,0 +1,45 @@
+import threading
+
+from app.utils.metrics import Registry
+
+
+def test_histogram_renders_cumulative_buckets_sum_and_count():
+    registry = Registry()
+    latency = registry.histogram("req_seconds", "Request latency.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        latency.observe(value, "/a")
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP req_seconds Request latency.", "# TYPE req_seconds histogram"]
+    assert 'req_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'req_seconds_bucket{route="/a",le="1"} 3' in lines
+    assert 'req_seconds_bucket{route="/a",le="+Inf"} 4' in lines
+    assert 'req_seconds_sum{route="/a"} 4.05' in lines
+    assert 'req_seconds_count{route="/a"} 4' in lines
+
+
+def test_counter_sums_increments_from_every_thread():
+    registry = Registry()
+    rejections = registry.counter("rejections_total", "Rejected requests.", ("scope",))
+
+    def work():
+        for _ in range(10000):
+            rejections.inc("get-calories")
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert rejections.value("get-calories") == 80000
+    assert 'rejections_total{scope="get-calories"} 80000' in registry.render()
+
+
+def test_metrics_endpoint_reports_route_templates(client):
+    status = client.get("/users/12345").status_code
+    res = client.get("/metrics")
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/plain; version=0.0.4")
+    series = 'http_request_duration_seconds_count{method="GET",route="/users/{user_id}",status="%d"}' % status
+    assert series in res.text
+    assert "/users/12345" not in res.text
+    assert "# TYPE usda_cache_events_total counter" in res.text
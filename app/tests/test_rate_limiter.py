@@ -0,0 +1,78 @@
+import pytest
+from starlette.requests import Request
+
+from app.utils.rate_limiter import MemoryRateLimitBackend, RedisRateLimitBackend, client_key
+from app.utils.security import create_access_token
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_gcra_allows_burst_then_refills_one_token_per_interval():
+    clock = FakeClock()
+    limiter = MemoryRateLimitBackend(clock=clock)
+    results = [await limiter.hit("k", limit=3, period=3) for _ in range(3)]
+    assert [r.allowed for r in results] == [True, True, True]
+    assert [r.remaining for r in results] == [2, 1, 0]
+    rejected = await limiter.hit("k", limit=3, period=3)
+    assert not rejected.allowed
+    assert rejected.retry_after == pytest.approx(1.0)
+    clock.now += 1
+    assert (await limiter.hit("k", limit=3, period=3)).allowed
+
+
+@pytest.mark.asyncio
+async def test_cost_draws_several_tokens():
+    limiter = MemoryRateLimitBackend(clock=FakeClock())
+    assert (await limiter.hit("k", limit=15, period=60, cost=10)).remaining == 5
+    assert not (await limiter.hit("k", limit=15, period=60, cost=10)).allowed
+    assert (await limiter.hit("k", limit=15, period=60, cost=5)).allowed
+
+
+@pytest.mark.asyncio
+async def test_idle_keys_are_evicted_and_key_count_is_capped():
+    clock = FakeClock()
+    limiter = MemoryRateLimitBackend(max_keys=50, clock=clock)
+    for i in range(10):
+        await limiter.hit(f"idle{i}", limit=5, period=10)
+    clock.now += 10  # every bucket is full again
+    for i in range(5):
+        await limiter.hit(f"busy{i}", limit=5, period=10)
+    assert len(limiter) == 5
+    for i in range(200):
+        await limiter.hit(f"flood{i}", limit=5, period=10)
+    assert len(limiter) == 50
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_shares_limits_between_workers():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")  # fakeredis runs Lua scripts through lupa
+    server = fakeredis.FakeServer()
+    worker_a = RedisRateLimitBackend(client=fakeredis.FakeAsyncRedis(server=server), prefix="test:")
+    worker_b = RedisRateLimitBackend(client=fakeredis.FakeAsyncRedis(server=server), prefix="test:")
+    assert (await worker_a.hit("k", limit=2, period=60)).remaining == 1
+    assert (await worker_b.hit("k", limit=2, period=60)).remaining == 0
+    rejected = await worker_a.hit("k", limit=2, period=60)
+    assert not rejected.allowed
+    assert 29 < rejected.retry_after <= 30
+    await worker_a.reset()
+    assert (await worker_b.hit("k", limit=2, period=60)).allowed
+
+
+def _request(headers=None, host="10.0.0.1"):
+    raw = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    return Request({"type": "http", "headers": raw, "client": (host, 1234)})
+
+
+def test_client_key_prefers_token_user_over_ip():
+    token = create_access_token(subject="42")
+    assert client_key(_request({"Authorization": f"Bearer {token}"})) == "user:42"
+    assert client_key(_request({"Authorization": "Bearer not-a-jwt"})) == "ip:10.0.0.1"
+    assert client_key(_request()) == "ip:10.0.0.1"
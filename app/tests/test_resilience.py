@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from app.usda import service
+from app.utils.resilience import CircuitBreaker, RetryBudget, UpstreamUnavailable
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_circuit_breaker_opens_probes_and_closes():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+    assert breaker.retry_after() == 10
+
+    clock.now = 10
+    assert breaker.allow()  # the one probe
+    assert not breaker.allow()
+    breaker.record_failure()  # probe failed: open again
+    assert breaker.state == "open"
+
+    clock.now = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_retry_budget_limits_retries_to_a_ratio_of_requests():
+    clock = FakeClock()
+    budget = RetryBudget(ratio=0.5, min_per_second=0, clock=clock)
+    assert not budget.try_spend()
+    for _ in range(4):
+        budget.deposit()
+    assert budget.try_spend() and budget.try_spend()
+    assert not budget.try_spend()
+
+    refilled = RetryBudget(ratio=0, min_per_second=1, clock=clock)
+    assert refilled.try_spend() and not refilled.try_spend()
+    clock.now += 1
+    assert refilled.try_spend()
+
+
+@pytest.mark.asyncio
+async def test_5xx_is_retried_then_succeeds(fake_usda, monkeypatch):
+    fake_usda.state.config["error_rate"] = 1.0
+    monkeypatch.setattr(service, "USDA_RETRY_BACKOFF_SECONDS", 0.05)
+
+    async def recover():
+        await asyncio.sleep(0.01)
+        fake_usda.state.config["error_rate"] = 0.0
+
+    _, data = await asyncio.gather(recover(), service.search_usda("rice"))
+    assert data["foods"][0]["description"] == "RICE"
+    assert fake_usda.state.calls >= 2
+    assert service.usda_breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_failures_open_the_circuit_and_fail_fast(fake_usda):
+    fake_usda.state.config["error_rate"] = 1.0
+    for _ in range(2):
+        with pytest.raises(UpstreamUnavailable):
+            await service.search_usda("rice")
+    assert fake_usda.state.calls == 2 * (1 + service.USDA_MAX_RETRIES)
+
+    with pytest.raises(UpstreamUnavailable) as exc:
+        await service.get_best_calorie_for_dish_async("rice")
+    assert fake_usda.state.calls == 6  # not sent
+    assert 0 < exc.value.retry_after <= 0.2
+    assert service.usda_cache.get("rice") is service.MISSING  # a failure is not cached as not-found
+
+    await asyncio.sleep(0.2)
+    fake_usda.state.config["error_rate"] = 0.0
+    result = await service.get_best_calorie_for_dish_async("rice")
+    assert result.description == "RICE"
+    assert service.usda_breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_exhausted_retry_budget_means_no_retries(fake_usda, monkeypatch):
+    monkeypatch.setattr(service, "usda_retry_budget", RetryBudget(ratio=0, min_per_second=0))
+    fake_usda.state.config["error_rate"] = 1.0
+    with pytest.raises(UpstreamUnavailable):
+        await service.search_usda("rice")
+    assert fake_usda.state.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_slow_request_is_hedged(fake_usda, monkeypatch):
+    monkeypatch.setattr(service, "USDA_HEDGE", True)
+    monkeypatch.setattr(service, "USDA_HEDGE_MIN_DELAY_SECONDS", 0.02)
+    for _ in range(service.usda_latency.min_samples):
+        service.usda_latency.observe(0.01)
+    fake_usda.state.config["latency_ms"] = 2000
+
+    async def upstream_recovers():
+        await asyncio.sleep(0.005)
+        fake_usda.state.config["latency_ms"] = 0
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    _, data = await asyncio.gather(upstream_recovers(), service.search_usda("rice"))
+    assert loop.time() - started < 1
+    assert data["foods"][0]["description"] == "RICE"
+    assert fake_usda.state.calls == 2
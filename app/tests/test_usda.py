@@ -1,3 +1,4 @@
+import pytest
 from app.usda.service import fuzzy_select_best, extract_calories_from_food, get_best_calorie_for_dish
 
 def test_fuzzy_select_best():
@@ -17,6 +18,44 @@ def test_extract_calories_from_label_nutrients():
     food = {"labelNutrients": {"calories": {"value": 150}}}
     assert extract_calories_from_food(food) == 150.0
 
+def test_parse_nutrients_prefers_kcal_over_a_kj_entry_listed_first():
+    from app.usda.nutrients import parse_nutrients
+    food = {"foodNutrients": [
+        {"nutrientId": 1062, "nutrientNumber": "268", "nutrientName": "Energy", "unitName": "kJ", "value": 544},
+        {"nutrientId": 1003, "nutrientNumber": "203", "nutrientName": "Protein", "unitName": "G", "value": 2.7},
+        {"nutrientId": 1004, "nutrientNumber": "204", "nutrientName": "Total lipid (fat)", "unitName": "G", "value": 0.3},
+        {"nutrientId": 1005, "nutrientNumber": "205", "nutrientName": "Carbohydrate, by difference", "unitName": "G", "value": 28.2},
+        {"nutrientId": 1008, "nutrientNumber": "208", "nutrientName": "Energy", "unitName": "KCAL", "value": 130},
+    ]}
+    assert parse_nutrients(food) == (130.0, 2.7, 0.3, 28.2, False)
+
+def test_parse_nutrients_converts_kj_and_reads_nested_records():
+    from app.usda.nutrients import parse_nutrients
+    food = {"foodNutrients": [
+        {"nutrient": {"id": 1062, "number": "268", "name": "Energy", "unitName": "kJ"}, "amount": 418.4},
+        {"nutrient": {"number": "203", "name": "Protein", "unitName": "g"}, "amount": 9.5},
+    ]}
+    nutrients = parse_nutrients(food)
+    assert nutrients.calories == pytest.approx(100.0)
+    assert nutrients.protein == 9.5
+    assert nutrients.fat is None
+
+def test_parse_nutrients_label_fallback_includes_macros():
+    from app.usda.nutrients import parse_nutrients
+    food = {"labelNutrients": {"calories": {"value": 150}, "protein": {"value": 3}, "carbohydrates": {"value": 30}}}
+    assert parse_nutrients(food) == (150.0, 3.0, None, 30.0, True)
+
+def test_portions_from_food_reads_label_serving_and_food_portions():
+    from app.usda.portions import portions_from_food
+    branded = {"servingSize": 240, "servingSizeUnit": "MLT", "householdServingFullText": "1 cup"}
+    assert portions_from_food(branded) == (240.0, {"serving": 240.0, "cup": 240.0})
+    full_record = {"foodPortions": [
+        {"amount": 1, "measureUnit": {"name": "undetermined"}, "modifier": "large", "gramWeight": 50},
+        {"amount": 0.5, "measureUnit": {"name": "cup"}, "gramWeight": 122},
+        {"amount": 1, "measureUnit": {"name": "cup"}, "gramWeight": 250},
+    ]}
+    assert portions_from_food(full_record) == (None, {"large": 50.0, "cup": 244.0})
+
 def test_get_best_calorie_for_dish_cache(monkeypatch):
     from app.usda.service import usda_cache
     usda_cache.clear()
@@ -24,4 +63,363 @@ def test_get_best_calorie_for_dish_cache(monkeypatch):
         {"description": "Rice", "foodNutrients": [{"nutrientName": "Energy", "value": 130}]}
     ]})
     result = get_best_calorie_for_dish("rice")
-    assert result["calories_per_unit"] == 130.0
+    assert result.calories_per_unit == 130.0
+
+@pytest.mark.asyncio
+async def test_get_best_calorie_for_dish_async(monkeypatch):
+    from app.usda.service import usda_cache, get_best_calorie_for_dish_async
+    usda_cache.clear()
+    calls = []
+
+    async def fake_search(q, pageSize=25):
+        calls.append(q)
+        return {"foods": [
+            {"description": "Rice", "foodNutrients": [{"nutrientName": "Energy", "value": 130}]}
+        ]}
+
+    monkeypatch.setattr("app.usda.service.search_usda", fake_search)
+    result = await get_best_calorie_for_dish_async("rice")
+    assert result.calories_per_unit == 130.0
+    await get_best_calorie_for_dish_async("Rice ")
+    assert calls == ["rice"]
+
+@pytest.mark.asyncio
+async def test_usda_client_lifecycle():
+    from app.usda import service
+    client = await service.open_usda_client()
+    assert service.get_usda_client() is client
+    await service.close_usda_client()
+    assert service._async_client is None
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_fetch(monkeypatch):
+    import asyncio
+    from app.usda.service import usda_cache, usda_flight, get_best_calorie_for_dish_async
+    usda_cache.clear()
+    calls = []
+
+    async def slow_search(q, pageSize=25):
+        calls.append(q)
+        await asyncio.sleep(0.05)
+        return {"foods": [
+            {"description": "Chicken biryani", "foodNutrients": [{"nutrientName": "Energy", "value": 180}]}
+        ]}
+
+    monkeypatch.setattr("app.usda.service.search_usda", slow_search)
+    results = await asyncio.gather(*[get_best_calorie_for_dish_async("Chicken Biryani") for _ in range(100)])
+    assert len(calls) == 1
+    assert all(r.calories_per_unit == 180.0 for r in results)
+    assert len(usda_flight) == 0
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_errors():
+    import asyncio
+    from app.utils.singleflight import SingleFlight
+    flight = SingleFlight()
+    calls = []
+
+    async def boom():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    results = await asyncio.gather(*[flight.do("k", boom) for _ in range(10)], return_exceptions=True)
+    assert len(calls) == 1
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert "k" not in flight
+
+def _rice_search(calls, value=130):
+    async def fake_search(q, pageSize=25):
+        calls.append(q)
+        return {"foods": [
+            {"description": "Rice", "foodNutrients": [{"nutrientName": "Energy", "value": value}]}
+        ]}
+    return fake_search
+
+@pytest.mark.asyncio
+async def test_negative_entries_use_their_own_ttl(monkeypatch):
+    import asyncio
+    from app.usda import service
+    service.usda_cache.clear()
+    monkeypatch.setattr(service, "USDA_NEGATIVE_TTL_SECONDS", 0.05)
+    calls = []
+
+    async def no_match(q, pageSize=25):
+        calls.append(q)
+        return {"foods": []}
+
+    monkeypatch.setattr(service, "search_usda", no_match)
+    assert await service.get_best_calorie_for_dish_async("zzzz") is None
+    assert await service.get_best_calorie_for_dish_async("zzzz") is None
+    assert len(calls) == 1
+    await asyncio.sleep(0.06)
+    assert await service.get_best_calorie_for_dish_async("zzzz") is None
+    assert len(calls) == 2
+
+@pytest.mark.asyncio
+async def test_stale_entry_served_while_refreshing(monkeypatch):
+    import asyncio
+    from app.usda import service
+    service.usda_cache.clear()
+    monkeypatch.setattr(service, "USDA_POSITIVE_TTL_SECONDS", 0.05)
+    calls = []
+    monkeypatch.setattr(service, "search_usda", _rice_search(calls, 130))
+    await service.get_best_calorie_for_dish_async("rice")
+    await asyncio.sleep(0.06)
+
+    monkeypatch.setattr(service, "search_usda", _rice_search(calls, 140))
+    stale = await service.get_best_calorie_for_dish_async("rice")
+    assert stale.calories_per_unit == 130.0
+    await asyncio.gather(*service._refresh_tasks)
+    fresh = await service.get_best_calorie_for_dish_async("rice")
+    assert fresh.calories_per_unit == 140.0
+    assert len(calls) == 2
+
+@pytest.mark.asyncio
+async def test_failed_background_refresh_is_logged(monkeypatch, caplog):
+    import asyncio
+    from app.usda import service
+    service.usda_cache.clear()
+    monkeypatch.setattr(service, "USDA_POSITIVE_TTL_SECONDS", 0.05)
+    monkeypatch.setattr(service, "search_usda", _rice_search([], 130))
+    await service.get_best_calorie_for_dish_async("rice")
+    await asyncio.sleep(0.06)
+
+    async def broken_search(q, pageSize=25):
+        raise ValueError("unexpected payload")
+
+    monkeypatch.setattr(service, "search_usda", broken_search)
+    stale = await service.get_best_calorie_for_dish_async("rice")
+    assert stale.calories_per_unit == 130.0
+    results = await asyncio.gather(*service._refresh_tasks, return_exceptions=True)
+    assert not any(isinstance(r, BaseException) for r in results)
+    assert "Background refresh of 'rice' failed" in caplog.text
+
+@pytest.mark.asyncio
+async def test_upstream_error_keeps_last_known_good(monkeypatch):
+    import asyncio
+    from app.usda import service
+    service.usda_cache.clear()
+    monkeypatch.setattr(service, "USDA_POSITIVE_TTL_SECONDS", 0.01)
+    monkeypatch.setattr(service, "USDA_STALE_WHILE_REVALIDATE_SECONDS", 0)
+    calls = []
+    monkeypatch.setattr(service, "search_usda", _rice_search(calls, 130))
+    await service.get_best_calorie_for_dish_async("rice")
+    await asyncio.sleep(0.02)
+
+    async def down(q, pageSize=25):
+        return None
+
+    monkeypatch.setattr(service, "search_usda", down)
+    result = await service.get_best_calorie_for_dish_async("rice")
+    assert result.calories_per_unit == 130.0
+
+def test_cached_record_is_slim_projection(monkeypatch):
+    from app.usda.service import usda_cache
+    from app.usda.records import DishRecord
+    usda_cache.clear()
+    nutrients = [{"nutrientName": "Energy", "value": 130}] + [
+        {"nutrientId": i, "nutrientName": f"Nutrient {i}", "value": i} for i in range(60)
+    ]
+    monkeypatch.setattr("app.usda.service.search_usda_sync", lambda q, pageSize=25: {"foods": [
+        {"fdcId": 42, "description": "Rice", "dataType": "Branded", "ingredients": "RICE, SALT" * 100,
+         "foodNutrients": nutrients}
+    ]})
+    result = get_best_calorie_for_dish("rice")
+    assert isinstance(result, DishRecord)
+    assert result.fdc_id == 42
+    assert result.calories_per_unit == 130.0
+    assert len(result.ingredients) == 400
+
+def test_shared_tier_round_trips_dish_entries(tmp_path):
+    from app.utils.cache import LRUCache, SQLiteCache, TieredCache
+    from app.usda.records import DishEntry, DishRecord, decode_entry
+    shared = SQLiteCache(str(tmp_path / "cache.sqlite3"), maxsize=10, ttl=60)
+    TieredCache(LRUCache(10, 60), shared, decode_entry).set(
+        "rice", DishEntry(DishRecord(1, "Rice", "Branded", None, 130.0, "rice"), 123.0)
+    )
+    TieredCache(LRUCache(10, 60), shared, decode_entry).set("zzz", DishEntry(None, 5.0))
+    cold = TieredCache(LRUCache(10, 60), shared, decode_entry)
+    assert cold.get("rice") == DishEntry(DishRecord(1, "Rice", "Branded", None, 130.0, "rice"), 123.0)
+    assert cold.get("rice").value.calories_per_unit == 130.0
+    assert cold.get("zzz") == DishEntry(None, 5.0)
+
+def _legacy_fuzzy_select_best(query, foods):
+    from rapidfuzz import fuzz
+    best, best_score = None, -1
+    for f in foods:
+        candidates = [f.get(field) for field in ("description", "lowercaseDescription", "dataType", "foodCategory", "brandOwner") if f.get(field)]
+        score = max([fuzz.token_set_ratio(query, c) for c in candidates]) if candidates else 0
+        if score > best_score:
+            best_score, best = score, f
+    return (best, best_score) if best_score >= 40 else (None, best_score)
+
+def test_fuzzy_select_best_matches_legacy_selection():
+    import random
+    words = ["chicken", "rice", "biryani", "grilled", "salmon", "cheese", "egg", "toast", "curry"]
+    rng = random.Random(7)
+    for _ in range(20):
+        foods = []
+        for _ in range(rng.choice([0, 1, 5, 25, 60])):
+            description = " ".join(rng.sample(words, 3))
+            foods.append({
+                "description": description.upper(),
+                # without it only the upper-case description is there to match, as before
+                "lowercaseDescription": description if rng.random() < 0.5 else None,
+                "dataType": rng.choice(["Branded", "SR Legacy", None]),
+                "foodCategory": rng.choice(["Poultry Products", "Grain", ""]),
+            })
+        for query in ("chicken biryani", "grilled salmon", "zz", "rice"):
+            expected, score = _legacy_fuzzy_select_best(query, foods)
+            best = fuzzy_select_best(query, foods)
+            if expected is None:
+                assert best is None
+            else:
+                assert best is expected
+                assert best["_best_score"] == score
+
+def test_fuzzy_select_best_low_confidence():
+    assert fuzzy_select_best("zzzz", [{"description": "Apple"}]) is None
+    assert fuzzy_select_best("rice", [{"fdcId": 1}]) is None
+    assert fuzzy_select_best("rice", []) is None
+
+@pytest.mark.asyncio
+async def test_warmup_preloads_seed_with_bounded_concurrency(monkeypatch, tmp_path):
+    import asyncio
+    from app.usda import service
+    from app.usda.warmup import CacheWarmer
+    service.usda_cache.clear()
+    monkeypatch.setattr(service, "dish_requests", {})
+    seed = tmp_path / "seed.txt"
+    seed.write_text("# breakfast\nRice\negg\ntoast  # white\n\n")
+    running, peak, calls = [0], [0], []
+
+    async def slow_search(q, pageSize=25):
+        calls.append(q)
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+        return {"foods": [{"description": q, "foodNutrients": [{"nutrientName": "Energy", "value": 100}]}]}
+
+    monkeypatch.setattr(service, "search_usda", slow_search)
+    warmer = CacheWarmer(seed_path=str(seed), top_n=10, concurrency=2, interval=3600, ready_ratio=1.0)
+    assert not warmer.ready
+    warmer.start()
+    assert not warmer.ready
+    await asyncio.sleep(0.1)
+    assert warmer.status() == {"ready": True, "warmed": 3, "target": 3}
+    assert sorted(calls) == ["Rice", "egg", "toast"] and peak[0] == 2
+
+    # fresh entries cost nothing; one close to expiry is refreshed ahead of time
+    entry = service.usda_cache.get("rice")
+    service.usda_cache.set("rice", entry._replace(fresh_until=entry.fresh_until - 590))
+    await warmer.run_pass()
+    await warmer.stop()
+    assert sorted(calls) == ["Rice", "Rice", "egg", "toast"]
+
+def test_warmup_targets_prefer_observed_requests(monkeypatch):
+    from app.usda import service
+    from app.usda.warmup import CacheWarmer
+    monkeypatch.setattr(service, "dish_requests", {})
+    for name in ["Dal", "dal", "dal", "Naan", "Rice"]:
+        service._count_request(name.lower(), name)
+    warmer = CacheWarmer(top_n=3)
+    warmer.seed = ["Rice", "Idli", "Dosa"]
+    assert list(warmer.targets().items()) == [("dal", "dal"), ("naan", "Naan"), ("rice", "Rice")]
+    monkeypatch.setattr(service, "USDA_POPULARITY_MAX_KEYS", 3)
+    service._count_request("idli", "Idli")
+    assert service.dish_requests == {"dal": [1, "dal"], "idli": [1, "Idli"]}
+
+def test_ready_endpoint_waits_for_warmup(client, monkeypatch):
+    import main
+    from app.usda.warmup import CacheWarmer
+    assert client.get("/ready").status_code == 200  # warm-up is off in tests
+    monkeypatch.setattr(main, "cache_warmer", CacheWarmer(top_n=5))
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "GE50303"
+    assert response.headers["Retry-After"] == "5"
+
+def test_canonical_key_ignores_case_spacing_punctuation_order_and_plurals():
+    from app.usda.query import canonical_key
+    variants = ["Chicken Biryani", "chicken  biryani", "biryani chicken", "Biryani, chicken!", "biryani chickens"]
+    assert {canonical_key(v) for v in variants} == {"biryani chicken"}
+    assert canonical_key("Tomatoes & Cherries") == "cherry tomato"
+
+@pytest.mark.asyncio
+async def test_alias_index_reuses_near_spellings_without_upstream_calls(monkeypatch):
+    from app.usda import service
+    from app.usda.query import AliasIndex
+    from app.utils.metrics import usda_dish_lookups
+    service.usda_cache.clear()
+    monkeypatch.setattr(service, "alias_index", AliasIndex())
+    calls = []
+
+    async def fake_search(q, pageSize=25):
+        calls.append(q)
+        return {"foods": [{"fdcId": len(calls), "description": q,
+                           "foodNutrients": [{"nutrientId": 1008, "unitName": "KCAL", "value": 150}]}]}
+
+    monkeypatch.setattr(service, "search_usda", fake_search)
+    before = {s: usda_dish_lookups.value(s) for s in ("cache", "alias", "upstream")}
+    first = await service.get_best_calorie_for_dish_async("Chicken Biryani")
+    assert await service.get_best_calorie_for_dish_async("biryani,  chicken") == first
+    assert await service.get_best_calorie_for_dish_async("chicken biriyani") == first
+    assert await service.get_best_calorie_for_dish_async("Chicken Biriyani") == first
+    await service.get_best_calorie_for_dish_async("brown rice")
+    await service.get_best_calorie_for_dish_async("brown ice")  # close as a string, not a spelling
+    assert calls == ["Chicken Biryani", "brown rice", "brown ice"]
+    after = {s: usda_dish_lookups.value(s) - before[s] for s in before}
+    assert after == {"cache": 2, "alias": 1, "upstream": 3}
+
+def test_alias_index_forgets_evicted_keys():
+    from app.usda.query import AliasIndex
+    index = AliasIndex(maxsize=2)
+    index.add("biryani chicken", 1)
+    index.add("watermelon", 2)
+    index.add("egg", 3)
+    assert len(index) == 2
+    assert index.lookup("biriyani chicken") is None
+    assert index.lookup("watermelan") == 2
+    assert index._by_words == {1: {"watermelon": None, "egg": None}, 2: {}}
+
+def test_alias_index_keeps_prefixed_words_apart():
+    from app.usda.query import AliasIndex, canonical_key
+    index = AliasIndex()
+    index.add(canonical_key("sweetened yogurt"), 1)
+    index.add(canonical_key("sweetened almond milk"), 2)
+    index.add(canonical_key("salted butter"), 3)
+    assert index.lookup(canonical_key("unsweetened yogurt")) is None
+    assert index.lookup(canonical_key("unsweetened almond milk")) is None
+    assert index.lookup(canonical_key("unsalted butter")) is None
+    assert index.lookup(canonical_key("sweetend yogurt")) == 1
+
+@pytest.mark.asyncio
+async def test_dish_lookup_survives_shared_tier_outage(monkeypatch, down_tier):
+    from app.usda import service
+    from app.utils.cache import LRUCache, TieredCache
+    from app.usda.records import decode_entry
+    monkeypatch.setattr(service, "usda_cache", TieredCache(LRUCache(10, 60), down_tier, decode_entry))
+    from app.usda.query import AliasIndex
+    monkeypatch.setattr(service, "alias_index", AliasIndex())
+
+    async def fake_search(q, pageSize=25):
+        return {"foods": [
+            {"description": "Rice", "foodNutrients": [{"nutrientName": "Energy", "value": 130}]}
+        ]}
+
+    monkeypatch.setattr(service, "search_usda", fake_search)
+    result = await service.get_best_calorie_for_dish_async("rice")
+    assert result.calories_per_unit == 130.0
+    assert (await service.get_best_calorie_for_dish_async("rice")).calories_per_unit == 130.0
+    assert service.usda_cache.stats()["tier2"]["errors"] >= 2
+
+def test_hit_ratio_counts_local_snapshot_answers(monkeypatch):
+    from app.usda import service
+    from app.utils.metrics import Registry
+    lookups = Registry().counter("lookups_total", "Dish lookups.", ("source",))
+    monkeypatch.setattr(service, "usda_dish_lookups", lookups)
+    for source in ("local", "local", "cache", "upstream"):
+        lookups.inc(source)
+    assert list(service._usda_hit_ratio())[-1] == "usda_dish_hit_ratio 0.75"
@@ -1,7 +1,7 @@
 import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import patch
-from app.verify import get_current_user
+from app.verify import get_current_user, get_current_user_id
 import models
 from main import app
 
@@ -19,6 +19,7 @@ def override_get_current_user():
 @pytest.fixture
 def client():
     app.dependency_overrides[get_current_user] = override_get_current_user
+    app.dependency_overrides[get_current_user_id] = lambda: 1
     return TestClient(app)
 
 # Optional: auth header mock (not needed unless your app checks header presence)
@@ -73,3 +74,93 @@ def test_delete_user(mock_delete_user, client):
     res = client.delete("/users/1")
     assert res.status_code == 200
     assert res.json()["data"] == "User deleted"
+
+@pytest.fixture
+def paged_users(db):
+    users = [models.User(first_name="Page", last_name=f"Walker{i}", email=f"pagewalker{i}@example.com",
+                         hashed_password="x") for i in range(5)]
+    db.add_all(users)
+    db.commit()
+    yield [u.id for u in users]
+    for u in users:
+        db.delete(u)
+    db.commit()
+
+def test_list_users_keyset_pages(client, paged_users):
+    seen, cursor = [], None
+    while True:
+        params = {"q": "pagewalker", "limit": 2}
+        if cursor is not None:
+            params["after_id"] = cursor
+        data = client.get("/users/", params=params).json()["data"]
+        seen += [u["id"] for u in data["result"]]
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == paged_users
+
+def test_list_users_search_uses_fts_and_counts(client, paged_users):
+    data = client.get("/users/", params={"q": "WALKER3", "count": "exact"}).json()["data"]
+    assert [u["email"] for u in data["result"]] == ["pagewalker3@example.com"]
+    assert data["total"] == 1
+    assert client.get("/users/", params={"q": "pagewalker"}).json()["data"]["total"] is None
+
+def test_search_index_is_added_to_an_existing_database(tmp_path):
+    from sqlalchemy import create_engine, text
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        # a users table created before the search index existed
+        conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, first_name VARCHAR NOT NULL, "
+                          "last_name VARCHAR NOT NULL, email VARCHAR NOT NULL, "
+                          "hashed_password VARCHAR NOT NULL, created_at DATETIME)"))
+        conn.execute(text("INSERT INTO users (first_name, last_name, email, hashed_password) "
+                          "VALUES ('Old', 'Timer', 'oldtimer@example.com', 'x')"))
+    match = text("SELECT rowid FROM users_fts WHERE users_fts MATCH '\"timer\"'")
+    for _ in range(2):  # every startup runs it
+        with engine.begin() as conn:
+            models.ensure_search_index(conn)
+    with engine.begin() as conn:
+        assert conn.execute(match).scalars().all() == [1]
+        conn.execute(text("INSERT INTO users (first_name, last_name, email, hashed_password) "
+                          "VALUES ('New', 'Timer', 'newtimer@example.com', 'x')"))
+        assert conn.execute(match).scalars().all() == [1, 2]
+
+def test_create_all_needs_no_postgres_extension():
+    from sqlalchemy import create_mock_engine
+    statements = []
+    engine = create_mock_engine("postgresql://",
+                                lambda sql, *a, **kw: statements.append(str(sql.compile(dialect=engine.dialect))))
+    models.Base.metadata.create_all(engine, checkfirst=False)
+    assert not [s for s in statements if "pg_trgm" in s or "gin_trgm_ops" in s]
+
+def test_bulk_import_reports_conflicts(client, db, monkeypatch):
+    from app.verify import get_current_admin
+    monkeypatch.setattr("app.users.bulk_import.BULK_IMPORT_HASH_EXECUTOR", "thread")
+    app.dependency_overrides[get_current_admin] = override_get_current_user
+    db.add(models.User(first_name="Old", last_name="Hand", email="bulk.taken@example.com", hashed_password="x"))
+    db.commit()
+    body = "\n".join([
+        "first_name,last_name,email,password",
+        "Ada,One,bulk.one@example.com,Str0ng!pass",
+        "Ada,Taken,bulk.taken@example.com,Str0ng!pass",
+        "Ada,Again,bulk.one@example.com,Str0ng!pass",
+        "Ada,Weak,bulk.weak@example.com,weak",
+        "Ada,Two,bulk.two@example.com,Str0ng!pass",
+    ])
+    try:
+        res = client.post("/users/import", content=body, headers={"Content-Type": "text/csv"})
+    finally:
+        del app.dependency_overrides[get_current_admin]
+    assert res.status_code == 200
+    report = res.json()["data"]
+    assert report["created"] == 2
+    assert [(c["row"], c["email"]) for c in report["conflicts"]] == [
+        (2, "bulk.taken@example.com"), (3, "bulk.one@example.com")]
+    assert [e["row"] for e in report["errors"]] == [4]
+    emails = {u.email for u in db.query(models.User).filter(models.User.email.like("bulk.%"))}
+    assert emails == {"bulk.one@example.com", "bulk.two@example.com", "bulk.taken@example.com"}
+
+def test_bulk_import_requires_admin(client):
+    res = client.post("/users/import?format=jsonl", content='{"email": "x@example.com"}\n')
+    assert res.status_code == 403
+    assert res.json()["status"] == "GE40301"
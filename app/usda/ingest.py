@@ -0,0 +1,246 @@
+"""Load a FoodData Central download into the local snapshot index.
+
+Accepts either a JSON dump (``FoundationFoods`` / ``SRLegacyFoods`` /
+``SurveyFoods`` / ``BrandedFoods``, a search response with ``foods``, or a
+plain list of foods) or the directory of a CSV dump (``food.csv``,
+``food_nutrient.csv``, optional ``food_category.csv``, ``branded_food.csv``,
+``food_portion.csv`` and ``measure_unit.csv``). CSV files are streamed, so
+the multi-GB branded dump does not have to fit in memory.
+
+Each food keeps its energy and macros, whether they are per 100 g or per
+label serving, its serving size and the gram weight of its household
+measures, so a local hit answers everything an API result would.
+
+    python -m app.usda.ingest FoodData_Central_csv_2024-10-31/ --index ./fdc_index.sqlite3
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sqlite3
+import sys
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from .local_index import ADDED_COLUMNS, FOOD_COLUMNS, SCHEMA, USDA_LOCAL_INDEX_PATH
+from .nutrients import ENERGY_NUTRIENT_IDS, KJ_NUTRIENT_IDS, KJ_PER_KCAL, MACRO_NUTRIENT_IDS, parse_nutrients
+from .portions import portions_from_food
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 5000
+
+# CSV data_type values worth indexing, mapped to the names the search API uses
+DATA_TYPES = {
+    "foundation_food": "Foundation",
+    "sr_legacy_food": "SR Legacy",
+    "survey_fndds_food": "Survey (FNDDS)",
+    "branded_food": "Branded",
+}
+JSON_DUMP_KEYS = ("FoundationFoods", "SRLegacyFoods", "SurveyFoods", "BrandedFoods", "foods")
+
+csv.field_size_limit(sys.maxsize)
+
+
+def connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(foods)")}
+    for column, kind in ADDED_COLUMNS.items():
+        if column not in existing:
+            conn.execute(f"ALTER TABLE foods ADD COLUMN {column} {kind}")
+    return conn
+
+
+def _portions_json(measures: Optional[Dict[str, float]]) -> Optional[str]:
+    return json.dumps(measures, separators=(",", ":")) if measures else None
+
+
+def _category(food: Dict[str, Any]) -> Optional[str]:
+    category = food.get("foodCategory") or food.get("brandedFoodCategory")
+    if isinstance(category, dict):
+        return category.get("description")
+    if category is None and food.get("wweiaFoodCategory"):
+        return food["wweiaFoodCategory"].get("wweiaFoodCategoryDescription")
+    return category
+
+
+def food_row(food: Dict[str, Any]) -> Tuple[Any, ...]:
+    nutrients = parse_nutrients(food)
+    serving_grams, measures = portions_from_food(food)
+    return (
+        int(food["fdcId"]),
+        food.get("description") or "",
+        food.get("dataType"),
+        _category(food),
+        food.get("brandOwner"),
+        food.get("ingredients"),
+        nutrients.calories,
+        nutrients.protein,
+        nutrients.fat,
+        nutrients.carbohydrate,
+        int(nutrients.per_serving),
+        serving_grams,
+        _portions_json(measures),
+    )
+
+
+def iter_json_dump(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as fh:
+        data = json.load(fh)
+    if isinstance(data, list):
+        yield from data
+        return
+    for key in JSON_DUMP_KEYS:
+        yield from data.get(key) or []
+
+
+def _read_csv(directory: str, name: str) -> Iterator[Dict[str, str]]:
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        return
+    with open(path, newline="", encoding="utf-8") as fh:
+        yield from csv.DictReader(fh)
+
+
+def iter_csv_dump(directory: str) -> Iterator[Tuple[Any, ...]]:
+    """Stream food rows from a CSV dump; nutrients and portions are filled in by the apply_csv_* steps."""
+    categories = {row["id"]: row["description"] for row in _read_csv(directory, "food_category.csv")}
+    for row in _read_csv(directory, "food.csv"):
+        data_type = DATA_TYPES.get(row.get("data_type", ""))
+        if data_type is None:
+            continue
+        yield (
+            int(row["fdc_id"]),
+            row.get("description") or "",
+            data_type,
+            categories.get(row.get("food_category_id") or ""),
+            None,
+            None,
+            None,
+            None,
+            None,
+            None,
+            0,  # CSV nutrient amounts are per 100 g, branded foods included
+            None,
+            None,
+        )
+
+
+def _branded_row(r: Dict[str, str]) -> Tuple[Any, ...]:
+    serving_grams, measures = portions_from_food({
+        "servingSize": r.get("serving_size"),
+        "servingSizeUnit": r.get("serving_size_unit"),
+        "householdServingFullText": r.get("household_serving_fulltext"),
+    })
+    return (r.get("brand_owner") or None, r.get("ingredients") or None,
+            r.get("branded_food_category") or None, serving_grams, _portions_json(measures),
+            int(r["fdc_id"]))
+
+
+def apply_csv_branded(conn: sqlite3.Connection, directory: str) -> None:
+    _executemany_batched(
+        conn,
+        "UPDATE foods SET brand_owner = ?, ingredients = ?,"
+        " food_category = COALESCE(food_category, ?), serving_grams = ?, portions = ? WHERE fdc_id = ?",
+        (_branded_row(r) for r in _read_csv(directory, "branded_food.csv")),
+    )
+
+
+def apply_csv_nutrients(conn: sqlite3.Connection, directory: str) -> None:
+    """Energy (in kcal, preferring 1008 as parse_nutrients does) and macros from food_nutrient.csv."""
+    macro_slots = {nutrient_id: i for i, nutrient_id in enumerate(MACRO_NUTRIENT_IDS)}
+    # fdc_id -> [energy rank, kcal, protein, fat, carbohydrate]
+    found: Dict[int, list] = {}
+    for r in _read_csv(directory, "food_nutrient.csv"):
+        try:
+            nutrient_id = int(r["nutrient_id"])
+        except (KeyError, ValueError):
+            continue
+        rank = ENERGY_NUTRIENT_IDS.get(nutrient_id)
+        slot = macro_slots.get(nutrient_id)
+        if (rank is None and slot is None) or not r.get("amount"):
+            continue
+        amount = float(r["amount"])
+        values = found.setdefault(int(r["fdc_id"]), [len(ENERGY_NUTRIENT_IDS), None, None, None, None])
+        if rank is not None and rank < values[0]:
+            values[0], values[1] = rank, amount / KJ_PER_KCAL if nutrient_id in KJ_NUTRIENT_IDS else amount
+        elif slot is not None and values[2 + slot] is None:
+            values[2 + slot] = amount
+    _executemany_batched(
+        conn,
+        "UPDATE foods SET calories = ?, protein = ?, fat = ?, carbohydrate = ? WHERE fdc_id = ?",
+        ((*values[1:], fdc_id) for fdc_id, values in found.items()),
+    )
+
+
+def apply_csv_portions(conn: sqlite3.Connection, directory: str) -> None:
+    """Household measures from food_portion.csv, after any branded serving already stored."""
+    units = {row["id"]: row["name"] for row in _read_csv(directory, "measure_unit.csv")}
+    portions: Dict[int, list] = {}
+    for r in _read_csv(directory, "food_portion.csv"):
+        portions.setdefault(int(r["fdc_id"]), []).append({
+            "measureUnit": {"name": units.get(r.get("measure_unit_id") or "")},
+            "modifier": r.get("modifier") or None,
+            "portionDescription": r.get("portion_description") or None,
+            "amount": r.get("amount") or None,
+            "gramWeight": r.get("gram_weight"),
+        })
+    stored = dict(conn.execute("SELECT fdc_id, portions FROM foods WHERE portions IS NOT NULL"))
+    rows = []
+    for fdc_id, food_portions in portions.items():
+        measures = json.loads(stored.get(fdc_id) or "{}")
+        for unit, grams in (portions_from_food({"foodPortions": food_portions}).measures or {}).items():
+            measures.setdefault(unit, grams)
+        rows.append((_portions_json(measures), fdc_id))
+    _executemany_batched(conn, "UPDATE foods SET portions = ? WHERE fdc_id = ?", rows)
+
+
+def _executemany_batched(conn: sqlite3.Connection, sql: str, rows: Iterable[Tuple[Any, ...]]) -> int:
+    total = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            conn.executemany(sql, batch)
+            total += len(batch)
+            batch.clear()
+    if batch:
+        conn.executemany(sql, batch)
+        total += len(batch)
+    conn.commit()
+    return total
+
+
+def ingest(source: str, index_path: str = USDA_LOCAL_INDEX_PATH) -> int:
+    """Load ``source`` into the index at ``index_path``; returns the number of foods written."""
+    conn = connect(index_path)
+    insert = f"INSERT OR REPLACE INTO foods ({', '.join(FOOD_COLUMNS)}) VALUES ({', '.join('?' * len(FOOD_COLUMNS))})"
+    try:
+        if os.path.isdir(source):
+            count = _executemany_batched(conn, insert, iter_csv_dump(source))
+            apply_csv_branded(conn, source)
+            apply_csv_nutrients(conn, source)
+            apply_csv_portions(conn, source)
+        else:
+            count = _executemany_batched(conn, insert, (food_row(f) for f in iter_json_dump(source)))
+        conn.execute("INSERT INTO foods_fts(foods_fts) VALUES ('rebuild')")
+        conn.commit()
+    finally:
+        conn.close()
+    logger.info("Indexed %d foods from %s into %s", count, source, index_path)
+    return count
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Load a FoodData Central dump into the local index")
+    parser.add_argument("source", help="JSON dump file or CSV dump directory")
+    parser.add_argument("--index", default=USDA_LOCAL_INDEX_PATH, help="SQLite index path")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    ingest(args.source, args.index)
+
+
+if __name__ == "__main__":
+    main()
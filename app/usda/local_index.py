@@ -0,0 +1,142 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+from .nutrients import CARBOHYDRATE, ENERGY_KCAL, FAT, LABEL_FIELDS, PROTEIN
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+USDA_LOCAL_INDEX_PATH = os.getenv("USDA_LOCAL_INDEX_PATH", "./fdc_index.sqlite3")
+USDA_LOCAL_INDEX_CANDIDATES = int(os.getenv("USDA_LOCAL_INDEX_CANDIDATES", "25"))
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS foods (
+    fdc_id INTEGER PRIMARY KEY,
+    description TEXT NOT NULL,
+    data_type TEXT,
+    food_category TEXT,
+    brand_owner TEXT,
+    ingredients TEXT,
+    calories REAL,
+    protein REAL,
+    fat REAL,
+    carbohydrate REAL,
+    per_serving INTEGER NOT NULL DEFAULT 0,
+    serving_grams REAL,
+    portions TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS foods_fts USING fts5(
+    description, food_category, brand_owner,
+    content='foods', content_rowid='fdc_id',
+    tokenize='porter unicode61 remove_diacritics 2'
+);
+"""
+
+FOOD_COLUMNS = ("fdc_id", "description", "data_type", "food_category", "brand_owner", "ingredients", "calories",
+                "protein", "fat", "carbohydrate", "per_serving", "serving_grams", "portions")
+# Columns added after the first snapshot format, with their types: ingest adds
+# them to an older index, and an index without them is not opened
+ADDED_COLUMNS = {"protein": "REAL", "fat": "REAL", "carbohydrate": "REAL",
+                 "per_serving": "INTEGER NOT NULL DEFAULT 0", "serving_grams": "REAL", "portions": "TEXT"}
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class LocalFoodIndex:
+    """Read side of the local FoodData Central snapshot (see app/usda/ingest.py).
+
+    Candidates come from an FTS5 full-text match on the description tokens,
+    ranked by bm25, and are returned shaped like search API results so the
+    usual fuzzy selection, nutrient and portion parsing apply unchanged:
+    energy and macros (per 100 g, or per label serving for branded foods
+    that only list label values), the serving size and household measures.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+
+    @classmethod
+    def open_default(cls) -> Optional["LocalFoodIndex"]:
+        """Open the index at USDA_LOCAL_INDEX_PATH, or None if no snapshot was ingested."""
+        if not USDA_LOCAL_INDEX_PATH or not os.path.exists(USDA_LOCAL_INDEX_PATH):
+            return None
+        index = cls(USDA_LOCAL_INDEX_PATH)
+        missing = set(ADDED_COLUMNS) - index.columns()
+        if missing:
+            # an older snapshot has no macros or portions; answering from it would drop them
+            logger.warning("Local FoodData Central index %s predates %s; re-run app.usda.ingest to use it",
+                           USDA_LOCAL_INDEX_PATH, ", ".join(sorted(missing)))
+            index.close()
+            return None
+        return index
+
+    def columns(self) -> set:
+        with self._lock:
+            return {row[1] for row in self._conn.execute("PRAGMA table_info(foods)")}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM foods").fetchone()[0]
+
+    def search(self, query: str, limit: int = USDA_LOCAL_INDEX_CANDIDATES) -> List[Dict[str, Any]]:
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        match = " OR ".join(f'"{t}"' for t in dict.fromkeys(tokens))
+        sql = (
+            f"SELECT {', '.join(f'f.{column}' for column in FOOD_COLUMNS)}"
+            " FROM foods_fts JOIN foods f ON f.fdc_id = foods_fts.rowid"
+            " WHERE foods_fts MATCH ? AND f.calories IS NOT NULL"
+            " ORDER BY bm25(foods_fts) LIMIT ?"
+        )
+        with self._lock:
+            rows = self._conn.execute(sql, (match, limit)).fetchall()
+        return [self._to_search_food(row) for row in rows]
+
+    @staticmethod
+    def _to_search_food(row: Iterable[Any]) -> Dict[str, Any]:
+        (fdc_id, description, data_type, food_category, brand_owner, ingredients, calories,
+         protein, fat, carbohydrate, per_serving, serving_grams, portions) = row
+        food: Dict[str, Any] = {
+            "fdcId": fdc_id,
+            "description": description,
+            "dataType": data_type,
+            "foodCategory": food_category,
+            "brandOwner": brand_owner,
+            "ingredients": ingredients,
+        }
+        values = {"calories": calories, "protein": protein, "fat": fat, "carbohydrate": carbohydrate}
+        if per_serving:
+            food["foodNutrients"] = []
+            food["labelNutrients"] = {LABEL_FIELDS[field]: {"value": value}
+                                      for field, value in values.items() if value is not None}
+        else:
+            food["foodNutrients"] = [
+                {"nutrientId": ENERGY_KCAL, "nutrientNumber": "208", "nutrientName": "Energy",
+                 "unitName": "KCAL", "value": calories},
+            ] + [
+                {"nutrientId": nutrient_id, "unitName": "G", "value": values[field]}
+                for nutrient_id, field in ((PROTEIN, "protein"), (FAT, "fat"), (CARBOHYDRATE, "carbohydrate"))
+                if values[field] is not None
+            ]
+        if serving_grams:
+            food["servingSize"], food["servingSizeUnit"] = serving_grams, "g"
+        if portions:
+            food["foodPortions"] = [{"measureUnit": {"name": unit}, "amount": 1, "gramWeight": grams}
+                                    for unit, grams in json.loads(portions).items()]
+        return food
+
+    def close(self) -> None:
+        self._conn.close()
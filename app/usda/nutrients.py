@@ -0,0 +1,130 @@
+"""Energy and macronutrients of a FoodData Central food, keyed by nutrient id.
+
+Search results list nutrients flat (``nutrientId``, ``nutrientNumber``,
+``unitName``, ``value``); full food records and dumps nest them
+(``nutrient: {id, number, unitName}``, ``amount``). Both are read in one
+pass over ``foodNutrients``, matching on the numeric id (or the legacy
+nutrient number when the id is missing) instead of on names, and energy
+given in kJ is converted to kcal.
+"""
+from typing import Any, Dict, NamedTuple, Optional
+
+KJ_PER_KCAL = 4.184
+
+ENERGY_KCAL = 1008
+ENERGY_ATWATER_GENERAL = 2047  # kcal, Foundation foods
+ENERGY_ATWATER_SPECIFIC = 2048  # kcal, Foundation foods
+ENERGY_KJ = 1062
+PROTEIN = 1003
+FAT = 1004  # total lipid
+CARBOHYDRATE = 1005  # by difference
+
+# Energy nutrients in order of preference: kcal, Atwater general/specific, kJ
+ENERGY_NUTRIENT_IDS = {ENERGY_KCAL: 0, ENERGY_ATWATER_GENERAL: 1, ENERGY_ATWATER_SPECIFIC: 2, ENERGY_KJ: 3}
+KJ_NUTRIENT_IDS = {ENERGY_KJ}
+MACRO_NUTRIENT_IDS = {PROTEIN: "protein", FAT: "fat", CARBOHYDRATE: "carbohydrate"}
+# every id the parser reads: energy rank (int) or macro field (str), one lookup per entry
+_WANTED = {**ENERGY_NUTRIENT_IDS, **MACRO_NUTRIENT_IDS}
+
+# Legacy (SR) nutrient numbers, for records that carry only those
+NUTRIENT_NUMBERS = {"208": ENERGY_KCAL, "957": ENERGY_ATWATER_GENERAL, "958": ENERGY_ATWATER_SPECIFIC,
+                    "268": ENERGY_KJ, "203": PROTEIN, "204": FAT, "205": CARBOHYDRATE}
+
+# labelNutrients (branded foods) names for each field
+LABEL_FIELDS = {"calories": "calories", "protein": "protein", "fat": "fat", "carbohydrate": "carbohydrates"}
+
+_GRAMS_PER_UNIT = {"g": 1.0, "mg": 0.001, "ug": 0.000001, "µg": 0.000001}
+
+
+class Nutrients(NamedTuple):
+    """Energy in kcal and macros in grams, per 100 g or, from the label, per serving."""
+
+    calories: Optional[float] = None
+    protein: Optional[float] = None
+    fat: Optional[float] = None
+    carbohydrate: Optional[float] = None
+    per_serving: bool = False
+
+
+def _nested(n: Dict[str, Any]) -> Dict[str, Any]:
+    return n.get("nutrient") or {}
+
+
+def _nutrient_id(n: Dict[str, Any]) -> Optional[int]:
+    """Id of a foodNutrients entry whose flat ``nutrientId`` is missing."""
+    nested = _nested(n)
+    nutrient_id = nested.get("id")
+    if nutrient_id is None:
+        number = n.get("nutrientNumber", nested.get("number"))
+        if number is not None:
+            nutrient_id = NUTRIENT_NUMBERS.get(str(number))
+    return nutrient_id
+
+
+def _unit(n: Dict[str, Any]) -> str:
+    return (n.get("unitName") or _nested(n).get("unitName") or "").lower()
+
+
+def _kcal(nutrient_id: Optional[int], unit: str, value: float) -> float:
+    # the unit decides; a kJ id without a unit is still kJ
+    if unit == "kj" or (not unit and nutrient_id in KJ_NUTRIENT_IDS):
+        return value / KJ_PER_KCAL
+    return value
+
+
+def _float(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_nutrients(food: Dict[str, Any]) -> Nutrients:
+    """Energy and macros of ``food`` from a single pass over its nutrients.
+
+    Entries are skipped on an id lookup alone unless they are one of the
+    few nutrients wanted, so long nutrient lists cost little. Entries
+    without any id or number fall back to the nutrient name for energy
+    only. When nothing in ``foodNutrients`` gives the energy, branded
+    ``labelNutrients`` are used for every field.
+    """
+    energy_rank = len(ENERGY_NUTRIENT_IDS)
+    calories: Optional[float] = None
+    named_energy: Optional[float] = None
+    macros: Dict[str, float] = {}
+    for n in food.get("foodNutrients") or ():
+        nutrient_id = n.get("nutrientId")
+        if nutrient_id is None:
+            nutrient_id = _nutrient_id(n)
+            if nutrient_id is None:
+                if named_energy is None and not n.get("nutrientNumber") and not _nested(n).get("number"):
+                    name = (n.get("nutrientName") or _nested(n).get("name") or "").lower()
+                    if "energy" in name or "calorie" in name or "kcal" in name:
+                        value = _float(n.get("value", n.get("amount")))
+                        if value is not None:
+                            named_energy = _kcal(None, _unit(n), value)
+                continue
+        wanted = _WANTED.get(nutrient_id)
+        if wanted is None:
+            continue
+        if wanted.__class__ is int:
+            if wanted < energy_rank:
+                value = _float(n.get("value", n.get("amount")))
+                if value is not None:
+                    energy_rank, calories = wanted, _kcal(nutrient_id, _unit(n), value)
+        elif wanted not in macros:
+            value = _float(n.get("value", n.get("amount")))
+            if value is not None:
+                macros[wanted] = value * _GRAMS_PER_UNIT.get(_unit(n), 1.0)
+        if energy_rank == 0 and len(macros) == len(MACRO_NUTRIENT_IDS):
+            break
+    if calories is None:
+        calories = named_energy
+    if calories is None:
+        label = food.get("labelNutrients") or {}
+        fields = {field: _float((label.get(key) or {}).get("value")) for field, key in LABEL_FIELDS.items()}
+        if fields["calories"] is None:
+            fields["calories"] = _float((label.get("energy") or {}).get("value"))
+        if fields["calories"] is not None:
+            return Nutrients(**fields, per_serving=True)
+    return Nutrients(calories, **macros)
@@ -0,0 +1,178 @@
+"""Serving sizes and household measures, converted to grams.
+
+FoodData Central energy values are per 100 g, except branded label values
+which are per label serving. A cached DishRecord therefore carries the
+grams its values refer to (``basis_grams``), the grams in one serving of
+the food (``serving_grams``) and the gram weight of each household
+measure USDA lists for it (``portions``), all taken from the search result
+it was built from. Any requested amount then converts with a dictionary
+lookup and no further upstream call.
+
+Mass units convert exactly. Volumes use the food's own measure when USDA
+gives one and otherwise assume the density of water, which is close for
+drinks and soups and only an estimate for solids.
+"""
+import re
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+# Grams per unit; volumes at the density of water (1 g/ml), US customary measures
+GRAMS_PER_UNIT = {
+    "g": 1.0,
+    "kg": 1000.0,
+    "mg": 0.001,
+    "oz": 28.349523125,
+    "lb": 453.59237,
+    "ml": 1.0,
+    "dl": 100.0,
+    "l": 1000.0,
+    "tsp": 4.92892159375,
+    "tbsp": 14.78676478125,
+    "fl oz": 29.5735295625,
+    "cup": 236.5882365,
+    "pint": 473.176473,
+    "quart": 946.352946,
+}
+
+# Counted units: only the food's own portions say how much they weigh
+COUNT_UNITS = ("piece", "slice", "small", "medium", "large", "serving")
+
+UNIT_ALIASES = {
+    "g": "g", "gm": "g", "gms": "g", "gr": "g", "gram": "g", "grams": "g", "grm": "g",
+    "kg": "kg", "kgs": "kg", "kilogram": "kg", "kilograms": "kg",
+    "mg": "mg", "milligram": "mg", "milligrams": "mg",
+    "oz": "oz", "ounce": "oz", "ounces": "oz",
+    "lb": "lb", "lbs": "lb", "pound": "lb", "pounds": "lb",
+    "ml": "ml", "mlt": "ml", "milliliter": "ml", "milliliters": "ml", "millilitre": "ml", "millilitres": "ml",
+    "dl": "dl", "deciliter": "dl", "decilitre": "dl",
+    "l": "l", "liter": "l", "liters": "l", "litre": "l", "litres": "l",
+    "tsp": "tsp", "teaspoon": "tsp", "teaspoons": "tsp",
+    "tbsp": "tbsp", "tbs": "tbsp", "tablespoon": "tbsp", "tablespoons": "tbsp",
+    "fl oz": "fl oz", "fluid ounce": "fl oz", "fluid ounces": "fl oz",
+    "cup": "cup", "cups": "cup",
+    "pint": "pint", "pints": "pint", "pt": "pint",
+    "quart": "quart", "quarts": "quart", "qt": "quart",
+    "piece": "piece", "pieces": "piece", "pc": "piece", "pcs": "piece", "each": "piece", "ea": "piece",
+    "whole": "piece", "item": "piece", "items": "piece", "unit": "piece", "units": "piece",
+    "slice": "slice", "slices": "slice",
+    "small": "small", "medium": "medium", "large": "large", "extra large": "large",
+    "serving": "serving", "servings": "serving", "portion": "serving", "portions": "serving",
+}
+_LONGEST_ALIAS_WORDS = max(len(alias.split()) for alias in UNIT_ALIASES)
+
+_MEASURE = re.compile(r"^\s*(?P<amount>\d+/\d+|\d+(?:\.\d+)?)?\s*(?P<rest>.*)$")
+
+DEFAULT_BASIS_GRAMS = 100.0
+
+
+def normalize_unit(unit: Optional[str]) -> Optional[str]:
+    """Canonical unit name, or None when ``unit`` is not a known measure."""
+    if not unit:
+        return None
+    return UNIT_ALIASES.get(" ".join(unit.lower().replace(".", "").split()))
+
+
+def leading_unit(text: str, require_rest: bool = True) -> Tuple[Optional[str], str]:
+    """(unit, rest) when ``text`` starts with a unit ("cups of rice"), else (None, text).
+
+    With ``require_rest`` a unit word alone is not taken as a unit, so a
+    food called "large" or "serving" is still looked up.
+    """
+    words = text.split()
+    longest = min(_LONGEST_ALIAS_WORDS, len(words) - 1 if require_rest else len(words))
+    for n in range(longest, 0, -1):
+        unit = normalize_unit(" ".join(words[:n]))
+        if unit:
+            rest = words[n:]
+            if len(rest) > 1 and rest[0].lower() == "of":
+                rest = rest[1:]
+            return unit, " ".join(rest)
+    return None, text
+
+
+def _amount(text: Optional[str]) -> float:
+    if not text:
+        return 1.0
+    if "/" in text:
+        numerator, denominator = text.split("/")
+        return int(numerator) / int(denominator) if int(denominator) else 0.0
+    return float(text)
+
+
+def _measure(description: Optional[str]) -> Tuple[float, Optional[str]]:
+    """(amount, unit) of a measure such as "1 cup, chopped" or "2 large"."""
+    match = _MEASURE.match((description or "").split(",")[0])
+    unit, _ = leading_unit(match.group("rest"), require_rest=False)
+    return _amount(match.group("amount")), unit
+
+
+def _add(portions: Dict[str, float], unit: Optional[str], amount: float, grams: Any) -> None:
+    try:
+        grams = float(grams)
+    except (TypeError, ValueError):
+        return
+    if unit and amount > 0 and grams > 0 and unit not in portions:
+        portions[unit] = grams / amount
+
+
+class Portions(NamedTuple):
+    serving_grams: Optional[float]
+    measures: Optional[Dict[str, float]]
+
+
+def portions_from_food(food: Dict[str, Any]) -> Portions:
+    """Grams per serving and per household measure listed on a food record.
+
+    Reads the branded serving (``servingSize``/``servingSizeUnit`` and
+    ``householdServingFullText``), survey ``foodMeasures`` from search
+    results and ``foodPortions`` from full food records; the first entry
+    for a unit wins.
+    """
+    measures: Dict[str, float] = {}
+    serving_grams = None
+    size_unit = normalize_unit(food.get("servingSizeUnit"))
+    if size_unit in ("g", "ml") and food.get("servingSize"):
+        try:
+            serving_grams = float(food["servingSize"])
+        except (TypeError, ValueError):
+            serving_grams = None
+    if serving_grams:
+        measures["serving"] = serving_grams
+        amount, unit = _measure(food.get("householdServingFullText"))
+        _add(measures, unit, amount, serving_grams)
+    for m in sorted(food.get("foodMeasures") or (), key=lambda m: m.get("rank") or 0):
+        amount, unit = _measure(m.get("disseminationText"))
+        if unit is None:
+            unit = normalize_unit(m.get("measureUnitAbbreviation") or m.get("measureUnitName"))
+        _add(measures, unit, amount, m.get("gramWeight"))
+    for p in food.get("foodPortions") or ():
+        unit = normalize_unit((p.get("measureUnit") or {}).get("name"))
+        if unit is None:
+            _, unit = _measure(p.get("modifier") or p.get("portionDescription"))
+        _add(measures, unit, _amount(str(p.get("amount") or 1)), p.get("gramWeight"))
+    return Portions(serving_grams, measures or None)
+
+
+def portion_factor(record, quantity: Optional[float] = None, unit: Optional[str] = None
+                   ) -> Optional[Tuple[float, Optional[float]]]:
+    """(multiplier of the record's values, grams) for ``quantity`` ``unit`` of the food.
+
+    ``record`` is a DishRecord. A serving is the label serving when known,
+    else 100 g; with no unit or quantity that is what one means. A bare
+    count ("2 eggs") is counted in the food's own pieces when USDA lists
+    one. Returns None when the unit cannot be converted for this food.
+    """
+    measures = record.portions or {}
+    basis = record.basis_grams
+    if unit is None:
+        unit = "serving" if quantity is None else next((u for u in COUNT_UNITS if u in measures), "serving")
+    quantity = 1.0 if quantity is None else quantity
+    grams_each = measures.get(unit) or GRAMS_PER_UNIT.get(unit)
+    if grams_each is None and unit in COUNT_UNITS:
+        grams_each = record.serving_grams
+        if grams_each is None:
+            # no weight known: one piece or serving is one unit of the values
+            return quantity, (quantity * basis if basis else None)
+    if grams_each is None or not basis:
+        return None
+    grams = quantity * grams_each
+    return grams / basis, grams
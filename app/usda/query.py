@@ -0,0 +1,108 @@
+"""Canonical dish keys, and an alias index from past queries to the food they resolved to.
+
+"Chicken Biryani", "chicken  biryani", "biryani, chicken" and "Chicken
+Biryanis" all canonicalize to "biryani chicken" and share one cache entry.
+Spelling variants ("chicken biriyani") still get their own key; the alias
+index catches those with a rapidfuzz match against keys already resolved,
+before any network call.
+"""
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from rapidfuzz import fuzz, process
+from rapidfuzz.distance import Levenshtein
+
+_NON_WORD = re.compile(r"[^\w]+|_")
+
+
+def singular(word: str) -> str:
+    """Naive English singular of a lowercase word ("tomatoes" -> "tomato")."""
+    if len(word) <= 3 or word.endswith(("ss", "us", "is")):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("oes", "ches", "shes", "xes")):
+        return word[:-2]
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def canonical_key(dish_name: str) -> str:
+    """Cache key of a dish: lowercase words without punctuation, singular, sorted."""
+    return " ".join(sorted(singular(w) for w in _NON_WORD.sub(" ", dish_name.lower()).split()))
+
+
+def _near_spelling(a: str, b: str) -> bool:
+    """Whether two different words read as one word misspelt: a single substitution,
+    or on words of 6+ letters a single insertion or deletion. A word that contains
+    the other ("sweetened"/"unsweetened", "fat"/"nonfat") is a different word.
+    """
+    if a in b or b in a:
+        return False
+    if Levenshtein.distance(a, b, score_cutoff=1) > 1:
+        return False
+    return len(a) == len(b) or min(len(a), len(b)) >= 6
+
+
+def _same_words(a: str, b: str) -> bool:
+    # whole-key similarity alone would match "brown rice" to "brown ice"
+    words_a, words_b = a.split(), b.split()
+    return len(words_a) == len(words_b) and all(
+        x == y or _near_spelling(x, y) for x, y in zip(words_a, words_b)
+    )
+
+
+class AliasIndex:
+    """Canonical keys of resolved queries -> FoodData Central id, least recently used dropped first.
+
+    Keys are bucketed by word count, the only keys a near spelling can
+    match, and a lookup scores its bucket outside the lock so concurrent
+    lookups and adds do not wait on the fuzzy scan.
+    """
+
+    def __init__(self, maxsize: int = 10000, min_score: float = 90):
+        self.maxsize = maxsize
+        self.min_score = min_score
+        self._ids: "OrderedDict[str, int]" = OrderedDict()
+        self._by_words: Dict[int, Dict[str, None]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, key: str, fdc_id: int) -> None:
+        with self._lock:
+            if key not in self._ids:
+                self._by_words.setdefault(len(key.split()), {})[key] = None
+            self._ids[key] = fdc_id
+            self._ids.move_to_end(key)
+            while len(self._ids) > self.maxsize:
+                evicted, _ = self._ids.popitem(last=False)
+                del self._by_words[len(evicted.split())][evicted]
+
+    def lookup(self, key: str) -> Optional[int]:
+        """fdcId of ``key`` or of a known key it is a near spelling of; None when there is none."""
+        with self._lock:
+            if key in self._ids:
+                return self._ids[key]
+            candidates = list(self._by_words.get(len(key.split()), ()))
+        if not candidates:
+            return None
+        matches = process.extract(key, candidates, scorer=fuzz.ratio,
+                                  score_cutoff=self.min_score, limit=5)
+        for alias, _, _ in matches:
+            if _same_words(key, alias):
+                with self._lock:
+                    fdc_id = self._ids.get(alias)
+                    if fdc_id is not None:  # unless evicted meanwhile
+                        self._ids.move_to_end(alias)
+                        return fdc_id
+        return None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._ids.clear()
+            self._by_words.clear()
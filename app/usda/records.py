@@ -0,0 +1,66 @@
+from typing import Any, Dict, NamedTuple, Optional
+
+from .nutrients import Nutrients
+from .portions import DEFAULT_BASIS_GRAMS, portions_from_food
+
+# Ingredient text is only ever shown truncated, so keep no more than that
+INGREDIENTS_MAX_CHARS = 400
+
+
+class DishRecord(NamedTuple):
+    """Compact projection of a FoodData Central food kept in the dish cache.
+
+    Holds only the fields the API returns. Being a tuple it has no per-instance
+    dict, and it serializes to a plain JSON array for the shared cache tier.
+    New fields go at the end with a default so arrays cached before they
+    existed still decode.
+    """
+
+    fdc_id: Optional[int]
+    description: Optional[str]
+    data_type: Optional[str]
+    brand_owner: Optional[str]
+    calories_per_unit: Optional[float]
+    ingredients: Optional[str] = None
+    protein_per_unit: Optional[float] = None  # grams
+    fat_per_unit: Optional[float] = None
+    carbohydrate_per_unit: Optional[float] = None
+    # grams the values above are for (None: one serving of unknown weight),
+    # grams in one serving, and grams per household measure (see portions.py)
+    basis_grams: Optional[float] = DEFAULT_BASIS_GRAMS
+    serving_grams: Optional[float] = None
+    portions: Optional[Dict[str, float]] = None
+
+    @classmethod
+    def from_food(cls, food: dict, nutrients: Nutrients) -> "DishRecord":
+        ingredients = food.get("ingredients") or food.get("ingredientDescription") or None
+        if ingredients:
+            ingredients = ingredients[:INGREDIENTS_MAX_CHARS]
+        serving_grams, measures = portions_from_food(food)
+        return cls(
+            fdc_id=food.get("fdcId"),
+            description=food.get("description"),
+            data_type=food.get("dataType"),
+            brand_owner=food.get("brandOwner"),
+            calories_per_unit=nutrients.calories,
+            ingredients=ingredients,
+            protein_per_unit=nutrients.protein,
+            fat_per_unit=nutrients.fat,
+            carbohydrate_per_unit=nutrients.carbohydrate,
+            basis_grams=serving_grams if nutrients.per_serving else DEFAULT_BASIS_GRAMS,
+            serving_grams=serving_grams,
+            portions=measures,
+        )
+
+
+class DishEntry(NamedTuple):
+    """Cache envelope: the record (None for not-found) and its freshness deadline."""
+
+    value: Optional[DishRecord]
+    fresh_until: float
+
+
+def decode_entry(row: Any) -> DishEntry:
+    """Rebuild a DishEntry from the JSON array stored in the shared tier."""
+    value, fresh_until = row
+    return DishEntry(DishRecord(*value) if value is not None else None, fresh_until)
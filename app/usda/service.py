@@ -1,92 +1,547 @@
-from typing import Optional, Dict, Any, List
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
+import heapq
 import os
+import time
 from dotenv import load_dotenv
 import httpx
-from rapidfuzz import fuzz
-from ..utils.cache import usda_cache
+from rapidfuzz import fuzz, process, utils
+from ..utils.cache import MISSING, usda_cache
+from ..utils.metrics import (
+    registry,
+    usda_circuit_rejections,
+    usda_dish_lookups,
+    usda_hedged_requests,
+    usda_request_duration,
+    usda_request_errors,
+    usda_retries,
+)
+from ..utils.resilience import CircuitBreaker, LatencyWindow, RetryBudget, UpstreamUnavailable, backoff
+from ..utils.singleflight import SingleFlight
+from .nutrients import parse_nutrients
+from .query import AliasIndex, canonical_key
+from .records import DishEntry, DishRecord, decode_entry
+from .local_index import LocalFoodIndex
 import logging
 
 load_dotenv()
 logger = logging.getLogger(__name__)
-USDA_SEARCH_URL = "https://api.nal.usda.gov/fdc/v1/foods/search"
+# Overridable so load tests can point at a local stand-in (benchmarks/fake_fdc.py)
+USDA_SEARCH_URL = os.getenv("USDA_SEARCH_URL", "https://api.nal.usda.gov/fdc/v1/foods/search")
 
 USDA_API_KEY = os.getenv("USDA_API_KEY")
-def search_usda_sync(query: str, pageSize: int = 10) -> Optional[Dict[str, Any]]:
-    """Synchronous call to USDA FoodData Central search endpoint."""
+# Total time one search may take across retries, and the limit for each attempt
+USDA_TIMEOUT_SECONDS = float(os.getenv("USDA_TIMEOUT_SECONDS", "10"))
+USDA_ATTEMPT_TIMEOUT_SECONDS = float(os.getenv("USDA_ATTEMPT_TIMEOUT_SECONDS", "4"))
+USDA_HTTP2 = os.getenv("USDA_HTTP2", "true").lower() == "true"
+USDA_MAX_CONNECTIONS = int(os.getenv("USDA_MAX_CONNECTIONS", "100"))
+USDA_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("USDA_MAX_KEEPALIVE_CONNECTIONS", "20"))
+USDA_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("USDA_KEEPALIVE_EXPIRY_SECONDS", "30"))
+
+# Upstream resilience (see app/utils/resilience.py): 5xx, 429 and timeouts are
+# retried with jittered backoff while the retry budget allows; after
+# USDA_BREAKER_FAILURES failed searches in a row USDA is not called for
+# USDA_BREAKER_RESET_SECONDS. With USDA_HEDGE a second search is sent when
+# the first is slower than the recent USDA_HEDGE_PERCENTILE latency.
+USDA_MAX_RETRIES = int(os.getenv("USDA_MAX_RETRIES", "2"))
+USDA_RETRY_BACKOFF_SECONDS = float(os.getenv("USDA_RETRY_BACKOFF_SECONDS", "0.1"))
+USDA_RETRY_BACKOFF_MAX_SECONDS = float(os.getenv("USDA_RETRY_BACKOFF_MAX_SECONDS", "1"))
+USDA_RETRY_BUDGET_RATIO = float(os.getenv("USDA_RETRY_BUDGET_RATIO", "0.2"))
+USDA_RETRY_BUDGET_MIN_PER_SECOND = float(os.getenv("USDA_RETRY_BUDGET_MIN_PER_SECOND", "1"))
+USDA_BREAKER_FAILURES = int(os.getenv("USDA_BREAKER_FAILURES", "5"))
+USDA_BREAKER_RESET_SECONDS = float(os.getenv("USDA_BREAKER_RESET_SECONDS", "30"))
+USDA_HEDGE = os.getenv("USDA_HEDGE", "false").lower() == "true"
+USDA_HEDGE_PERCENTILE = float(os.getenv("USDA_HEDGE_PERCENTILE", "0.95"))
+USDA_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("USDA_HEDGE_MIN_DELAY_SECONDS", "0.05"))
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+
+# Food fields matched against the dish name, and the minimum score to accept
+FUZZY_FIELDS = ("description", "lowercaseDescription", "dataType", "foodCategory", "brandOwner")
+FUZZY_MIN_SCORE = 40
+# Local snapshot matches are accepted on the description alone: a category
+# such as "Rice mixed dishes" or "Dairy and Egg Products" says nothing about
+# which food in it was meant
+LOCAL_FUZZY_FIELDS = ("description",)
+
+# Dish cache freshness: found / not-found entries expire independently. Found
+# entries are served stale (and refreshed in the background) for a grace
+# window, and kept as last-known-good while USDA is failing.
+USDA_POSITIVE_TTL_SECONDS = float(os.getenv("USDA_POSITIVE_TTL_SECONDS", "600"))
+USDA_NEGATIVE_TTL_SECONDS = float(os.getenv("USDA_NEGATIVE_TTL_SECONDS", "60"))
+USDA_STALE_WHILE_REVALIDATE_SECONDS = float(os.getenv("USDA_STALE_WHILE_REVALIDATE_SECONDS", "300"))
+USDA_STALE_IF_ERROR_SECONDS = float(os.getenv("USDA_STALE_IF_ERROR_SECONDS", "86400"))
+# A local snapshot match must be at least this confident, otherwise ask the API
+USDA_LOCAL_MIN_SCORE = float(os.getenv("USDA_LOCAL_MIN_SCORE", "80"))
+
+# Misses whose canonical key is a near spelling ("chicken biriyani") of a key
+# already resolved reuse that food instead of calling USDA; see app/usda/query.py
+USDA_ALIAS_MAX_KEYS = int(os.getenv("USDA_ALIAS_MAX_KEYS", "10000"))
+USDA_ALIAS_MIN_SCORE = float(os.getenv("USDA_ALIAS_MIN_SCORE", "90"))
+alias_index = AliasIndex(USDA_ALIAS_MAX_KEYS, USDA_ALIAS_MIN_SCORE)
+# Found records are also cached under their fdcId for alias hits
+FDC_KEY_PREFIX = "fdc:"
+
+# Shared-tier hits come back as JSON arrays; rebuild DishEntry/DishRecord
+usda_cache.decode = decode_entry
+
+# Local FoodData Central snapshot consulted before the API (see app/usda/ingest.py);
+# None when no snapshot has been ingested
+local_index = LocalFoodIndex.open_default()
+
+
+@registry.collector
+def _usda_cache_metrics():
+    """Expose the dish cache's own per-tier counters on /metrics."""
+    yield "# HELP usda_cache_events_total Dish cache lookups and writes by tier and event."
+    yield "# TYPE usda_cache_events_total counter"
+    for tier, counts in usda_cache.stats().items():
+        for event, value in counts.items():
+            yield f'usda_cache_events_total{{tier="{tier}",event="{event}"}} {value}'
+
+
+@registry.collector
+def _usda_hit_ratio():
+    """Share of dish lookups answered without USDA (cache, alias or local snapshot), since startup."""
+    counts = {source: usda_dish_lookups.value(source) for source in ("cache", "alias", "local", "upstream")}
+    total = sum(counts.values())
+    yield "# HELP usda_dish_hit_ratio Dish lookups answered without calling USDA."
+    yield "# TYPE usda_dish_hit_ratio gauge"
+    yield f"usda_dish_hit_ratio {(total - counts['upstream']) / total if total else 0.0}"
+
+
+# Shared by the sync and async clients, so both see the same upstream health
+usda_breaker = CircuitBreaker(USDA_BREAKER_FAILURES, USDA_BREAKER_RESET_SECONDS)
+usda_retry_budget = RetryBudget(USDA_RETRY_BUDGET_RATIO, USDA_RETRY_BUDGET_MIN_PER_SECOND)
+usda_latency = LatencyWindow()
+
+
+@registry.collector
+def _usda_circuit_metrics():
+    yield "# HELP usda_circuit_state USDA circuit breaker state: 0 closed, 1 open, 2 half-open."
+    yield "# TYPE usda_circuit_state gauge"
+    yield f"usda_circuit_state {('closed', 'open', 'half_open').index(usda_breaker.state)}"
+
+
+# Concurrent cache misses for the same dish key share one upstream call
+usda_flight = SingleFlight()
+# Strong references to background refresh tasks so they are not GC'd mid-flight
+_refresh_tasks: set = set()
+
+# Lookups per dish key (with the name last asked for), read by the warm-up
+# job in app/usda/warmup.py; when full every count is halved so old traffic fades
+USDA_POPULARITY_MAX_KEYS = int(os.getenv("USDA_POPULARITY_MAX_KEYS", "10000"))
+dish_requests: Dict[str, list] = {}
+
+
+def _count_request(key: str, dish_name: str) -> None:
+    counts = dish_requests.get(key)
+    if counts is not None:
+        counts[0] += 1
+        counts[1] = dish_name
+        return
+    if len(dish_requests) >= USDA_POPULARITY_MAX_KEYS:
+        for k in list(dish_requests):
+            dish_requests[k][0] //= 2
+            if not dish_requests[k][0]:
+                del dish_requests[k]
+    dish_requests[key] = [1, dish_name]
+
+
+def top_dishes(n: int) -> List[Tuple[str, str]]:
+    """(key, dish name) of the ``n`` most looked-up dishes, most popular first."""
+    top = heapq.nlargest(n, dish_requests.items(), key=lambda item: item[1][0])
+    return [(key, name) for key, (_, name) in top]
+
+
+# Shared async client, opened and closed by the FastAPI lifespan in main.py
+_async_client: Optional[httpx.AsyncClient] = None
+
+
+def _build_async_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=USDA_MAX_CONNECTIONS,
+        max_keepalive_connections=USDA_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=USDA_KEEPALIVE_EXPIRY_SECONDS,
+    )
+    return httpx.AsyncClient(
+        timeout=USDA_ATTEMPT_TIMEOUT_SECONDS,
+        limits=limits,
+        http2=USDA_HTTP2,
+    )
+
+
+async def open_usda_client() -> httpx.AsyncClient:
+    """Create the application-lifetime USDA client (called on startup)."""
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = _build_async_client()
+    return _async_client
+
+
+async def close_usda_client() -> None:
+    """Close the shared USDA client and its pooled connections (called on shutdown)."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+def get_usda_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it lazily when the lifespan did not run."""
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = _build_async_client()
+    return _async_client
+
+
+def _admit() -> None:
+    """Fail fast while the circuit is open; otherwise count a first attempt for the retry budget."""
+    if not usda_breaker.allow():
+        usda_circuit_rejections.inc()
+        raise UpstreamUnavailable("USDA circuit open", retry_after=usda_breaker.retry_after())
+    usda_retry_budget.deposit()
+
+
+def _next_delay(attempt: int, deadline: float) -> Optional[float]:
+    """Backoff before retry ``attempt``, or None when out of retries, time or budget."""
+    delay = backoff(attempt, USDA_RETRY_BACKOFF_SECONDS, USDA_RETRY_BACKOFF_MAX_SECONDS)
+    if attempt > USDA_MAX_RETRIES or time.monotonic() + delay >= deadline:
+        return None
+    if not usda_retry_budget.try_spend():
+        return None
+    return delay
+
+
+def _attempt_timeout(deadline: float) -> float:
+    return max(0.001, min(USDA_ATTEMPT_TIMEOUT_SECONDS, deadline - time.monotonic()))
+
+
+def _give_up(query: str, attempts: int, error: str, client: str) -> UpstreamUnavailable:
+    usda_breaker.record_failure()
+    usda_request_errors.inc(client)
+    logger.warning("USDA search for %r failed after %d attempt(s): %s", query, attempts, error)
+    return UpstreamUnavailable(f"USDA search failed: {error}", retry_after=usda_breaker.retry_after() or None)
+
+
+def _final_body(r: httpx.Response, client: str) -> Dict[str, Any]:
+    """JSON of the response USDA settled on; non-2xx answers are UpstreamUnavailable."""
+    # USDA answered, so the circuit stays closed even for a 4xx (e.g. a bad API key)
+    usda_breaker.record_success()
+    if r.is_error:
+        usda_request_errors.inc(client)
+        logger.error("USDA search answered HTTP %s", r.status_code)
+        raise UpstreamUnavailable(f"USDA answered HTTP {r.status_code}")
+    try:
+        return r.json()
+    except ValueError as e:
+        usda_request_errors.inc(client)
+        raise UpstreamUnavailable("USDA answered invalid JSON") from e
+
+
+def search_usda_sync(query: str, pageSize: int = 10) -> Dict[str, Any]:
+    """Synchronous call to USDA FoodData Central search endpoint.
+
+    Retries 5xx, 429 and timeouts with jittered backoff within the retry
+    budget and USDA_TIMEOUT_SECONDS overall. Raises UpstreamUnavailable
+    when USDA cannot answer, or without calling it while the circuit is open.
+    """
     params = {"query": query, "pageSize": pageSize, "api_key": USDA_API_KEY}
+    _admit()
+    deadline = time.monotonic() + USDA_TIMEOUT_SECONDS
+    start = time.perf_counter()
+    attempt = 0
     try:
-        with httpx.Client(timeout=10.0) as client:
-            r = client.get(USDA_SEARCH_URL, params=params)
-            r.raise_for_status()
-            return r.json()
-    except Exception as e:
-        logger.exception("USDA search failed: %s", e)
+        with httpx.Client() as client:
+            while True:
+                try:
+                    r = client.get(USDA_SEARCH_URL, params=params, timeout=_attempt_timeout(deadline))
+                    if r.status_code not in RETRYABLE_STATUS:
+                        break
+                    error = f"HTTP {r.status_code}"
+                except httpx.HTTPError as e:
+                    error = repr(e)
+                attempt += 1
+                delay = _next_delay(attempt, deadline)
+                if delay is None:
+                    raise _give_up(query, attempt, error, "sync")
+                usda_retries.inc("sync")
+                time.sleep(delay)
+        return _final_body(r, "sync")
+    finally:
+        usda_request_duration.observe(time.perf_counter() - start, "sync")
+
+async def _get(client: httpx.AsyncClient, params: Dict[str, Any], timeout: float) -> httpx.Response:
+    start = time.perf_counter()
+    r = await client.get(USDA_SEARCH_URL, params=params, timeout=timeout)
+    if r.status_code not in RETRYABLE_STATUS:
+        usda_latency.observe(time.perf_counter() - start)
+    return r
+
+def _hedge_delay() -> Optional[float]:
+    if not USDA_HEDGE:
+        return None
+    latency = usda_latency.percentile(USDA_HEDGE_PERCENTILE)
+    if latency is None:
         return None
+    return max(USDA_HEDGE_MIN_DELAY_SECONDS, latency)
+
+async def _hedged_get(client: httpx.AsyncClient, params: Dict[str, Any], timeout: float) -> httpx.Response:
+    """One attempt; if it is still running after the hedge delay, race a second one.
+
+    The hedge is paid for from the retry budget, and the first good
+    answer wins while the other request is cancelled.
+    """
+    first = asyncio.ensure_future(_get(client, params, timeout))
+    tasks = [first]
+    try:
+        delay = _hedge_delay()
+        if delay is None:
+            return await first
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done or not usda_retry_budget.try_spend():
+            return await first
+        usda_hedged_requests.inc()
+        tasks.append(asyncio.ensure_future(_get(client, params, timeout)))
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and task.result().status_code not in RETRYABLE_STATUS:
+                    return task.result()
+        return first.result()  # both failed: retry on the first one's outcome
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+async def search_usda(query: str, pageSize: int = 10) -> Dict[str, Any]:
+    """Async call to USDA FoodData Central search over the shared pooled client.
+
+    Same retry, budget and circuit rules as search_usda_sync, plus an
+    optional hedged second request (USDA_HEDGE).
+    """
+    params = {"query": query, "pageSize": pageSize, "api_key": USDA_API_KEY}
+    _admit()
+    deadline = time.monotonic() + USDA_TIMEOUT_SECONDS
+    start = time.perf_counter()
+    attempt = 0
+    try:
+        while True:
+            try:
+                r = await _hedged_get(get_usda_client(), params, _attempt_timeout(deadline))
+                if r.status_code not in RETRYABLE_STATUS:
+                    break
+                error = f"HTTP {r.status_code}"
+            except httpx.HTTPError as e:
+                error = repr(e)
+            attempt += 1
+            delay = _next_delay(attempt, deadline)
+            if delay is None:
+                raise _give_up(query, attempt, error, "async")
+            usda_retries.inc("async")
+            await asyncio.sleep(delay)
+        return _final_body(r, "async")
+    finally:
+        usda_request_duration.observe(time.perf_counter() - start, "async")
+
+def fuzzy_select_best(query: str, foods: List[Dict[str, Any]], fields: Tuple[str, ...] = FUZZY_FIELDS,
+                      processor: Optional[Callable[[str], str]] = None) -> Optional[Dict[str, Any]]:
+    """Pick the food whose best-matching field scores highest against ``query``.
 
-def fuzzy_select_best(query: str, foods: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
-    best = None
-    best_score = -1
-    for f in foods:
-        candidates = []
-        for field in ("description", "lowercaseDescription", "dataType", "foodCategory", "brandOwner"):
-            v = f.get(field) or ""
+    ``processor`` normalizes query and fields before scoring; API results
+    are scored as given, since they carry ``lowercaseDescription`` already.
+
+    All candidate fields of the page are flattened into one list and scored
+    in a single ``process.extractOne`` call, which runs the scorer in C++
+    with the query preprocessed once. The first choice reaching the top
+    score belongs to the earliest such food, matching the previous per-food
+    loop's tie-breaking.
+    """
+    choices: List[str] = []
+    owners: List[int] = []
+    for i, f in enumerate(foods):
+        for field in fields:
+            v = f.get(field)
             if v:
-                candidates.append(v)
-        # compute token_set_ratio against each candidate and take max
-        scores = [fuzz.token_set_ratio(query, c) for c in candidates] if candidates else [0]
-        score = max(scores)
-        if score > best_score:
-            best_score = score
-            best = f
-    if best_score < 40:
+                choices.append(v)
+                owners.append(i)
+    if not choices:
+        return None
+    match = process.extractOne(query, choices, scorer=fuzz.token_set_ratio,
+                               processor=processor, score_cutoff=FUZZY_MIN_SCORE)
+    if match is None:
         # low confidence
         return None
+    _, best_score, index = match
+    best = foods[owners[index]]
     best["_score"] = best_score
     best["_match_query"] = query
     best["_best_score"] = best_score
     return best
 
 def extract_calories_from_food(food: Dict[str, Any]) -> Optional[float]:
-    nutrients = food.get("foodNutrients") or []
-    for n in nutrients:
-        name = (n.get("nutrientName") or "").lower()
-        if "energy" in name or "calorie" in name or "kcal" in name:
-            try:
-                return float(n.get("value") or 0.0)
-            except Exception:
-                continue
-    # fallback: sometimes 'labelNutrients' exist
-    label = food.get("labelNutrients") or {}
-    energy = label.get("calories") or label.get("energy")
-    if energy:
-        try:
-            return float(energy.get("value"))
-        except Exception:
-            pass
-    return None
-
-def get_best_calorie_for_dish(dish_name: str) -> Optional[Dict[str, Any]]:
-    key = dish_name.strip().lower()
-    if key in usda_cache:
-        return usda_cache[key]
-
-    data = search_usda_sync(dish_name, pageSize=25)
-    if not data:
-        usda_cache[key] = None
-        return None
+    """Energy in kcal; see app/usda/nutrients.parse_nutrients."""
+    return parse_nutrients(food).calories
+
+def _build_dish_result(dish_name: str, data: Dict[str, Any]) -> Optional[DishRecord]:
     foods = data.get("foods") or []
     best = fuzzy_select_best(dish_name, foods)
     if not best:
-        usda_cache[key] = None
         return None
-    calories = extract_calories_from_food(best)
-    result = {
-        "fdcId": best.get("fdcId"),
-        "description": best.get("description"),
-        "dataType": best.get("dataType"),
-        "brandOwner": best.get("brandOwner"),
-        "calories_per_unit": calories, 
-        "raw": best
-    }
-    usda_cache[key] = result
+    return DishRecord.from_food(best, parse_nutrients(best))
+
+def _store_result(key: str, result: Optional[DishRecord], ttl: Optional[float] = None) -> None:
+    """Cache a result wrapped with its freshness deadline.
+
+    Found results stay in the backend past their deadline so they can be
+    served stale; not-found results are dropped as soon as they expire.
+    """
+    if ttl is None:
+        ttl = USDA_POSITIVE_TTL_SECONDS if result is not None else USDA_NEGATIVE_TTL_SECONDS
+    keep_for = ttl
+    if result is not None:
+        keep_for += max(USDA_STALE_WHILE_REVALIDATE_SECONDS, USDA_STALE_IF_ERROR_SECONDS)
+    entry = DishEntry(result, time.time() + ttl)
+    usda_cache.set(key, entry, ttl=keep_for)
+    if result is not None and result.fdc_id is not None:
+        usda_cache.set(f"{FDC_KEY_PREFIX}{result.fdc_id}", entry, ttl=keep_for)
+        alias_index.add(key, result.fdc_id)
+
+def _resolve_search(dish_name: str, key: str, data: Optional[Dict[str, Any]],
+                    error: Optional[UpstreamUnavailable] = None) -> Optional[DishRecord]:
+    """Turn a search response into a cached result.
+
+    ``data is None`` means the upstream call failed: the previous found
+    entry, if any, is kept as last-known-good and re-armed for a short
+    while instead of being replaced by a not-found. Without one the
+    failure is raised as UpstreamUnavailable, never cached as not-found.
+    """
+    if data is None:
+        entry = usda_cache.get(key)
+        if entry is not MISSING and entry.value is not None:
+            logger.warning("USDA unavailable, serving last-known-good entry for %r", key)
+            _store_result(key, entry.value, ttl=USDA_NEGATIVE_TTL_SECONDS)
+            return entry.value
+        raise error or UpstreamUnavailable("USDA search failed")
+    result = _build_dish_result(dish_name, data)
+    _store_result(key, result)
+    return result
+
+def _resolve_local(dish_name: str, key: str) -> Optional[DishRecord]:
+    """Resolve from the local snapshot; None on a miss or a low-confidence match."""
+    if local_index is None:
+        return None
+    # snapshot descriptions keep USDA's capitals ("Rice, white, ..."), so compare case-insensitively
+    best = fuzzy_select_best(dish_name, local_index.search(dish_name), LOCAL_FUZZY_FIELDS,
+                             processor=utils.default_process)
+    if not best or best["_best_score"] < USDA_LOCAL_MIN_SCORE:
+        return None
+    result = DishRecord.from_food(best, parse_nutrients(best))
+    if result.calories_per_unit is None:
+        return None
+    _store_result(key, result)
     return result
+
+def _resolve_alias(key: str) -> Optional[DishRecord]:
+    """The fresh record of a known key ``key`` is a near spelling of, cached under ``key`` too."""
+    if not alias_index:
+        return None
+    fdc_id = alias_index.lookup(key)
+    if fdc_id is None:
+        return None
+    entry = usda_cache.get(f"{FDC_KEY_PREFIX}{fdc_id}")
+    if entry is MISSING or entry.value is None or entry.fresh_until <= time.time():
+        return None
+    usda_cache.set(key, entry, ttl=max(0.0, entry.fresh_until - time.time()))
+    alias_index.add(key, fdc_id)
+    return entry.value
+
+def get_best_calorie_for_dish(dish_name: str) -> Optional[DishRecord]:
+    key = canonical_key(dish_name)
+    entry = usda_cache.get(key)
+    if entry is not MISSING and entry.fresh_until > time.time():
+        usda_dish_lookups.inc("cache")
+        return entry.value
+
+    alias = _resolve_alias(key)
+    if alias is not None:
+        usda_dish_lookups.inc("alias")
+        return alias
+    local = _resolve_local(dish_name, key)
+    if local is not None:
+        usda_dish_lookups.inc("local")
+        return local
+    usda_dish_lookups.inc("upstream")
+    try:
+        data = search_usda_sync(dish_name, pageSize=25)
+    except UpstreamUnavailable as e:
+        return _resolve_search(dish_name, key, None, e)
+    return _resolve_search(dish_name, key, data)
+
+async def _off_loop(func, *args):
+    """Call ``func``, in a worker thread when it may block on the shared cache tier."""
+    if usda_cache.tier2 is None:
+        return func(*args)
+    return await asyncio.to_thread(func, *args)
+
+async def _fetch_dish(dish_name: str, key: str, alias: bool = True) -> Optional[DishRecord]:
+    """Look ``dish_name`` up (alias index, local snapshot, then the API) and cache the result."""
+    if alias:
+        record = await _off_loop(_resolve_alias, key)
+        if record is not None:
+            usda_dish_lookups.inc("alias")
+            return record
+    local = await _off_loop(_resolve_local, dish_name, key)
+    if local is not None:
+        usda_dish_lookups.inc("local")
+        return local
+    usda_dish_lookups.inc("upstream")
+    try:
+        data = await search_usda(dish_name, pageSize=25)
+    except UpstreamUnavailable as e:
+        return await _off_loop(_resolve_search, dish_name, key, None, e)
+    return await _off_loop(_resolve_search, dish_name, key, data)
+
+async def _refresh(dish_name: str, key: str) -> None:
+    try:
+        await usda_flight.do(key, lambda: _fetch_dish(dish_name, key, alias=False))
+    except UpstreamUnavailable:
+        pass  # the stale entry stays; a later request tries again
+    except Exception:
+        # nothing awaits this task, so an error would otherwise go unreported
+        logger.exception("Background refresh of %r failed", dish_name)
+
+def _refresh_in_background(dish_name: str, key: str) -> None:
+    if key in usda_flight:
+        return
+    task = asyncio.get_running_loop().create_task(_refresh(dish_name, key))
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+
+async def refresh_dish(dish_name: str) -> Optional[DishRecord]:
+    """Look ``dish_name`` up upstream now and cache it, sharing any lookup already in flight."""
+    key = canonical_key(dish_name)
+    return await usda_flight.do(key, lambda: _fetch_dish(dish_name, key, alias=False))
+
+async def get_best_calorie_for_dish_async(dish_name: str) -> Optional[DishRecord]:
+    """Async variant of get_best_calorie_for_dish sharing the same cache.
+
+    Names are keyed by canonical_key, so word order, case, punctuation and
+    plurals do not matter. Concurrent misses for the same key are coalesced
+    into a single USDA search whose result every caller receives. A found
+    entry that expired less than USDA_STALE_WHILE_REVALIDATE_SECONDS ago is
+    returned immediately while a background task refreshes it.
+    """
+    key = canonical_key(dish_name)
+    _count_request(key, dish_name)
+    entry = await usda_cache.aget(key)
+    if entry is not MISSING:
+        age = time.time() - entry.fresh_until
+        if age < 0:
+            usda_dish_lookups.inc("cache")
+            return entry.value
+        if entry.value is not None and age < USDA_STALE_WHILE_REVALIDATE_SECONDS:
+            usda_dish_lookups.inc("cache")
+            _refresh_in_background(dish_name, key)
+            return entry.value
+    return await usda_flight.do(key, lambda: _fetch_dish(dish_name, key))
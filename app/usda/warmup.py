@@ -0,0 +1,196 @@
+"""Keep the most requested dishes in the dish cache.
+
+After a restart the dish cache is empty and every early request goes to
+USDA. The warm-up job, started from the FastAPI lifespan, looks up the
+most requested dishes before traffic needs them: the names in a seed file
+(one per line, ``#`` comments) on the first pass, then whatever is most
+looked up in this process (``dish_requests`` in service.py). Lookups run
+a few at a time, and every USDA_WARMUP_INTERVAL_SECONDS the job looks
+again at the same list and refreshes each found entry whose freshness runs
+out within USDA_WARMUP_REFRESH_AHEAD_SECONDS, so popular keys never go
+stale. Entries already fresh in the cache (e.g. in a shared tier that
+survived the restart) cost no upstream call.
+
+``/ready`` reports ready once USDA_WARMUP_READY_RATIO of the first pass
+is cached, or after USDA_WARMUP_READY_TIMEOUT_SECONDS whatever happened,
+and stays ready from then on.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+from ..utils.cache import MISSING, usda_cache
+from ..utils.metrics import registry
+from ..utils.resilience import UpstreamUnavailable
+from . import service
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+USDA_WARMUP_SEED_PATH = os.getenv("USDA_WARMUP_SEED_PATH", "./warmup_dishes.txt")
+USDA_WARMUP_TOP_N = int(os.getenv("USDA_WARMUP_TOP_N", "200"))  # 0 disables the job
+USDA_WARMUP_CONCURRENCY = int(os.getenv("USDA_WARMUP_CONCURRENCY", "4"))
+USDA_WARMUP_INTERVAL_SECONDS = float(os.getenv("USDA_WARMUP_INTERVAL_SECONDS", "30"))
+USDA_WARMUP_REFRESH_AHEAD_SECONDS = float(os.getenv("USDA_WARMUP_REFRESH_AHEAD_SECONDS", "60"))
+USDA_WARMUP_READY_RATIO = float(os.getenv("USDA_WARMUP_READY_RATIO", "0.9"))
+USDA_WARMUP_READY_TIMEOUT_SECONDS = float(os.getenv("USDA_WARMUP_READY_TIMEOUT_SECONDS", "120"))
+# Write the dishes being kept warm back to the seed file on shutdown
+USDA_WARMUP_SAVE_SEED = os.getenv("USDA_WARMUP_SAVE_SEED", "false").lower() == "true"
+
+
+def load_seed(path: str) -> List[str]:
+    """Dish names listed in ``path``; empty when the file does not exist."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            lines = [line.split("#", 1)[0].strip() for line in f]
+    except FileNotFoundError:
+        return []
+    return [line for line in lines if line]
+
+
+def save_seed(path: str, names: Iterable[str]) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("# most requested dishes, written on shutdown\n")
+        f.writelines(f"{name}\n" for name in names)
+    os.replace(tmp, path)
+
+
+class CacheWarmer:
+    """The warm-up and refresh loop, and the readiness it reports."""
+
+    def __init__(self, seed_path: str = USDA_WARMUP_SEED_PATH, top_n: int = USDA_WARMUP_TOP_N,
+                 concurrency: int = USDA_WARMUP_CONCURRENCY,
+                 interval: float = USDA_WARMUP_INTERVAL_SECONDS,
+                 refresh_ahead: float = USDA_WARMUP_REFRESH_AHEAD_SECONDS,
+                 ready_ratio: float = USDA_WARMUP_READY_RATIO,
+                 ready_timeout: float = USDA_WARMUP_READY_TIMEOUT_SECONDS):
+        self.seed_path = seed_path
+        self.top_n = top_n
+        self.concurrency = max(1, concurrency)
+        self.interval = interval
+        self.refresh_ahead = refresh_ahead
+        self.ready_ratio = ready_ratio
+        self.ready_timeout = ready_timeout
+        self.seed: List[str] = []
+        self.target = 0  # dishes in the first pass
+        self.warmed = 0  # of those, cached
+        self.refreshed = 0  # upstream lookups made by the job
+        self._ready = False
+        self._started_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        if not self._ready and self._started_at is not None:
+            if self.warmed >= self.target * self.ready_ratio or (
+                self.ready_timeout and time.monotonic() - self._started_at >= self.ready_timeout
+            ):
+                self._ready = True
+        return self._ready
+
+    def status(self) -> Dict[str, object]:
+        return {"ready": self.ready, "warmed": self.warmed, "target": self.target}
+
+    def targets(self) -> Dict[str, str]:
+        """Key -> dish name of the dishes to keep warm: most looked up first, then the seed."""
+        dishes = dict(service.top_dishes(self.top_n))
+        for name in self.seed:
+            if len(dishes) >= self.top_n:
+                break
+            dishes.setdefault(service.canonical_key(name), name)
+        return dishes
+
+    async def _needs_lookup(self, key: str) -> bool:
+        entry = await usda_cache.aget(key)
+        if entry is MISSING:
+            return True
+        left = entry.fresh_until - time.time()
+        # only found entries are refreshed early; a not-found is rechecked once it expires
+        return left <= (self.refresh_ahead if entry.value is not None else 0)
+
+    async def _warm(self, key: str, name: str, slots: asyncio.Semaphore) -> bool:
+        if await self._needs_lookup(key):
+            async with slots:
+                if await self._needs_lookup(key):  # a request may have filled it meanwhile
+                    self.refreshed += 1
+                    try:
+                        await service.refresh_dish(name)
+                    except UpstreamUnavailable as e:
+                        logger.debug("Warm-up lookup for %r skipped: %s", name, e)
+                    except Exception:
+                        logger.exception("Warm-up lookup failed for %r", name)
+        entry = await usda_cache.aget(key)
+        return entry is not MISSING and entry.fresh_until > time.time()
+
+    async def run_pass(self, targets: Optional[Dict[str, str]] = None, first: bool = False) -> int:
+        """Look up every target that is missing or about to go stale; returns how many are cached."""
+        slots = asyncio.Semaphore(self.concurrency)
+        if targets is None:
+            targets = self.targets()
+
+        async def warm(key: str, name: str) -> bool:
+            cached = await self._warm(key, name, slots)
+            if first and cached:
+                self.warmed += 1
+            return cached
+
+        results = await asyncio.gather(*(warm(k, n) for k, n in targets.items()))
+        return sum(results)
+
+    async def _run(self, first: Dict[str, str]) -> None:
+        started = time.monotonic()
+        cached = await self.run_pass(first, first=True)
+        logger.info("Dish cache warm-up: %d/%d cached in %.1fs", cached, self.target,
+                    time.monotonic() - started)
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_pass()
+            except Exception:
+                logger.exception("Dish cache refresh pass failed")
+
+    def start(self) -> None:
+        """Begin warming; call from a running event loop (the app lifespan)."""
+        self._started_at, self._ready = time.monotonic(), False
+        if self.top_n <= 0:
+            return
+        self.seed = load_seed(self.seed_path)
+        first = self.targets()
+        self.target, self.warmed = len(first), 0
+        self._task = asyncio.get_running_loop().create_task(self._run(first))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if USDA_WARMUP_SAVE_SEED and service.dish_requests:
+            try:
+                save_seed(self.seed_path, self.targets().values())
+            except OSError:
+                logger.warning("Could not write warm-up seed file %s", self.seed_path)
+
+
+cache_warmer = CacheWarmer()
+
+
+@registry.collector
+def _warmup_metrics():
+    yield "# HELP usda_warmup_dishes Dishes in the first warm-up pass, and how many are cached."
+    yield "# TYPE usda_warmup_dishes gauge"
+    yield f'usda_warmup_dishes{{state="target"}} {cache_warmer.target}'
+    yield f'usda_warmup_dishes{{state="warmed"}} {cache_warmer.warmed}'
+    yield "# HELP usda_warmup_lookups_total Upstream lookups made by the warm-up and refresh job."
+    yield "# TYPE usda_warmup_lookups_total counter"
+    yield f"usda_warmup_lookups_total {cache_warmer.refreshed}"
+    yield "# HELP app_ready 1 once the dish cache warm-up reached its threshold."
+    yield "# TYPE app_ready gauge"
+    yield f"app_ready {int(cache_warmer.ready)}"
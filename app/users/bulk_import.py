@@ -0,0 +1,213 @@
+"""Bulk user import from CSV or JSON Lines.
+
+Rows are read as a stream and handled in batches: validated with the
+register schema, de-duplicated, checked against existing emails, hashed in
+parallel on a process pool and written with one multi-row INSERT per batch.
+Emails that already exist are reported per row instead of failing the import.
+
+    python -m app.users.bulk_import employees.csv
+    python -m app.users.bulk_import employees.jsonl --batch-size 2000 --workers 8
+
+CSV input needs a header row with first_name, last_name, email and password;
+fields must not contain line breaks.
+"""
+import argparse
+import asyncio
+import codecs
+import csv
+import json
+import os
+import time
+from typing import AsyncIterator, Iterable, Optional
+
+from dotenv import load_dotenv
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+import schemas
+from app.db import crud
+from app.utils.security import PasswordHasher, get_password_hash
+
+load_dotenv()
+BULK_IMPORT_BATCH_SIZE = int(os.getenv("BULK_IMPORT_BATCH_SIZE", "1000"))
+BULK_IMPORT_HASH_WORKERS = int(os.getenv("BULK_IMPORT_HASH_WORKERS", "4"))
+BULK_IMPORT_HASH_EXECUTOR = os.getenv("BULK_IMPORT_HASH_EXECUTOR", "process").lower()  # thread | process
+
+FORMATS = ("csv", "jsonl")
+READ_CHUNK_BYTES = 64 * 1024
+
+
+async def iter_file_chunks(path: str) -> AsyncIterator[bytes]:
+    with open(path, "rb") as f:
+        while chunk := f.read(READ_CHUNK_BYTES):
+            yield chunk
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def iter_records(lines: AsyncIterator[str], fmt: str) -> AsyncIterator[tuple]:
+    """Yield (row number, record or None, parse error or None) per non-blank line."""
+    header = None
+    row = 0
+    async for line in lines:
+        if not line.strip():
+            continue
+        if fmt == "csv" and header is None:
+            header = next(csv.reader([line]))
+            continue
+        row += 1
+        try:
+            if fmt == "csv":
+                record = dict(zip(header, next(csv.reader([line]))))
+            else:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("expected a JSON object")
+        except ValueError as e:
+            yield row, None, str(e)
+            continue
+        yield row, record, None
+
+
+class BulkImport:
+    """Collects the outcome of one import while its batches are written."""
+
+    def __init__(self, db: AsyncSession, hasher: PasswordHasher):
+        self.db = db
+        self.hasher = hasher
+        self.created = 0
+        self.conflicts = []
+        self.errors = []
+        self.seen_emails = set()
+
+    def _conflict(self, row: int, email: str, reason: str) -> None:
+        self.conflicts.append({"row": row, "email": email, "error": reason})
+
+    async def add_batch(self, batch: list) -> None:
+        users = []
+        for row, record, error in batch:
+            if error is None:
+                try:
+                    user = schemas.RegisterRequest(**record)
+                except ValidationError as e:
+                    error = e.errors()[0]["msg"]
+            if error is not None:
+                self.errors.append({"row": row, "error": error})
+            elif user.email in self.seen_emails:
+                self._conflict(row, user.email, "Duplicate email in import")
+            else:
+                self.seen_emails.add(user.email)
+                users.append((row, user))
+        if not users:
+            return
+
+        # skip hashing for emails that are already registered
+        existing = set(await self.db.scalars(
+            select(models.User.email).where(models.User.email.in_([u.email for _, u in users]))
+        ))
+        for row, user in users:
+            if user.email in existing:
+                self._conflict(row, user.email, "Email already registered")
+        users = [(row, user) for row, user in users if user.email not in existing]
+        if not users:
+            return
+
+        hashes = await asyncio.gather(*(self.hasher.run(get_password_hash, u.password) for _, u in users))
+        values = [
+            {"first_name": u.first_name, "last_name": u.last_name, "email": u.email, "hashed_password": h}
+            for (_, u), h in zip(users, hashes)
+        ]
+        # ON CONFLICT covers rows registered since the existence check above
+        statement = crud.dialect_insert(self.db, models.User).values(values)
+        statement = statement.on_conflict_do_nothing(index_elements=["email"])
+        inserted = set(await self.db.scalars(statement.returning(models.User.email)))
+        await self.db.commit()
+        self.created += len(inserted)
+        for row, user in users:
+            if user.email not in inserted:
+                self._conflict(row, user.email, "Email already registered")
+
+    def report(self) -> dict:
+        conflicts = sorted(self.conflicts, key=lambda c: c["row"])
+        return {"created": self.created, "conflicts": conflicts, "errors": self.errors}
+
+
+async def import_users(db: AsyncSession, records: AsyncIterator[tuple], batch_size: int = BULK_IMPORT_BATCH_SIZE,
+                       hasher: Optional[PasswordHasher] = None) -> dict:
+    """Import users from `iter_records` output and return created/conflicts/errors."""
+    own_hasher = hasher is None
+    if own_hasher:
+        hasher = PasswordHasher(workers=BULK_IMPORT_HASH_WORKERS, max_pending=batch_size,
+                                kind=BULK_IMPORT_HASH_EXECUTOR)
+    job = BulkImport(db, hasher)
+    try:
+        batch = []
+        async for item in records:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                await job.add_batch(batch)
+                batch = []
+        await job.add_batch(batch)
+    finally:
+        if own_hasher:
+            hasher.shutdown()
+    return job.report()
+
+
+def format_for(path_or_type: str) -> str:
+    """Pick the input format from a file name or a Content-Type header."""
+    value = (path_or_type or "").lower()
+    if value.endswith((".jsonl", ".ndjson")) or "ndjson" in value or "jsonl" in value:
+        return "jsonl"
+    return "csv"
+
+
+async def _main(path: str, fmt: str, batch_size: int, workers: int) -> dict:
+    from app.db.init_db import AsyncSessionLocal, async_engine
+
+    hasher = PasswordHasher(workers=workers, max_pending=batch_size, kind=BULK_IMPORT_HASH_EXECUTOR)
+    try:
+        async with AsyncSessionLocal() as db:
+            records = iter_records(iter_lines(iter_file_chunks(path)), fmt)
+            return await import_users(db, records, batch_size=batch_size, hasher=hasher)
+    finally:
+        hasher.shutdown()
+        await async_engine.dispose()
+
+
+def _summary(report: dict, elapsed: float) -> Iterable[str]:
+    yield f"created {report['created']} users in {elapsed:.1f}s"
+    yield f"{len(report['conflicts'])} conflicts, {len(report['errors'])} invalid rows"
+    for item in report["conflicts"] + report["errors"]:
+        yield json.dumps(item)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import users from CSV or JSON Lines")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS)
+    parser.add_argument("--batch-size", type=int, default=BULK_IMPORT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=BULK_IMPORT_HASH_WORKERS)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    report = asyncio.run(_main(args.path, args.format or format_for(args.path), args.batch_size, args.workers))
+    for line in _summary(report, time.perf_counter() - started):
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,66 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
 from app.auth.errors import success_response
-from app.verify import get_current_user
+from app.verify import get_current_admin, get_current_user_id
 import app.db.crud as crud
-from app.db.init_db import get_db
+from app.users import bulk_import
+from app.db.init_db import get_async_db
 import schemas
 
 router = APIRouter()
 
 
 @router.get("/")
-def list_users(
+async def list_users(
     limit: int = Query(10, ge=1, le=100),
     offset: int = Query(0, ge=0),
     q: Optional[str] = Query(None),
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    after_id: Optional[int] = Query(None, ge=0),
+    count: Literal["none", "exact", "estimated"] = Query("none"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user_id: int = Depends(get_current_user_id)
 ):
-    items, total = crud.list_users(db, limit=limit, offset=offset, q=q)
+    items, next_cursor, total = await crud.list_users(
+        db, limit=limit, offset=offset, q=q, after_id=after_id, count=count
+    )
     resp = [schemas.OutUsers.from_orm(item) for item in items]
     return {
         "status_code":"GS20006",
             "data": 
                 {"result": resp,
-                 "detail": "Users list"
+                 "detail": "Users list",
+                 "next_cursor": next_cursor,
+                 "total": total,
                  }}
 
+@router.post("/import")
+async def import_users(
+    request: Request,
+    format: Optional[Literal["csv", "jsonl"]] = Query(None),
+    batch_size: int = Query(bulk_import.BULK_IMPORT_BATCH_SIZE, ge=1, le=5000),
+    db: AsyncSession = Depends(get_async_db),
+    admin=Depends(get_current_admin),
+):
+    """Create users from a CSV or JSON Lines request body, streamed in batches.
+
+    The format comes from `format` or the Content-Type (text/csv or
+    application/x-ndjson). Rows whose email is taken are listed under
+    `conflicts`, invalid rows under `errors`; the rest are still created.
+    """
+    fmt = format or bulk_import.format_for(request.headers.get("content-type"))
+    records = bulk_import.iter_records(bulk_import.iter_lines(request.stream()), fmt)
+    report = await bulk_import.import_users(db, records, batch_size=batch_size)
+    return success_response(
+            status_code="GS20102",
+            data=report,
+            http_status_code=200,
+        )
+
+
 @router.get("/{user_id}")
-def get_user(user_id: int, db: Session = Depends(get_db), current=Depends(get_current_user)):
-    u = crud.get_user(db, user_id)
+async def get_user(user_id: int, db: AsyncSession = Depends(get_async_db), current_user_id: int = Depends(get_current_user_id)):
+    u = await crud.get_user(db, user_id)
     if not u:
         raise HTTPException(
             status_code=404, 
@@ -48,8 +79,8 @@ def get_user(user_id: int, db: Session = Depends(get_db), current=Depends(get_cu
 
 
 @router.patch("/{user_id}")
-def patch_user(user_id: int, patch: schemas.UserUpdate, db: Session = Depends(get_db), current=Depends(get_current_user)):
-    u = crud.update_user(db, user_id, patch)
+async def patch_user(user_id: int, patch: schemas.UserUpdate, db: AsyncSession = Depends(get_async_db), current_user_id: int = Depends(get_current_user_id)):
+    u = await crud.update_user(db, user_id, patch)
     if not u:
         raise HTTPException(status_code=404, detail={
                     "status": "GE40403",
@@ -63,8 +94,8 @@ def patch_user(user_id: int, patch: schemas.UserUpdate, db: Session = Depends(ge
 
 
 @router.delete("/{user_id}")
-def delete_user(user_id: int, db: Session = Depends(get_db), current=Depends(get_current_user)):
-    resp = crud.delete_user(db, user_id)
+async def delete_user(user_id: int, db: AsyncSession = Depends(get_async_db), current_user_id: int = Depends(get_current_user_id)):
+    resp = await crud.delete_user(db, user_id)
     if not resp:
         raise HTTPException(status_code=404, detail={
                     "status": "GE40404",
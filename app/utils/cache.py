@@ -1,16 +1,411 @@
-from cachetools import TTLCache, cached
-from typing import Callable
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
 from functools import wraps
+from typing import Any, Callable, Dict, Hashable, Optional
 
-# cache: key -> value, TTL 600 seconds, maxsize 1024
-usda_cache = TTLCache(maxsize=1024, ttl=600)
+from dotenv import load_dotenv
+
+try:
+    import redis
+except ImportError:  # optional: only needed for CACHE_BACKEND=redis
+    redis = None
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+CACHE_MAXSIZE = int(os.getenv("CACHE_MAXSIZE", "10240"))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "600"))
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", "./usda_cache.sqlite3")
+CACHE_SQLITE_MAXSIZE = int(os.getenv("CACHE_SQLITE_MAXSIZE", "100000"))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+# Connect/read timeout for Redis calls, so an unreachable server fails fast
+CACHE_REDIS_TIMEOUT_SECONDS = float(os.getenv("CACHE_REDIS_TIMEOUT_SECONDS", "0.5"))
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "usda:")
+
+# Sentinel for "not cached"; None is a legitimate cached value (negative result)
+MISSING = object()
+
+# Payloads above this size are zlib-compressed before hitting the shared tier
+_COMPRESS_THRESHOLD = 256
+_RAW, _ZLIB = b"j", b"z"
+
+
+def dumps(value: Any) -> bytes:
+    """Serialize a cache entry as compact JSON, compressing large payloads."""
+    data = json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    if len(data) > _COMPRESS_THRESHOLD:
+        return _ZLIB + zlib.compress(data)
+    return _RAW + data
+
+
+def loads(blob: bytes) -> Any:
+    """Inverse of dumps."""
+    if blob[:1] == _ZLIB:
+        return json.loads(zlib.decompress(blob[1:]))
+    return json.loads(blob[1:])
+
+
+class CacheStats:
+    """Per-tier hit/miss/eviction counters, and failed calls to the tier."""
+
+    __slots__ = ("hits", "misses", "evictions", "expirations", "sets", "errors")
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.sets = 0
+        self.errors = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def reset(self) -> None:
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+
+class CacheBackend(ABC):
+    """Interface every cache tier implements."""
+
+    name = "backend"
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    @abstractmethod
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        ...
+
+    @abstractmethod
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: Hashable) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+
+class LRUCache(CacheBackend):
+    """Tier 1: bounded in-process LRU with per-entry expiry.
+
+    Values are stored as Python objects, so a hit costs a dict lookup and no
+    deserialization.
+    """
+
+    name = "lru"
+
+    def __init__(self, maxsize: int = CACHE_MAXSIZE, ttl: Optional[float] = CACHE_TTL_SECONDS):
+        super().__init__()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.stats.misses += 1
+                return default
+            expires_at, value = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.stats.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            self.stats.sets += 1
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.stats.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteCache(CacheBackend):
+    """Tier 2: SQLite-backed store shared by every worker on the host.
+
+    Survives restarts; the WAL journal lets several uvicorn workers read
+    while one writes. Size is bounded by pruning the entries closest to
+    expiry once ``maxsize`` is exceeded.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = CACHE_SQLITE_PATH, maxsize: int = CACHE_SQLITE_MAXSIZE,
+                 ttl: Optional[float] = CACHE_TTL_SECONDS):
+        super().__init__()
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_expires_at ON cache (expires_at)")
+        self._writes_since_prune = 0
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (str(key),)
+            ).fetchone()
+        if row is None:
+            self.stats.misses += 1
+            return default
+        blob, expires_at = row
+        if expires_at is not None and expires_at <= time.time():
+            self.delete(key)
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            return default
+        self.stats.hits += 1
+        return loads(blob)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (str(key), dumps(value), expires_at),
+            )
+            self.stats.sets += 1
+            self._writes_since_prune += 1
+            if self._writes_since_prune >= max(1, self.maxsize // 100):
+                self._writes_since_prune = 0
+                self._prune()
+
+    def _prune(self) -> None:
+        now = time.time()
+        expired = self._conn.execute(
+            "DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+        ).rowcount
+        self.stats.expirations += max(expired, 0)
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        overflow = count - self.maxsize
+        if overflow > 0:
+            # entries that never expire (NULL) go last; SQLite sorts NULL first
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                " SELECT key FROM cache ORDER BY expires_at IS NULL, expires_at LIMIT ?)",
+                (overflow,),
+            )
+            self.stats.evictions += overflow
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (str(key),))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class RedisCache(CacheBackend):
+    """Tier 2: Redis store shared by every worker and host.
+
+    Expiry and eviction are delegated to Redis; ``evictions`` reports the
+    server-side ``evicted_keys`` counter.
+    """
+
+    name = "redis"
+
+    def __init__(self, client=None, url: str = CACHE_REDIS_URL, prefix: str = CACHE_KEY_PREFIX,
+                 ttl: Optional[float] = CACHE_TTL_SECONDS, timeout: float = CACHE_REDIS_TIMEOUT_SECONDS):
+        super().__init__()
+        if client is None:
+            if redis is None:
+                raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package")
+            client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def _key(self, key) -> str:
+        return f"{self.prefix}{key}"
+
+    def get(self, key, default=MISSING):
+        blob = self.client.get(self._key(key))
+        if blob is None:
+            self.stats.misses += 1
+            return default
+        self.stats.hits += 1
+        return loads(blob)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        px = int(ttl * 1000) if ttl is not None else None
+        self.client.set(self._key(key), dumps(value), px=px)
+        self.stats.sets += 1
+
+    def delete(self, key):
+        self.client.delete(self._key(key))
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=f"{self.prefix}*", count=500))
+        if keys:
+            self.client.delete(*keys)
+
+    def server_evictions(self) -> int:
+        try:
+            return int(self.client.info("stats").get("evicted_keys", 0))
+        except Exception:
+            return 0
+
+
+class TieredCache:
+    """Two-tier cache: an in-process LRU in front of an optional shared store.
+
+    Reads try tier 1, then tier 2 (promoting hits into tier 1); writes go to
+    both. Also supports the mapping operations the old ``TTLCache`` was used
+    with (``in``, ``[]``, ``clear``).
+
+    Tier 2 round-trips values through JSON; ``decode`` rebuilds the caller's
+    types (e.g. NamedTuples, which JSON turns into arrays) on tier-2 hits.
+
+    A failing tier 2 (e.g. Redis down) never fails the caller: the error is
+    logged and counted in the tier's ``errors`` stat, reads fall back to a
+    miss and writes land in tier 1 only. ``aget``/``aset`` are for the event
+    loop: tier-2 calls, which block on network or disk, run in a worker thread.
+    """
+
+    def __init__(self, tier1: LRUCache, tier2: Optional[CacheBackend] = None,
+                 decode: Optional[Callable[[Any], Any]] = None):
+        self.tier1 = tier1
+        self.tier2 = tier2
+        self.decode = decode
+
+    def _tier2_call(self, op: str, *args) -> Any:
+        try:
+            return getattr(self.tier2, op)(*args)
+        except Exception as e:
+            self.tier2.stats.errors += 1
+            logger.warning("Cache tier 2 (%s) %s failed: %s", self.tier2.name, op, e)
+            return MISSING
+
+    def _tier2_get(self, key: Hashable) -> Any:
+        value = self._tier2_call("get", key, MISSING)
+        if value is MISSING:
+            return MISSING
+        if self.decode is not None:
+            value = self.decode(value)
+        self.tier1.set(key, value)
+        return value
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        value = self.tier1.get(key, MISSING)
+        if value is MISSING and self.tier2 is not None:
+            value = self._tier2_get(key)
+        return default if value is MISSING else value
+
+    async def aget(self, key: Hashable, default: Any = MISSING) -> Any:
+        value = self.tier1.get(key, MISSING)
+        if value is MISSING and self.tier2 is not None:
+            value = await asyncio.to_thread(self._tier2_get, key)
+        return default if value is MISSING else value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self.tier1.set(key, value, ttl)
+        if self.tier2 is not None:
+            self._tier2_call("set", key, value, ttl)
+
+    async def aset(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self.tier1.set(key, value, ttl)
+        if self.tier2 is not None:
+            await asyncio.to_thread(self._tier2_call, "set", key, value, ttl)
+
+    def delete(self, key: Hashable) -> None:
+        self.tier1.delete(key)
+        if self.tier2 is not None:
+            self._tier2_call("delete", key)
+
+    def clear(self) -> None:
+        self.tier1.clear()
+        if self.tier2 is not None:
+            self._tier2_call("clear")
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not MISSING
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value = self.get(key)
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        self.set(key, value)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        out = {"tier1": self.tier1.stats.as_dict()}
+        if self.tier2 is not None:
+            out["tier2"] = self.tier2.stats.as_dict()
+            if isinstance(self.tier2, RedisCache):
+                out["tier2"]["evictions"] = self.tier2.server_evictions()
+        return out
+
+
+def build_usda_cache() -> TieredCache:
+    """Build the dish cache from the CACHE_* environment settings."""
+    tier1 = LRUCache(maxsize=CACHE_MAXSIZE, ttl=CACHE_TTL_SECONDS)
+    if CACHE_BACKEND == "sqlite":
+        return TieredCache(tier1, SQLiteCache(CACHE_SQLITE_PATH, CACHE_SQLITE_MAXSIZE, CACHE_TTL_SECONDS))
+    if CACHE_BACKEND == "redis":
+        return TieredCache(tier1, RedisCache(url=CACHE_REDIS_URL, prefix=CACHE_KEY_PREFIX, ttl=CACHE_TTL_SECONDS,
+                                             timeout=CACHE_REDIS_TIMEOUT_SECONDS))
+    return TieredCache(tier1)
+
+
+# cache: dish key -> USDA result; tier 1 in-process, tier 2 per CACHE_BACKEND
+usda_cache = build_usda_cache()
 
 def cache_usda(func: Callable):
     @wraps(func)
     def wrapper(*args, **kwargs):
-        key = (args, frozenset(kwargs.items()))
-        if key in usda_cache:
-            return usda_cache[key]
+        key = f"{func.__qualname__}:{args!r}:{sorted(kwargs.items())!r}"
+        value = usda_cache.get(key)
+        if value is not MISSING:
+            return value
         value = func(*args, **kwargs)
         usda_cache[key] = value
         return value
@@ -0,0 +1,183 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Recording never takes a lock: each thread writes to its own shard (a
+dict of label values -> numbers), and a scrape sums the shards. A lock is
+only taken the first time a thread touches a metric, to register its shard.
+Values are per process; with several uvicorn workers each one reports its
+own, so scrape them individually or aggregate in Prometheus.
+"""
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Prometheus client defaults, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = {}
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            return shard
+
+    def _merged(self) -> Dict[tuple, list]:
+        merged: Dict[tuple, list] = {}
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for labels, values in list(shard.items()):
+                total = merged.get(labels)
+                if total is None:
+                    merged[labels] = list(values)
+                else:
+                    for i, v in enumerate(values):
+                        total[i] += v
+        return merged
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        shard = self._shard()
+        values = shard.get(labels)
+        if values is None:
+            shard[labels] = [amount]
+        else:
+            values[0] += amount
+
+    def value(self, *labels) -> float:
+        return self._merged().get(labels, [0])[0]
+
+    def samples(self) -> Iterable[str]:
+        for labels, (value,) in sorted(self._merged().items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels) -> None:
+        # per label set: one count per bucket (not cumulative), +Inf, then sum
+        shard = self._shard()
+        values = shard.get(labels)
+        if values is None:
+            values = shard[labels] = [0] * (len(self.buckets) + 2)
+        values[bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    def count(self, *labels) -> int:
+        values = self._merged().get(labels)
+        return int(sum(values[:-1])) if values else 0
+
+    def samples(self) -> Iterable[str]:
+        for labels, values in sorted(self._merged().items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), values):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(values[-1])}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[str]]] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn: Callable[[], Iterable[str]]) -> Callable[[], Iterable[str]]:
+        """Register a function yielding ready-made exposition lines at scrape time."""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        parts = [m.render() for m in self._metrics]
+        for collect in self._collectors:
+            parts.append("\n".join(collect()))
+        return "\n".join(p for p in parts if p) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route", "status"))
+usda_request_duration = registry.histogram(
+    "usda_request_duration_seconds", "USDA FoodData Central search latency.", ("client",))
+usda_request_errors = registry.counter(
+    "usda_request_errors_total", "USDA FoodData Central searches that failed.", ("client",))
+usda_dish_lookups = registry.counter(
+    "usda_dish_lookups_total", "Dish lookups by where the answer came from.", ("source",))
+usda_retries = registry.counter(
+    "usda_retries_total", "USDA searches retried after a 5xx, 429 or timeout.", ("client",))
+usda_hedged_requests = registry.counter(
+    "usda_hedged_requests_total", "Second USDA searches sent because the first was slow.")
+usda_circuit_rejections = registry.counter(
+    "usda_circuit_rejections_total", "USDA searches not sent because the circuit was open.")
+db_pool_checkout_wait = registry.histogram(
+    "db_pool_checkout_wait_seconds", "Time spent getting a connection from the pool.", ("pool",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+password_hash_duration = registry.histogram(
+    "password_hash_duration_seconds", "argon2 time per operation, measured in the worker.", ("operation",))
+password_hash_wait = registry.histogram(
+    "password_hash_queue_wait_seconds", "Time password hashing jobs wait for a free worker.", ("operation",))
+rate_limit_rejections = registry.counter(
+    "rate_limit_rejections_total", "Requests rejected with 429 by scope.", ("scope",))
@@ -1,30 +1,235 @@
-import time
-from starlette.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+"""Rate limiting with GCRA (the generic cell rate algorithm).
+
+Each client key stores a single number, its theoretical arrival time (TAT),
+so memory is O(1) per key and a key whose TAT has passed holds a full
+bucket and can be dropped. ``limit`` requests per ``period`` are allowed,
+all of them in one burst if the bucket is full.
+
+The in-memory backend is per process; set RATE_LIMIT_BACKEND=redis to share
+limits between workers and hosts. Routes use a ``RateLimit`` dependency and
+``RateLimitHeadersMiddleware`` adds the RateLimit-* headers to responses.
+"""
+import math
 import os
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
 from dotenv import load_dotenv
+from fastapi import HTTPException, Request
+
+from app.utils.metrics import rate_limit_rejections
+from app.utils.security import decode_access_token
+
+try:
+    from redis import asyncio as redis_asyncio
+except ImportError:  # optional: only needed for RATE_LIMIT_BACKEND=redis
+    redis_asyncio = None
 
 load_dotenv()
 RATE_LIMIT_REQUESTS = int(os.getenv("RATE_LIMIT_REQUESTS", "15"))
 RATE_LIMIT_PERIOD_SECONDS = int(os.getenv("RATE_LIMIT_PERIOD_SECONDS", "60"))
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()  # memory | redis
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0"))
+RATE_LIMIT_KEY_PREFIX = os.getenv("RATE_LIMIT_KEY_PREFIX", "ratelimit:")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+RATE_LIMITED = {"status": "GE42901", "error": "Too many requests. Please try again later."}
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float  # seconds until the bucket is full again
+    retry_after: float  # seconds until this request would be allowed; 0 when allowed
+
+
+def _result(allowed: bool, limit: int, period: float, fill: float, retry_after: float) -> RateLimitResult:
+    # fill = TAT - now: how far the bucket is from full, in seconds
+    interval = period / limit
+    remaining = max(0, min(limit, math.floor((period - fill) / interval + 1e-9)))
+    return RateLimitResult(allowed, limit, remaining, max(0.0, fill), max(0.0, retry_after))
+
+
+class MemoryRateLimitBackend:
+    """Per-process GCRA state: key -> TAT, ordered by last use.
+
+    Only touched from the event loop, so it needs no lock. Each hit drops a
+    couple of idle keys from the cold end, and RATE_LIMIT_MAX_KEYS caps the
+    total should a flood of distinct keys arrive faster than they go idle.
+    """
+
+    EVICT_PER_HIT = 2
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._tats: "OrderedDict[str, float]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._tats)
+
+    def _evict(self, now: float) -> None:
+        for _ in range(self.EVICT_PER_HIT):
+            if not self._tats:
+                return
+            key, tat = next(iter(self._tats.items()))
+            if tat > now:
+                break
+            del self._tats[key]
+        while len(self._tats) >= self.max_keys:  # leave room for the key being hit
+            self._tats.popitem(last=False)
+
+    async def hit(self, key: str, limit: int, period: float, cost: int = 1) -> RateLimitResult:
+        now = self.clock()
+        self._evict(now)
+        interval = period / limit
+        tat = max(self._tats.get(key, now), now)
+        new_tat = tat + interval * cost
+        allow_at = new_tat - period
+        if allow_at > now:
+            return _result(False, limit, period, tat - now, allow_at - now)
+        self._tats[key] = new_tat
+        self._tats.move_to_end(key)
+        return _result(True, limit, period, new_tat - now, 0)
+
+    async def reset(self) -> None:
+        self._tats.clear()
+
+    async def close(self) -> None:
+        pass
+
+
+# Same algorithm as MemoryRateLimitBackend.hit, atomic in Redis and timed by
+# the Redis clock so workers on different hosts agree. Keys expire once full.
+GCRA_SCRIPT = """
+local interval = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = t[1] * 1000 + math.floor(t[2] / 1000)
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+local new_tat = tat + interval * cost
+local allow_at = new_tat - period
+if allow_at > now then
+  return {0, tostring(tat - now), tostring(allow_at - now)}
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.max(1, math.ceil(new_tat - now)))
+return {1, tostring(new_tat - now), '0'}
+"""
+
+
+class RedisRateLimitBackend:
+    """GCRA state in Redis, shared by every worker; expiry evicts idle keys."""
+
+    def __init__(self, client=None, url: str = RATE_LIMIT_REDIS_URL, prefix: str = RATE_LIMIT_KEY_PREFIX):
+        if client is None:
+            if redis_asyncio is None:
+                raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package")
+            client = redis_asyncio.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(GCRA_SCRIPT)
+
+    async def hit(self, key: str, limit: int, period: float, cost: int = 1) -> RateLimitResult:
+        period_ms = period * 1000
+        allowed, fill, retry = await self._script(
+            keys=[f"{self.prefix}{key}"], args=[period_ms / limit, period_ms, cost]
+        )
+        return _result(bool(int(allowed)), limit, period, float(fill) / 1000, float(retry) / 1000)
+
+    async def reset(self) -> None:
+        keys = [k async for k in self.client.scan_iter(match=f"{self.prefix}*", count=500)]
+        if keys:
+            await self.client.delete(*keys)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+def build_backend():
+    if RATE_LIMIT_BACKEND == "redis":
+        return RedisRateLimitBackend()
+    return MemoryRateLimitBackend()
+
+
+backend = build_backend()
+
+
+def client_key(request: Request) -> str:
+    """The signed-in user's id from a valid bearer token, else the client IP.
+
+    Reads the token claims directly so it costs no database query and also
+    limits requests that fail authentication later.
+    """
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        payload = decode_access_token(token)
+        if payload and payload.get("sub"):
+            return f"user:{payload['sub']}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+class RateLimit:
+    """FastAPI dependency charging requests against one limit, keyed per client.
+
+    Routes sharing a ``scope`` share one budget. Use it in ``dependencies=``
+    for a flat cost of one, or call ``hit`` with a computed cost.
+    """
+
+    def __init__(self, scope: str, limit: int = RATE_LIMIT_REQUESTS, period: float = RATE_LIMIT_PERIOD_SECONDS):
+        self.scope = scope
+        self.limit = limit
+        self.period = period
+
+    async def __call__(self, request: Request) -> RateLimitResult:
+        return await self.hit(request)
+
+    async def hit(self, request: Request, cost: int = 1) -> RateLimitResult:
+        # a request dearer than the whole bucket drains it rather than never fitting
+        cost = max(1, min(cost, self.limit))
+        result = await backend.hit(f"{self.scope}:{client_key(request)}", self.limit, self.period, cost)
+        request.state.rate_limit = (result, self.period)
+        if not result.allowed:
+            rate_limit_rejections.inc(self.scope)
+            raise HTTPException(
+                status_code=429,
+                detail=RATE_LIMITED,
+                headers={"Retry-After": str(math.ceil(result.retry_after))},
+            )
+        return result
+
+
+def rate_limit_headers(result: RateLimitResult, period: float) -> list:
+    return [
+        (b"ratelimit-limit", str(result.limit).encode()),
+        (b"ratelimit-remaining", str(result.remaining).encode()),
+        (b"ratelimit-reset", str(math.ceil(result.reset_after)).encode()),
+        (b"ratelimit-policy", f"{result.limit};w={int(period)}".encode()),
+    ]
+
+
+class RateLimitHeadersMiddleware:
+    """Adds RateLimit-* headers for whatever limit the route's dependency applied.
+
+    Plain ASGI rather than BaseHTTPMiddleware: it only rewrites the
+    response start message and never buffers or re-wraps the body.
+    """
 
-class SimpleRateLimiterMiddleware(BaseHTTPMiddleware):
     def __init__(self, app):
-        super().__init__(app)
-        self.store = {}  # ip -> [timestamps]
-
-    async def dispatch(self, request, call_next):
-        ip = request.client.host if request.client else "unknown"
-        now = time.time()
-        window = RATE_LIMIT_PERIOD_SECONDS
-        allowed = RATE_LIMIT_REQUESTS
-
-        timestamps = self.store.get(ip, [])
-        # drop expired
-        timestamps = [t for t in timestamps if now - t < window]
-        if len(timestamps) >= allowed:
-            return JSONResponse({"detail": "Too many requests, slow down."}, status_code=429)
-        timestamps.append(now)
-        self.store[ip] = timestamps
-        response = await call_next(request)
-        return response
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                applied = scope.get("state", {}).get("rate_limit")
+                if applied is not None:
+                    message = {**message, "headers": [*message.get("headers", []), *rate_limit_headers(*applied)]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
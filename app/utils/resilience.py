@@ -0,0 +1,151 @@
+"""Building blocks for calling a flaky upstream: fail fast, retry within a budget, hedge.
+
+- CircuitBreaker: after ``failure_threshold`` consecutive failures the
+  upstream is not called for ``reset_timeout`` seconds; then one probe is
+  let through, and its outcome closes or re-opens the circuit.
+- RetryBudget: retries (and hedged requests) may add at most ``ratio`` extra
+  load on top of first attempts, plus a small floor per second, so retries
+  cannot multiply traffic to an upstream that is already struggling.
+- LatencyWindow: recent successful latencies, for a percentile-based hedge delay.
+- backoff: "full jitter" exponential backoff.
+
+The classes are thread-safe, so the sync and async USDA clients share one
+view of upstream health.
+"""
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class UpstreamUnavailable(Exception):
+    """The upstream failed, timed out or is being skipped by an open circuit."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_started: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return CLOSED
+        if self._clock() - self._opened_at < self.reset_timeout:
+            return OPEN
+        return HALF_OPEN
+
+    def retry_after(self) -> float:
+        """Seconds until the circuit lets a probe through (0 when it is not open)."""
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            return max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now; in half-open only one probe at a time."""
+        with self._lock:
+            state = self._state()
+            if state == CLOSED:
+                return True
+            # a probe that never reported back (e.g. cancelled) is replaced after reset_timeout
+            now = self._clock()
+            if state == HALF_OPEN and (self._probe_started is None
+                                       or now - self._probe_started >= self.reset_timeout):
+                self._probe_started = now
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_started = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probe_started is not None or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+            self._probe_started = None
+
+
+class RetryBudget:
+    """Token bucket: each first attempt deposits ``ratio``, each retry withdraws one."""
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 1.0, max_tokens: float = 10.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = min(max_tokens, min_per_second)
+        self._updated = clock()
+
+    def _refill(self, amount: float) -> None:
+        now = self._clock()
+        amount += (now - self._updated) * self.min_per_second
+        self._updated = now
+        self._tokens = min(self.max_tokens, self._tokens + amount)
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._refill(self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            self._refill(0.0)
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+
+class LatencyWindow:
+    """The last ``size`` latencies; percentiles are recomputed every ``size // 8`` samples."""
+
+    def __init__(self, size: int = 256, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+        self._every = max(1, size // 8)
+        self._since = 0
+        self._sorted: list = []
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self._since += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        """The ``q`` quantile (0..1), or None before ``min_samples`` latencies are seen."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            if self._since >= self._every or not self._sorted:
+                self._sorted = sorted(self._samples)
+                self._since = 0
+            return self._sorted[min(len(self._sorted) - 1, int(q * len(self._sorted)))]
+
+
+def backoff(attempt: int, base: float, cap: float, rng: random.Random = random) -> float:
+    """Delay before retry ``attempt`` (1 = first retry): uniform in [0, min(cap, base * 2**(attempt-1))]."""
+    return rng.uniform(0, min(cap, base * 2 ** (attempt - 1)))
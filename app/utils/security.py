@@ -1,11 +1,36 @@
 from passlib.context import CryptContext
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
+from typing import Callable, Optional, TypeVar
+import asyncio
 import os
+import time
 import jwt
 from dotenv import load_dotenv
+from fastapi import HTTPException
+
+from app.utils.metrics import password_hash_duration, password_hash_wait
 
 load_dotenv()
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+
+# argon2 cost parameters (passlib defaults); raising them makes every login slower
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "65536"))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "4"))
+
+# Dedicated pool for password hashing so login bursts cannot starve the
+# default threadpool; requests beyond the queue limit fail fast with 503
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread").lower()  # thread | process
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+pwd_context = CryptContext(
+    schemes=["argon2"],
+    deprecated="auto",
+    argon2__rounds=ARGON2_TIME_COST,
+    argon2__memory_cost=ARGON2_MEMORY_COST,
+    argon2__parallelism=ARGON2_PARALLELISM,
+)
 
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "change-me")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
@@ -18,6 +43,79 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+T = TypeVar("T")
+
+
+def _timed_call(fn: Callable[..., T], *args):
+    # runs in the worker (module level so the process pool can pickle it)
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+class PasswordHasher:
+    """Runs argon2 hashing on a bounded pool of its own.
+
+    argon2-cffi releases the GIL, so the thread pool hashes in parallel;
+    the process pool trades start-up and pickling cost for full isolation.
+    ``pending`` counts queued plus running jobs and is only touched from
+    the event loop, so it needs no lock.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_MAX_PENDING,
+                 kind: str = PASSWORD_HASH_EXECUTOR):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.kind = kind
+        self.pending = 0
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="argon2")
+        return self._executor
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        if self.pending >= self.max_pending:
+            raise HTTPException(
+                status_code=503,
+                detail={"status": "GE50301", "error": "Server busy, please retry"},
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        operation = getattr(fn, "__name__", "call")
+        start = time.perf_counter()
+        try:
+            result, elapsed = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), _timed_call, fn, *args
+            )
+        finally:
+            self.pending -= 1
+        password_hash_duration.observe(elapsed, operation)
+        # whatever the worker did not spend hashing was spent queued or handing off
+        password_hash_wait.observe(max(0.0, time.perf_counter() - start - elapsed), operation)
+        return result
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await password_hasher.run(get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.run(verify_password, plain_password, hashed_password)
+
+
 def create_access_token(subject: str, expires_delta: timedelta = None) -> str:
     if expires_delta is None:
         expires_delta = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -0,0 +1,75 @@
+"""Bytes per cached dish: full ``raw`` FDC record vs the slim DishRecord.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_cache_memory --dishes 2000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from app.usda.nutrients import parse_nutrients
+from app.usda.records import DishEntry, DishRecord
+from app.usda.service import extract_calories_from_food
+from app.utils.cache import LRUCache, dumps
+from benchmarks.fdc_fixtures import make_search_page
+
+
+def legacy_entry(food):
+    # shape of the cache value before the slim projection
+    return {
+        "value": {
+            "fdcId": food.get("fdcId"),
+            "description": food.get("description"),
+            "dataType": food.get("dataType"),
+            "brandOwner": food.get("brandOwner"),
+            "calories_per_unit": extract_calories_from_food(food),
+            "raw": food,
+        },
+        "fresh_until": time.time(),
+    }
+
+
+def slim_entry(food):
+    return DishEntry(DishRecord.from_food(food, parse_nutrients(food)), time.time())
+
+
+def measure(build, dishes, nutrients):
+    """Fill an LRU with ``dishes`` entries; return (heap bytes/dish, tier-2 bytes/dish).
+
+    The search page is generated inside the traced window and then dropped,
+    so whatever the entries keep alive (e.g. the whole ``raw`` dict) counts.
+    """
+    gc.collect()
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    foods = make_search_page(dishes, seed=1, n_nutrients=nutrients)["foods"]
+    cache = LRUCache(maxsize=dishes, ttl=600)
+    for i, food in enumerate(foods):
+        cache.set(f"dish-{i}", build(food))
+    del foods
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    wire = len(dumps(cache.get("dish-0")))
+    return (retained - base) / dishes, wire
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dish cache memory per entry")
+    parser.add_argument("--dishes", type=int, default=2000)
+    parser.add_argument("--nutrients", type=int, default=40)
+    args = parser.parse_args()
+
+    raw_bytes, raw_wire = measure(legacy_entry, args.dishes, args.nutrients)
+    slim_bytes, slim_wire = measure(slim_entry, args.dishes, args.nutrients)
+    print(f"dishes={args.dishes} nutrients/food={args.nutrients}")
+    print(f"{'entry':<6} {'heap bytes/dish':>16} {'tier-2 bytes/dish':>18}")
+    print(f"{'raw':<6} {raw_bytes:>16,.0f} {raw_wire:>18,}")
+    print(f"{'slim':<6} {slim_bytes:>16,.0f} {slim_wire:>18,}")
+    print(f"reduction: {raw_bytes / slim_bytes:.1f}x heap, {raw_wire / slim_wire:.1f}x serialized")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Candidate scoring: per-field Python loop vs one batched rapidfuzz call.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_fuzzy --pages 25 200 --repeat 200
+"""
+import argparse
+import timeit
+
+from rapidfuzz import fuzz
+
+from app.usda.service import fuzzy_select_best
+from benchmarks.fdc_fixtures import make_search_page
+
+QUERIES = ("chicken biryani", "grilled salmon", "paneer butter masala", "orange juice")
+
+
+def legacy_fuzzy_select_best(query, foods):
+    # the implementation before batching, kept for comparison
+    best = None
+    best_score = -1
+    for f in foods:
+        candidates = []
+        for field in ("description", "lowercaseDescription", "dataType", "foodCategory", "brandOwner"):
+            v = f.get(field) or ""
+            if v:
+                candidates.append(v)
+        scores = [fuzz.token_set_ratio(query, c) for c in candidates] if candidates else [0]
+        score = max(scores)
+        if score > best_score:
+            best_score = score
+            best = f
+    if best_score < 40:
+        return None
+    return best
+
+
+def bench(fn, foods, repeat):
+    def run():
+        for q in QUERIES:
+            fn(q, foods)
+    seconds = min(timeit.repeat(run, number=repeat, repeat=5))
+    return seconds / (repeat * len(QUERIES)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="fuzzy_select_best micro-benchmark")
+    parser.add_argument("--pages", type=int, nargs="+", default=[25, 200])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'foods':>6} {'loop us/call':>14} {'batched us/call':>16} {'speedup':>8}")
+    for size in args.pages:
+        foods = make_search_page(size, seed=size)["foods"]
+        loop = bench(legacy_fuzzy_select_best, foods, args.repeat)
+        batched = bench(fuzzy_select_best, foods, args.repeat)
+        print(f"{size:>6} {loop:>14.1f} {batched:>16.1f} {loop / batched:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
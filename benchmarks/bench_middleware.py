@@ -0,0 +1,120 @@
+"""Per-request cost of the request-logging middleware stack.
+
+Calls a one-route FastAPI app directly over ASGI (no sockets) with no
+logging middleware, with the two BaseHTTPMiddleware loggers this replaced,
+and with AccessLogMiddleware. All variants log through the same queue to
+/dev/null, so the numbers compare middleware overhead, not terminal I/O.
+
+    python -m benchmarks.bench_middleware --requests 20000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.logging_middleware import AccessLogMiddleware
+
+logger = logging.getLogger("bench")
+
+
+class LegacyLoggingMiddleware(BaseHTTPMiddleware):
+    # the old app/logging_middleware.LoggingMiddleware, kept for comparison
+    async def dispatch(self, request, call_next):
+        start = time.time()
+        try:
+            body = await request.json()
+        except Exception:
+            body = None
+        logger.info(f"Incoming {request.method} {request.url.path} body={json.dumps(body) if body else None}")
+        response = await call_next(request)
+        duration = (time.time() - start) * 1000
+        logger.info(f"Response {request.method} {request.url.path} status_code={response.status_code} duration_ms={duration:.2f}")
+        return response
+
+
+async def legacy_log_requests(request: Request, call_next):
+    # the old main.log_requests
+    start_time = time.time()
+    logger.info(f"Incoming request: {request.method} {request.url}")
+    response = await call_next(request)
+    process_time = (time.time() - start_time) * 1000
+    logger.info(f"Completed {request.method} {request.url} in {process_time:.2f} ms")
+    return response
+
+
+def build_app(stack):
+    app = FastAPI()
+
+    @app.post("/get-calories")
+    async def get_calories(payload: dict):
+        return {"dish_name": payload.get("dish_name"), "total_calories": 260.0}
+
+    if stack == "legacy":
+        app.add_middleware(LegacyLoggingMiddleware)
+        app.middleware("http")(legacy_log_requests)
+    elif stack == "asgi":
+        app.add_middleware(AccessLogMiddleware)
+    return app
+
+
+async def drive(app, requests):
+    body = json.dumps({"dish_name": "chicken biryani", "servings": 2}).encode()
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+             "scheme": "http", "path": "/get-calories", "raw_path": b"/get-calories", "query_string": b"",
+             "root_path": "", "headers": [(b"host", b"bench"), (b"content-type", b"application/json")],
+             "client": ("127.0.0.1", 1234), "server": ("bench", 80)}
+
+    async def run_one():
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await asyncio.sleep(3600)
+
+        async def send(message):
+            pass
+
+        await app(dict(scope), receive, send)
+
+    for _ in range(200):  # warm up
+        await run_one()
+    started = time.perf_counter_ns()
+    for _ in range(requests):
+        await run_one()
+    return (time.perf_counter_ns() - started) / requests / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="request logging middleware overhead")
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    records = queue.SimpleQueue()
+    devnull = logging.StreamHandler(open(os.devnull, "w"))
+    listener = QueueListener(records, devnull)
+    root = logging.getLogger()
+    root.handlers = [QueueHandler(records)]
+    root.setLevel(logging.INFO)
+    listener.start()
+
+    baseline = None
+    print(f"{'stack':>8} {'us/request':>11} {'overhead us':>12}")
+    for stack in ("none", "legacy", "asgi"):
+        per_request = asyncio.run(drive(build_app(stack), args.requests))
+        baseline = per_request if baseline is None else baseline
+        print(f"{stack:>8} {per_request:>11.1f} {per_request - baseline:>12.1f}")
+    listener.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Nutrient extraction: name substring scan vs the id-keyed single-pass parser.
+
+Times both over every food of synthetic search pages (nutrient order
+shuffled per food, as it varies between real records) and counts the foods
+where the name scan picks the kJ entry instead of kcal.
+
+    python -m benchmarks.bench_nutrients --foods 200 --nutrients 30 90
+"""
+import argparse
+import random
+import timeit
+
+from app.usda.nutrients import parse_nutrients
+from benchmarks.fdc_fixtures import make_search_page
+
+
+def legacy_extract_calories(food):
+    # the implementation before the id-keyed parser, kept for comparison
+    nutrients = food.get("foodNutrients") or []
+    for n in nutrients:
+        name = (n.get("nutrientName") or "").lower()
+        if "energy" in name or "calorie" in name or "kcal" in name:
+            try:
+                return float(n.get("value") or 0.0)
+            except Exception:
+                continue
+    label = food.get("labelNutrients") or {}
+    energy = label.get("calories") or label.get("energy")
+    if energy:
+        try:
+            return float(energy.get("value"))
+        except Exception:
+            pass
+    return None
+
+
+def bench(fn, foods, repeat):
+    def run():
+        for food in foods:
+            fn(food)
+    seconds = min(timeit.repeat(run, number=repeat, repeat=5))
+    return seconds / (repeat * len(foods)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="nutrient extraction micro-benchmark")
+    parser.add_argument("--foods", type=int, default=200, help="foods per search page")
+    parser.add_argument("--nutrients", type=int, nargs="+", default=[30, 90])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'nutrients':>10} {'name scan us/food':>18} {'id parser us/food':>18} {'wrong kcal (scan)':>18}")
+    for n_nutrients in args.nutrients:
+        foods = make_search_page(args.foods, seed=n_nutrients, n_nutrients=n_nutrients)["foods"]
+        rng = random.Random(n_nutrients)
+        for food in foods:
+            rng.shuffle(food["foodNutrients"])
+        wrong = sum(1 for f in foods if legacy_extract_calories(f) != parse_nutrients(f).calories)
+        legacy = bench(legacy_extract_calories, foods, args.repeat)
+        parsed = bench(parse_nutrients, foods, args.repeat)
+        print(f"{n_nutrients:>10} {legacy:>18.2f} {parsed:>18.2f} {wrong:>12}/{len(foods)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Login (argon2 verify) throughput for different hashing pool sizes.
+
+Drives ``PasswordHasher`` the way /auth/login does, with many concurrent
+verifications in flight, and reports throughput and latency per pool size.
+Cost parameters come from the ARGON2_* settings unless overridden.
+
+    python -m benchmarks.bench_password_hashing --workers 1 2 4 8 --logins 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from passlib.context import CryptContext
+
+from app.utils import security
+from app.utils.security import PasswordHasher
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run(workers, kind, logins, concurrency, hashed):
+    hasher = PasswordHasher(workers=workers, max_pending=logins, kind=kind)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def login():
+        async with semaphore:
+            start = time.perf_counter()
+            ok = await hasher.run(security.verify_password, "Str0ng!pass", hashed)
+            latencies.append(time.perf_counter() - start)
+            assert ok
+
+    # warm the pool so worker start-up is not measured
+    await asyncio.gather(*(hasher.run(security.verify_password, "Str0ng!pass", hashed) for _ in range(workers)))
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    hasher.shutdown()
+    return logins / elapsed, statistics.median(latencies), _percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="argon2 login throughput by pool size")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--kind", choices=["thread", "process"], default="thread")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--time-cost", type=int, default=security.ARGON2_TIME_COST)
+    parser.add_argument("--memory-cost", type=int, default=security.ARGON2_MEMORY_COST)
+    parser.add_argument("--parallelism", type=int, default=security.ARGON2_PARALLELISM)
+    args = parser.parse_args()
+
+    # worker processes re-import security, so pass overrides through the environment
+    os.environ["ARGON2_TIME_COST"] = str(args.time_cost)
+    os.environ["ARGON2_MEMORY_COST"] = str(args.memory_cost)
+    os.environ["ARGON2_PARALLELISM"] = str(args.parallelism)
+    security.pwd_context = CryptContext(
+        schemes=["argon2"],
+        argon2__rounds=args.time_cost,
+        argon2__memory_cost=args.memory_cost,
+        argon2__parallelism=args.parallelism,
+    )
+    hashed = security.get_password_hash("Str0ng!pass")
+
+    print(f"argon2id t={args.time_cost} m={args.memory_cost}KiB p={args.parallelism}, "
+          f"{args.kind} pool, {args.logins} logins, {args.concurrency} concurrent, {os.cpu_count()} CPUs")
+    print(f"{'workers':>8} {'logins/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for workers in args.workers:
+        rps, p50, p99 = asyncio.run(run(workers, args.kind, args.logins, args.concurrency, hashed))
+        print(f"{workers:>8} {rps:>10.1f} {p50 * 1000:>8.1f} {p99 * 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
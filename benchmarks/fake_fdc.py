@@ -0,0 +1,75 @@
+"""Local stand-in for the FoodData Central search API.
+
+Answers ``GET /fdc/v1/foods/search`` with synthetic foods (see
+fdc_fixtures) whose descriptions contain the query, so every dish resolves.
+Latency and failures are injectable so load tests and resilience tests can
+see a slow or flaky upstream without touching the real API:
+
+    python -m benchmarks.fake_fdc --port 8100 --latency-ms 80 --jitter-ms 40 --error-rate 0.02
+
+Point the app at it with USDA_SEARCH_URL=http://127.0.0.1:8100/fdc/v1/foods/search.
+"""
+import argparse
+import asyncio
+import random
+import zlib
+
+from fastapi import FastAPI, Query
+from fastapi.responses import JSONResponse
+
+from benchmarks.fdc_fixtures import make_food
+
+SEARCH_PATH = "/fdc/v1/foods/search"
+
+
+def build_app(latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0,
+              not_found_rate: float = 0, seed: int = 0) -> FastAPI:
+    """The fake API; ``app.state.calls`` counts searches, ``app.state.config`` can be edited live."""
+    app = FastAPI(title="fake FoodData Central")
+    app.state.config = {"latency_ms": latency_ms, "jitter_ms": jitter_ms,
+                        "error_rate": error_rate, "not_found_rate": not_found_rate}
+    app.state.calls = 0
+    rng = random.Random(seed)
+
+    @app.get(SEARCH_PATH)
+    async def search(query: str = Query(...), pageSize: int = 10, api_key: str = None):
+        config = app.state.config
+        app.state.calls += 1
+        delay = config["latency_ms"] + rng.uniform(0, config["jitter_ms"])
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        if rng.random() < config["error_rate"]:
+            return JSONResponse({"error": "injected failure"}, status_code=500)
+        if rng.random() < config["not_found_rate"]:
+            return {"totalHits": 0, "currentPage": 1, "totalPages": 0, "foods": []}
+        # the same query always gets the same foods
+        food_rng = random.Random(zlib.crc32(query.lower().encode()))
+        foods = []
+        for i in range(min(pageSize, 5)):
+            food = make_food(food_rng, 100000 + food_rng.randrange(10**6), n_nutrients=30)
+            food["description"] = f"{query.upper()}, {food['description']}" if i else query.upper()
+            food["lowercaseDescription"] = food["description"].lower()
+            foods.append(food)
+        return {"totalHits": len(foods), "currentPage": 1, "totalPages": 1, "foods": foods}
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="fake FoodData Central search API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of searches answered with a 500")
+    parser.add_argument("--not-found-rate", type=float, default=0, help="fraction answered with no foods")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    app = build_app(args.latency_ms, args.jitter_ms, args.error_rate, args.not_found_rate, args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
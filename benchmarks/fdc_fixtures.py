@@ -0,0 +1,106 @@
+"""Synthetic FoodData Central search payloads shaped like real responses."""
+import random
+from typing import Any, Dict, List
+
+_NUTRIENTS = [
+    (1003, "203", "Protein", "G"),
+    (1004, "204", "Total lipid (fat)", "G"),
+    (1005, "205", "Carbohydrate, by difference", "G"),
+    (1008, "208", "Energy", "KCAL"),
+    (1062, "268", "Energy", "kJ"),
+    (2000, "269", "Total Sugars", "G"),
+    (1079, "291", "Fiber, total dietary", "G"),
+    (1087, "301", "Calcium, Ca", "MG"),
+    (1089, "303", "Iron, Fe", "MG"),
+    (1090, "304", "Magnesium, Mg", "MG"),
+    (1091, "305", "Phosphorus, P", "MG"),
+    (1092, "306", "Potassium, K", "MG"),
+    (1093, "307", "Sodium, Na", "MG"),
+    (1095, "309", "Zinc, Zn", "MG"),
+    (1098, "312", "Copper, Cu", "MG"),
+    (1103, "317", "Selenium, Se", "UG"),
+    (1104, "318", "Vitamin A, IU", "IU"),
+    (1162, "401", "Vitamin C, total ascorbic acid", "MG"),
+    (1165, "404", "Thiamin", "MG"),
+    (1166, "405", "Riboflavin", "MG"),
+    (1167, "406", "Niacin", "MG"),
+    (1175, "415", "Vitamin B-6", "MG"),
+    (1177, "417", "Folate, total", "UG"),
+    (1178, "418", "Vitamin B-12", "UG"),
+    (1185, "430", "Vitamin K (phylloquinone)", "UG"),
+    (1253, "601", "Cholesterol", "MG"),
+    (1257, "605", "Fatty acids, total trans", "G"),
+    (1258, "606", "Fatty acids, total saturated", "G"),
+    (1292, "645", "Fatty acids, total monounsaturated", "G"),
+    (1293, "646", "Fatty acids, total polyunsaturated", "G"),
+]
+
+_WORDS = [
+    "chicken", "rice", "biryani", "paneer", "butter", "masala", "grilled", "salmon",
+    "macaroni", "cheese", "egg", "toast", "orange", "juice", "apple", "bread",
+    "whole", "wheat", "fried", "baked", "spicy", "sauce", "curry", "lentil",
+]
+_CATEGORIES = ["Poultry Products", "Cereal Grains and Pasta", "Dairy and Egg Products",
+               "Finfish and Shellfish Products", "Fruits and Fruit Juices", "Baked Products"]
+_DATA_TYPES = ["Branded", "Survey (FNDDS)", "SR Legacy", "Foundation"]
+
+
+def make_food(rng: random.Random, fdc_id: int, n_nutrients: int = 30) -> Dict[str, Any]:
+    description = " ".join(rng.sample(_WORDS, 3)).upper()
+    nutrients: List[Dict[str, Any]] = []
+    for nutrient_id, number, name, unit in (_NUTRIENTS * 3)[:n_nutrients]:
+        nutrients.append({
+            "nutrientId": nutrient_id,
+            "nutrientName": name,
+            "nutrientNumber": number,
+            "unitName": unit,
+            "derivationCode": "LCCS",
+            "derivationDescription": "Calculated from value per serving size measure",
+            "derivationId": 70,
+            "value": round(rng.uniform(0, 500), 2),
+            "foodNutrientSourceId": 9,
+            "foodNutrientSourceCode": "12",
+            "foodNutrientSourceDescription": "Manufacturer's analytical; partial documentation",
+            "rank": rng.randint(100, 60000),
+            "indentLevel": 1,
+            "foodNutrientId": rng.randint(10**7, 10**8),
+            "percentDailyValue": rng.randint(0, 100),
+        })
+    return {
+        "fdcId": fdc_id,
+        "description": description,
+        "lowercaseDescription": description.lower(),
+        "dataType": rng.choice(_DATA_TYPES),
+        "gtinUpc": str(rng.randint(10**11, 10**12)),
+        "publishedDate": "2024-03-14",
+        "brandOwner": "ACME FOODS INC.",
+        "brandName": "ACME",
+        "ingredients": ", ".join(rng.choice(_WORDS).upper() for _ in range(25)),
+        "marketCountry": "United States",
+        "foodCategory": rng.choice(_CATEGORIES),
+        "modifiedDate": "2023-11-02",
+        "dataSource": "LI",
+        "packageWeight": "12 oz/340 g",
+        "servingSizeUnit": "g",
+        "servingSize": 140.0,
+        "householdServingFullText": "1 cup",
+        "allHighlightFields": "",
+        "score": rng.uniform(100, 900),
+        "microbes": [],
+        "foodNutrients": nutrients,
+        "finalFoodInputFoods": [],
+        "foodMeasures": [],
+        "foodAttributes": [],
+        "foodAttributeTypes": [],
+        "foodVersionIds": [],
+    }
+
+
+def make_search_page(n_foods: int, seed: int = 0, n_nutrients: int = 30) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    return {
+        "totalHits": n_foods,
+        "currentPage": 1,
+        "totalPages": 1,
+        "foods": [make_food(rng, 100000 + i, n_nutrients) for i in range(n_foods)],
+    }
@@ -4,16 +4,86 @@ class Settings(BaseSettings):
     APP_NAME: str = "meal-calorie-backend"
     ENV: str = "development"
     DEBUG: bool = True
+    LOG_LEVEL: str = "DEBUG"
 
     DATABASE_URL: AnyUrl
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
     USDA_API_KEY: str
+    USDA_SEARCH_URL: str = "https://api.nal.usda.gov/fdc/v1/foods/search"
+    USDA_TIMEOUT_SECONDS: float = 10.0  # per search, across retries
+    USDA_ATTEMPT_TIMEOUT_SECONDS: float = 4.0
+    USDA_MAX_RETRIES: int = 2
+    USDA_RETRY_BACKOFF_SECONDS: float = 0.1
+    USDA_RETRY_BACKOFF_MAX_SECONDS: float = 1.0
+    USDA_RETRY_BUDGET_RATIO: float = 0.2
+    USDA_RETRY_BUDGET_MIN_PER_SECOND: float = 1.0
+    USDA_BREAKER_FAILURES: int = 5
+    USDA_BREAKER_RESET_SECONDS: float = 30
+    USDA_HEDGE: bool = False
+    USDA_HEDGE_PERCENTILE: float = 0.95
+    USDA_HEDGE_MIN_DELAY_SECONDS: float = 0.05
+    USDA_HTTP2: bool = True
+    USDA_MAX_CONNECTIONS: int = 100
+    USDA_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    USDA_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+
+    USDA_POSITIVE_TTL_SECONDS: float = 600
+    USDA_NEGATIVE_TTL_SECONDS: float = 60
+    USDA_STALE_WHILE_REVALIDATE_SECONDS: float = 300
+    USDA_STALE_IF_ERROR_SECONDS: float = 86400
+    USDA_LOCAL_INDEX_PATH: str = "./fdc_index.sqlite3"
+    USDA_LOCAL_INDEX_CANDIDATES: int = 25
+    USDA_LOCAL_MIN_SCORE: float = 80
+    USDA_ALIAS_MAX_KEYS: int = 10000
+    USDA_ALIAS_MIN_SCORE: float = 90
+    USDA_POPULARITY_MAX_KEYS: int = 10000
+    USDA_WARMUP_SEED_PATH: str = "./warmup_dishes.txt"
+    USDA_WARMUP_TOP_N: int = 200  # 0 disables warm-up
+    USDA_WARMUP_CONCURRENCY: int = 4
+    USDA_WARMUP_INTERVAL_SECONDS: float = 30
+    USDA_WARMUP_REFRESH_AHEAD_SECONDS: float = 60
+    USDA_WARMUP_READY_RATIO: float = 0.9
+    USDA_WARMUP_READY_TIMEOUT_SECONDS: float = 120
+    USDA_WARMUP_SAVE_SEED: bool = False
+
+    CACHE_BACKEND: str = "memory"  # memory | sqlite | redis
+    CACHE_MAXSIZE: int = 10240
+    CACHE_TTL_SECONDS: float = 600
+    CACHE_SQLITE_PATH: str = "./usda_cache.sqlite3"
+    CACHE_SQLITE_MAXSIZE: int = 100000
+    CACHE_REDIS_URL: str = "redis://localhost:6379/0"
+    CACHE_KEY_PREFIX: str = "usda:"
 
     JWT_SECRET_KEY: str
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
 
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST: int = 65536  # KiB
+    ARGON2_PARALLELISM: int = 4
+    PASSWORD_HASH_EXECUTOR: str = "thread"  # thread | process
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 64
+
+    ADMIN_EMAILS: str = ""  # comma-separated
+    BULK_IMPORT_BATCH_SIZE: int = 1000
+    BULK_IMPORT_HASH_WORKERS: int = 4
+    BULK_IMPORT_HASH_EXECUTOR: str = "process"  # thread | process
+
+    AUTH_MODE: str = "db"  # db | cached | stateless
+    AUTH_CACHE_MAXSIZE: int = 10000
+    AUTH_CACHE_TTL_SECONDS: int = 60
+
     RATE_LIMIT_REQUESTS: int = 15
     RATE_LIMIT_PERIOD_SECONDS: int = 60
+    RATE_LIMIT_BACKEND: str = "memory"  # memory | redis
+    RATE_LIMIT_REDIS_URL: str = "redis://localhost:6379/0"
+    RATE_LIMIT_KEY_PREFIX: str = "ratelimit:"
+    RATE_LIMIT_MAX_KEYS: int = 100000
 
     class Config:
         env_file = ".env"
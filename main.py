@@ -1,22 +1,50 @@
-import logging
-import time
-from fastapi import FastAPI, HTTPException, Request
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import PlainTextResponse
 from app.core.exceptions import (
     exception_handler,
     http_exception_handler,
     validation_exception_handler,
 )
+from app.db.init_db import engine
 from api import api_router
-from slowapi import Limiter
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-from slowapi.middleware import SlowAPIMiddleware
+from app.logging_middleware import AccessLogMiddleware, configure_logging
+from app.usda.service import close_usda_client, open_usda_client
+from app.usda.warmup import cache_warmer
+from app.utils import rate_limiter
+from app.utils.metrics import CONTENT_TYPE, registry
+from app.utils.rate_limiter import RateLimitHeadersMiddleware
+from app.utils.security import password_hasher
+from models import ensure_search_index
+
+
+def _ensure_search_index() -> None:
+    with engine.begin() as conn:
+        ensure_search_index(conn)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open shared resources on startup and release them on shutdown."""
+    await asyncio.to_thread(_ensure_search_index)
+    await open_usda_client()
+    cache_warmer.start()
+    try:
+        yield
+    finally:
+        await cache_warmer.stop()
+        await close_usda_client()
+        await rate_limiter.backend.close()
+        password_hasher.shutdown()
+
+
 app = FastAPI(
     title="Xcelpros - Meal Calorie Count Generator",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -27,47 +55,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+configure_logging()
+
+# Limits are applied per route by RateLimit dependencies (see app.utils.rate_limiter);
+# this adds the RateLimit-* headers they record to the response
+app.add_middleware(RateLimitHeadersMiddleware)
 
-log_level = "DEBUG"
+app.include_router(api_router)
 
-logger = logging.getLogger()
-logger.setLevel(log_level)
 
-formatter = logging.Formatter(
-    "%(asctime)s - %(threadName)s %(filename)s:%(lineno)d - %(funcName)s() - %(levelname)s - %(message)s"
-)
-stream_handler = logging.StreamHandler()
-stream_handler.setFormatter(formatter)
-logger.addHandler(stream_handler)
-
-# Limiter setup: limit per IP
-limiter = Limiter(key_func=get_remote_address)
-app.state.limiter = limiter
-app.add_middleware(SlowAPIMiddleware)
-
-# Handle rate-limit exception
-@app.exception_handler(RateLimitExceeded)
-def rate_limit_handler(request, exc):
-    return JSONResponse(
-        status_code=429,
-        content={"status": "GE42901", "error": "Too many requests. Please try again later."}
-    )
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint for this process."""
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
+
+
+@app.get("/ready", include_in_schema=False)
+def ready():
+    """Readiness probe: 503 until the dish cache warm-up reaches its threshold."""
+    if not cache_warmer.ready:
+        raise HTTPException(
+            status_code=503,
+            detail={"status": "GE50303", "error": "Warming up the dish cache"},
+            headers={"Retry-After": "5"},
+        )
+    return cache_warmer.status()
 
-app.include_router(api_router)
 app.add_exception_handler(RequestValidationError, validation_exception_handler)
 app.add_exception_handler(HTTPException, http_exception_handler)
 app.add_exception_handler(Exception, exception_handler)
 
-
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    """Middleware to log incoming requests and response times."""
-    start_time = time.time()
-    logger.info(f"Incoming request: {request.method} {request.url}")
-    
-    response = await call_next(request)
-
-    process_time = (time.time() - start_time) * 1000
-    formatted_time = f"{process_time:.2f} ms"
-    logger.info(f"Completed {request.method} {request.url} in {formatted_time}")
-    return response
+# outermost, so the logged duration covers every other middleware
+app.add_middleware(AccessLogMiddleware)
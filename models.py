@@ -1,8 +1,14 @@
-from sqlalchemy import Column, Integer, String, DateTime
+import logging
+
+from sqlalchemy import DDL, Column, Date, Float, ForeignKey, Integer, String, DateTime, Index, event, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateIndex
 from sqlalchemy.sql import func
 
 from app.db.init_db import Base
 
+logger = logging.getLogger(__name__)
+
 class User(Base):
     __tablename__ = "users" 
 
@@ -12,3 +18,95 @@ class User(Base):
     email = Column(String, unique=True, nullable=False, index=True)
     hashed_password = Column(String, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Trigram indexes so the `ILIKE '%q%'` search in crud.list_users can use
+    # a bitmap index scan instead of reading the whole table. They need the
+    # pg_trgm extension, which not every role may create, so create_all
+    # leaves them to ensure_search_index.
+    __table_args__ = tuple(
+        Index(f"ix_users_{column}_trgm", column,
+              postgresql_using="gin", postgresql_ops={column: "gin_trgm_ops"}
+              ).ddl_if(callable_=lambda *args, **kwargs: False)
+        for column in ("first_name", "last_name", "email")
+    )
+
+
+# SQLite has no trigram index, so it gets an external-content FTS5 table
+# kept in sync by triggers.
+
+USERS_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5("
+    "first_name, last_name, email, content='users', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN "
+    "INSERT INTO users_fts(rowid, first_name, last_name, email) "
+    "VALUES (new.id, new.first_name, new.last_name, new.email); END",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN "
+    "INSERT INTO users_fts(users_fts, rowid, first_name, last_name, email) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.email); END",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE ON users BEGIN "
+    "INSERT INTO users_fts(users_fts, rowid, first_name, last_name, email) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.email); "
+    "INSERT INTO users_fts(rowid, first_name, last_name, email) "
+    "VALUES (new.id, new.first_name, new.last_name, new.email); END",
+)
+for statement in USERS_FTS_DDL:
+    event.listen(User.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(User.__table__, "after_drop",
+             DDL("DROP TABLE IF EXISTS users_fts").execute_if(dialect="sqlite"))
+
+
+def ensure_search_index(connection) -> None:
+    """Create the user search index where it is missing, filled from the existing rows.
+
+    Runs on every startup (see main.lifespan) and is a no-op once the
+    index is there. It is the only place the Postgres trigram indexes are
+    made, and it brings SQLite databases created before the FTS5 table
+    existed up to date. Without pg_trgm the search still works, unindexed.
+    """
+    dialect = connection.dialect.name
+    if dialect == "postgresql":
+        try:
+            with connection.begin_nested():
+                connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        except DBAPIError as e:
+            # search still works, as a sequential scan
+            logger.warning("pg_trgm is not available, user search runs unindexed: %s", e.orig)
+            return
+        for index in User.__table__.indexes:
+            if index.name.endswith("_trgm"):
+                connection.execute(CreateIndex(index, if_not_exists=True))
+    elif dialect == "sqlite":
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users_fts'")
+        ).first()
+        for statement in USERS_FTS_DDL:
+            connection.execute(text(statement))
+        if not exists:
+            connection.execute(text("INSERT INTO users_fts(users_fts) VALUES ('rebuild')"))
+
+
+class MealEntry(Base):
+    __tablename__ = "meal_entries"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    dish_name = Column(String, nullable=False)
+    fdc_id = Column(Integer, nullable=True)
+    servings = Column(Integer, nullable=False)
+    calories_per_serving = Column(Float, nullable=False)
+    total_calories = Column(Float, nullable=False)
+    eaten_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    # the user's calendar day of eaten_at, i.e. the DailyCalorieSummary row it counts towards
+    day = Column(Date, nullable=False)
+
+    __table_args__ = (Index("ix_meal_entries_user_day", "user_id", "day"),)
+
+
+class DailyCalorieSummary(Base):
+    """Per-user, per-day totals, upserted in the same transaction as each MealEntry."""
+    __tablename__ = "daily_calorie_summaries"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    total_calories = Column(Float, nullable=False, default=0)
+    entries = Column(Integer, nullable=False, default=0)
@@ -1,5 +1,6 @@
 import re
-from pydantic import BaseModel, EmailStr, conint, field_validator
+from datetime import date, datetime
+from pydantic import BaseModel, EmailStr, confloat, conint, conlist, field_validator
 from typing import Optional, List
 
 class RegisterRequest(BaseModel):
@@ -108,11 +109,26 @@ class TokenData(BaseModel):
 class GetCaloriesRequest(BaseModel):
     dish_name: str
     servings: conint(gt=0)
+    # optional size of one serving, e.g. 150 "g", 1 "cup" or 2 "pieces"; by default a
+    # serving is the food's label serving, or 100 g when USDA gives none
+    quantity: Optional[confloat(gt=0)] = None
+    unit: Optional[str] = None
+    # log=True also records the dish in the user's meal log; eaten_at defaults to now
+    # and its own calendar date (in its UTC offset) decides the day it counts towards
+    log: bool = False
+    eaten_at: Optional[datetime] = None
 
 class IngredientBreakdown(BaseModel):
     name: str
     calories_per_serving: Optional[float] = None
     amount_descriptor: Optional[str] = None
+    grams: Optional[float] = None
+
+class Macronutrients(BaseModel):
+    # grams; None when USDA does not list the nutrient for the food
+    protein_g: Optional[float] = None
+    fat_g: Optional[float] = None
+    carbohydrate_g: Optional[float] = None
 
 class CalorieResponse(BaseModel):
     dish_name: str
@@ -120,4 +136,51 @@ class CalorieResponse(BaseModel):
     calories_per_serving: float
     total_calories: float
     source: str
+    serving_grams: Optional[float] = None  # weight one serving was computed for, when known
     ingredients: Optional[List[IngredientBreakdown]] = None
+    macros_per_serving: Optional[Macronutrients] = None
+    total_macros: Optional[Macronutrients] = None
+
+# Upper bound on dishes per meal request; each unique dish costs one rate-limit hit
+MEAL_MAX_ITEMS = 15
+
+class MealItem(BaseModel):
+    dish_name: str
+    servings: conint(gt=0)
+    quantity: Optional[confloat(gt=0)] = None
+    unit: Optional[str] = None
+
+class MealCaloriesRequest(BaseModel):
+    items: conlist(MealItem, min_length=1, max_length=MEAL_MAX_ITEMS)
+    log: bool = False
+    eaten_at: Optional[datetime] = None
+
+class MealItemError(BaseModel):
+    status: str
+    error: str
+
+class MealItemResult(BaseModel):
+    dish_name: str
+    servings: int
+    result: Optional[CalorieResponse] = None
+    error: Optional[MealItemError] = None
+
+class MealCaloriesResponse(BaseModel):
+    items: List[MealItemResult]
+    total_calories: float
+    resolved: int
+    failed: int
+
+# Longest date range GET /calories/summary returns in one response
+SUMMARY_MAX_DAYS = 366
+
+class DailyCalories(BaseModel):
+    day: date
+    total_calories: float
+    entries: int
+
+class CalorieSummaryResponse(BaseModel):
+    start: date
+    end: date
+    total_calories: float
+    days: List[DailyCalories]